@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.contrib.auth.admin import UserAdmin
+from core.thumbnails import thumbnail_url
 from .models import CustomUser
 
 
@@ -47,7 +48,7 @@ class CustomUserAdmin(UserAdmin):
     # Adding profile image preview in the form
     def profile_image_preview(self, obj):
         if obj.profile_pic:
-            return format_html('<img src="{}" width="50" height="50" style="border-radius: 50%;" />', obj.profile_pic.url)
+            return format_html('<img src="{}" width="50" height="50" style="border-radius: 50%;" />', thumbnail_url(obj.profile_pic, 320))
         return "No Image"
 
     profile_image_preview.short_description = "Profile Image"
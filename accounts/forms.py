@@ -1,10 +1,10 @@
 from django import forms
 from accounts.models import CustomUser
 from django.contrib.auth.forms import UserCreationForm
-import mimetypes
 from django.core.exceptions import ValidationError
 from django.contrib.auth.password_validation import validate_password
 from django.contrib import messages
+from core.validators import HeaderImageField, validate_image_upload
 
 
 class UserRegisterForm(UserCreationForm):
@@ -140,6 +140,7 @@ class UpdateProfileForm(forms.ModelForm):
         model = CustomUser
         fields = ['username', 'email', 'phone',
                   'city', 'state', 'zip_code', 'profile_pic']
+        field_classes = {'profile_pic': HeaderImageField}
         widgets = {
             'username': forms.TextInput(attrs={'placeholder': 'Username', 'class': 'form-control'}),
             'email': forms.EmailInput(attrs={'placeholder': 'Email', 'class': 'form-control'}),
@@ -179,14 +180,6 @@ class UpdateProfileForm(forms.ModelForm):
 
     def clean_profile_pic(self):
         profile_pic = self.cleaned_data.get('profile_pic')
-        if profile_pic:
-            # Validate file size (limit: 5MB)
-            if profile_pic.size > 5 * 1024 * 1024:
-                raise ValidationError("Image file too large ( > 5MB )")
-
-            # Validate file format
-            mime_type, _ = mimetypes.guess_type(profile_pic.name)
-            if mime_type not in ['image/jpeg', 'image/png']:
-                raise ValidationError(
-                    'Unsupported file format. Please upload a jpg, jpeg, or png image.')
+        # 5MB, JPEG/PNG; the header was already read by the form field
+        validate_image_upload(profile_pic, formats=('jpeg', 'png'), max_dimensions=(5000, 5000))
         return profile_pic
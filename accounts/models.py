@@ -2,7 +2,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
-from django.core.files.images import get_image_dimensions
+from core.validators import validate_image_upload
 
 
 class CustomUser(AbstractUser):
@@ -33,20 +33,8 @@ class CustomUser(AbstractUser):
         return super().clean()
 
     def save(self, *args, **kwargs):
-        if self.profile_pic:
-            # Check file size
-            if self.profile_pic.size > 5242880:
-                raise ValidationError("Image file too large ( > 5mb )")
-
-            # Check file format
-            if not self.profile_pic.name.lower().endswith(('.jpg', '.jpeg', '.png')):
-                raise ValidationError(
-                    "Invalid image format. Supported formats are .jpg, .jpeg, .png")
-
-            # Check image dimensions
-            width, height = get_image_dimensions(self.profile_pic)
-            if width > 5000 or height > 5000:
-                raise ValidationError(
-                    "Image dimensions are too large (max 5000x5000).")
+        # New uploads only: 5MB, JPEG/PNG, at most 5000x5000
+        validate_image_upload(
+            self.profile_pic, formats=('jpeg', 'png'), max_dimensions=(5000, 5000))
 
         super().save(*args, **kwargs)
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from accounts.models import CustomUser
+from core.storage import track_media
+from core.thumbnails import schedule_for
+
+
+@receiver(post_save, sender=CustomUser)
+def profile_pic_thumbnails(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Logins save the user with update_fields=['last_login']
+    if not raw:
+        schedule_for(instance, 'profile_pic', update_fields)
+
+
+track_media(CustomUser, 'profile_pic')
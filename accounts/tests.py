@@ -1,3 +1,40 @@
-from django.test import TestCase
+from importlib import import_module
 
-# Create your tests here.
+from django.conf import settings
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from accounts.models import CustomUser
+
+
+class SessionFlushTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        CustomUser.objects.create_user(
+            username='guest', email='guest@example.com', password='secret')
+
+    def setUp(self):
+        self.client.login(username='guest', password='secret')
+        self.session_key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def replay(self):
+        """A second client presenting the old session cookie."""
+        client = Client()
+        client.cookies[settings.SESSION_COOKIE_NAME] = self.session_key
+        return client.get(reverse('user_dashboard'))
+
+    def test_session_authenticates_until_flushed(self):
+        self.assertEqual(self.replay().status_code, 200)
+
+    def test_logout_stops_the_old_cookie_authenticating(self):
+        self.client.get(reverse('logout'))
+
+        response = self.replay()
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith(reverse('login')))
+
+    def test_flush_outside_the_request_stops_it_authenticating(self):
+        store = import_module(settings.SESSION_ENGINE).SessionStore(self.session_key)
+        store.flush()
+
+        self.assertEqual(self.replay().status_code, 302)
@@ -0,0 +1,129 @@
+"""
+Blocked-date calendar for a property, served to the booking date pickers.
+
+Active bookings are merged into half-open [start, end) date ranges (the
+check-out day is free for the next guest). The merged ranges from today on
+are cached per property and dropped by booking.signals whenever one of the
+property's bookings changes.
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from booking.models import Booking
+
+MAX_WINDOW_DAYS = 730
+DEFAULT_WINDOW_DAYS = 365
+
+
+def ranges_key(property_id):
+    return f'booking:blocked-ranges:{property_id}'
+
+
+def modified_key(property_id):
+    return f'booking:blocked-ranges:{property_id}:modified'
+
+
+def invalidate_blocked_ranges(property_id):
+    cache.delete(ranges_key(property_id))
+    cache.set(modified_key(property_id), timezone.now().timestamp(), None)
+
+
+def merge_ranges(ranges):
+    """
+    Merge sorted [start, end) ranges that overlap or touch.
+    """
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def get_blocked_ranges(property_id):
+    """
+    Return (ranges, last_modified) for a property, where ranges are merged
+    [start, end) dates of active bookings that have not ended before today.
+    """
+    today = timezone.localdate()
+    cached = cache.get(ranges_key(property_id))
+    if cached is not None and cached['as_of'] == today:
+        return cached['ranges'], datetime.fromtimestamp(cached['modified'], tz=dt_timezone.utc)
+
+    start_of_today = timezone.make_aware(datetime.combine(today, datetime.min.time()))
+    bookings = Booking.objects.filter(
+        property_id=property_id,
+        status__in=Booking.ACTIVE_STATUSES,
+        check_out__gt=start_of_today,
+    ).order_by('check_in').values_list('check_in', 'check_out')
+
+    ranges = merge_ranges(
+        (max(timezone.localdate(check_in), today), timezone.localdate(check_out))
+        for check_in, check_out in bookings
+    )
+    modified = cache.get_or_set(modified_key(property_id), timezone.now().timestamp(), None)
+    cache.set(ranges_key(property_id), {'as_of': today, 'ranges': ranges, 'modified': modified})
+    return ranges, datetime.fromtimestamp(modified, tz=dt_timezone.utc)
+
+
+def clip_ranges(ranges, window_start, window_end):
+    """
+    Keep the parts of the ranges that fall inside [window_start, window_end).
+    """
+    clipped = []
+    for start, end in ranges:
+        if end <= window_start:
+            continue
+        if start >= window_end:
+            break
+        clipped.append([max(start, window_start), min(end, window_end)])
+    return clipped
+
+
+def parse_window(start, end):
+    """
+    Resolve the requested calendar window; starts no earlier than today and
+    spans at most MAX_WINDOW_DAYS.
+    """
+    today = timezone.localdate()
+    try:
+        window_start = datetime.strptime(start, '%Y-%m-%d').date() if start else today
+    except ValueError:
+        window_start = today
+    window_start = max(window_start, today)
+    try:
+        window_end = datetime.strptime(end, '%Y-%m-%d').date() if end else None
+    except ValueError:
+        window_end = None
+    if window_end is None or window_end <= window_start:
+        window_end = window_start + timedelta(days=DEFAULT_WINDOW_DAYS)
+    return window_start, min(window_end, window_start + timedelta(days=MAX_WINDOW_DAYS))
+
+
+def calendar_payload(property_id, start=None, end=None):
+    """
+    Return (payload, etag, last_modified) for the disabled_dates endpoint.
+    """
+    ranges, last_modified = get_blocked_ranges(property_id)
+    window_start, window_end = parse_window(start, end)
+    # The window starts no earlier than today, so the payload can change at
+    # midnight without any booking changing. The ETag covers that through the
+    # window bounds in the payload; Last-Modified is at least today's midnight
+    last_modified = max(last_modified, timezone.make_aware(
+        datetime.combine(timezone.localdate(), datetime.min.time())))
+    payload = {
+        'start': window_start.isoformat(),
+        'end': window_end.isoformat(),
+        'disabled_ranges': [
+            [range_start.isoformat(), range_end.isoformat()]
+            for range_start, range_end in clip_ranges(ranges, window_start, window_end)
+        ],
+    }
+    etag = hashlib.md5(json.dumps(payload).encode(), usedforsecurity=False).hexdigest()
+    return payload, f'"{etag}"', last_modified
@@ -20,7 +20,7 @@ class BookingForm(forms.ModelForm):
 
     def clean_check_in(self):
         check_in = self.cleaned_data.get('check_in')
-        if check_in and check_in < timezone.now().date() + timezone.timedelta(days=1):
+        if check_in and timezone.localdate(check_in) < timezone.localdate() + timezone.timedelta(days=1):
             raise forms.ValidationError("Check-in date must be at least one day from today.")
         return check_in
     
@@ -45,6 +45,13 @@ class BookingForm(forms.ModelForm):
             return total_cost
         return 0
 
+    def clean(self):
+        cleaned_data = super().clean()
+        # Model validation (run right after this) needs the cost
+        if self.instance.property_id:
+            self.instance.total_cost = self.calculate_total_cost()
+        return cleaned_data
+
     def save(self, commit=True):
         instance = super().save(commit=False)
         instance.total_cost = self.calculate_total_cost()  # Calculate total cost when saving the form
@@ -69,7 +76,7 @@ class BookingUpdateForm(forms.ModelForm):
 
     def clean_check_in(self):
         check_in = self.cleaned_data.get('check_in')
-        if check_in and check_in < timezone.now().date() + timezone.timedelta(days=1):
+        if check_in and timezone.localdate(check_in) < timezone.localdate() + timezone.timedelta(days=1):
             raise forms.ValidationError("Check-in date must be at least one day from today.")
         return check_in
     
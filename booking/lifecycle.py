@@ -0,0 +1,91 @@
+"""
+Set-based booking status transitions, run on a schedule by management commands.
+
+Pending bookings are holds taken before payment; ones older than
+settings.BOOKING_HOLD_TTL_MINUTES are abandoned checkouts and get cancelled
+together with their pending payments.
+
+Each transition selects matching ids in primary-key batches and moves them with
+one UPDATE ... WHERE per batch, re-checking the condition in the UPDATE so rows
+changed concurrently are left alone. Model save() and signals are bypassed on
+purpose: none of these transitions changes which future dates are held.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from booking.models import Booking
+from payment.models import Payment
+
+BATCH_SIZE = 1000
+
+
+def bulk_transition(from_status, to_status, condition, now, batch_size=BATCH_SIZE):
+    """
+    Move every booking in `from_status` matching `condition` to `to_status`.
+    Returns the number of rows changed.
+    """
+    candidates = Booking.objects.filter(condition, status=from_status).order_by('pk')
+    changed = 0
+    last_id = 0
+    while True:
+        ids = list(candidates.filter(pk__gt=last_id).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return changed
+        with transaction.atomic():
+            changed += Booking.objects.filter(
+                condition, pk__in=ids, status=from_status
+            ).update(status=to_status, updated_at=now)
+        last_id = ids[-1]
+
+
+def advance_booking_statuses(now=None, batch_size=BATCH_SIZE):
+    """
+    Bulk equivalent of Booking.update_status_based_on_dates() and
+    Booking.complete_booking() for the whole table. Confirmed stays that are
+    already over go straight to completed.
+
+    Returns a dict of rows changed per transition.
+    """
+    now = now or timezone.now()
+    transitions = [
+        ('ongoing', 'completed', Q(check_out__lte=now)),
+        ('confirmed', 'completed', Q(check_out__lte=now)),
+        ('confirmed', 'ongoing', Q(check_in__lte=now, check_out__gt=now)),
+    ]
+    return {
+        f'{from_status} -> {to_status}': bulk_transition(from_status, to_status, condition, now, batch_size)
+        for from_status, to_status, condition in transitions
+    }
+
+
+def expire_pending_holds(now=None, ttl=None, batch_size=BATCH_SIZE):
+    """
+    Cancel pending bookings created more than `ttl` ago (default
+    settings.BOOKING_HOLD_TTL_MINUTES) and fail their pending payments, one
+    short transaction per batch.
+
+    Returns a dict with the number of bookings and payments changed.
+    """
+    now = now or timezone.now()
+    ttl = ttl or timedelta(minutes=settings.BOOKING_HOLD_TTL_MINUTES)
+    stale = Q(created_at__lt=now - ttl)
+    candidates = Booking.objects.filter(stale, status='pending').order_by('pk')
+
+    expired = {'bookings': 0, 'payments': 0}
+    last_id = 0
+    while True:
+        ids = list(candidates.filter(pk__gt=last_id).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return expired
+        with transaction.atomic():
+            expired['bookings'] += Booking.objects.filter(
+                stale, pk__in=ids, status='pending'
+            ).update(status='cancelled', updated_at=now)
+            expired['payments'] += Payment.objects.filter(
+                booking_id__in=ids, booking__status='cancelled', payment_status='pending'
+            ).update(payment_status='failed', updated_at=now)
+        last_id = ids[-1]
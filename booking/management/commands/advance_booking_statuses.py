@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from booking.lifecycle import advance_booking_statuses, BATCH_SIZE
+from core.models import JobLock
+
+
+class Command(BaseCommand):
+    help = ('Move bookings from confirmed to ongoing to completed based on their dates. '
+            'Meant to be run on a schedule (e.g. every few minutes from cron).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Rows updated per UPDATE statement.')
+        parser.add_argument('--lock-ttl', type=int, default=600,
+                            help='Seconds after which a lock left by a crashed run expires.')
+
+    def handle(self, *args, **options):
+        with JobLock.hold('advance_booking_statuses', timedelta(seconds=options['lock_ttl'])) as locked:
+            if not locked:
+                self.stdout.write(self.style.WARNING('Another run is in progress; skipping.'))
+                return
+
+            changed = advance_booking_statuses(batch_size=options['batch_size'])
+
+        for transition, count in changed.items():
+            self.stdout.write(f'{transition}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Updated {sum(changed.values())} bookings.'))
@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from booking.lifecycle import expire_pending_holds, BATCH_SIZE
+from core.models import JobLock
+
+
+class Command(BaseCommand):
+    help = ('Cancel pending bookings (unpaid holds) older than the hold TTL and fail '
+            'their pending payments. Meant to be run on a schedule.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl-minutes', type=int, default=settings.BOOKING_HOLD_TTL_MINUTES,
+                            help='Age after which a pending booking is considered abandoned.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Bookings cancelled per transaction.')
+        parser.add_argument('--lock-ttl', type=int, default=600,
+                            help='Seconds after which a lock left by a crashed run expires.')
+
+    def handle(self, *args, **options):
+        with JobLock.hold('expire_pending_bookings', timedelta(seconds=options['lock_ttl'])) as locked:
+            if not locked:
+                self.stdout.write(self.style.WARNING('Another run is in progress; skipping.'))
+                return
+
+            expired = expire_pending_holds(
+                ttl=timedelta(minutes=options['ttl_minutes']), batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Cancelled {expired['bookings']} pending bookings and failed "
+            f"{expired['payments']} pending payments."))
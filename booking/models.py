@@ -1,10 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from accounts.models import CustomUser
 from properties.models import Property
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
-from razorpay import Client  # type: ignore # Import the Razorpay Client for initiating refunds
+from core.metrics import bookings
 
 class Booking(models.Model):
     BOOKING_STATUS_CHOICES = (
@@ -15,6 +15,9 @@ class Booking(models.Model):
         ('cancelled', 'Cancelled'),       # If booking is cancelled
     )
 
+    # Statuses that hold the property's dates
+    ACTIVE_STATUSES = ('confirmed', 'ongoing')
+
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='bookings')
     check_in = models.DateTimeField()
@@ -24,7 +27,7 @@ class Booking(models.Model):
     status = models.CharField(
         max_length=10, choices=BOOKING_STATUS_CHOICES, default='pending')
     # in your Booking model
-    razorpay_order_id = models.CharField(max_length=255, blank=True, null=True)
+    razorpay_order_id = models.CharField(max_length=255, blank=True, null=True, db_index=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -33,6 +36,12 @@ class Booking(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['user', 'status']),
+            # Date-overlap lookups (availability search, double-booking checks)
+            models.Index(fields=['property', 'status', 'check_in', 'check_out']),
+            # Scheduled status sweeps (booking.lifecycle)
+            models.Index(fields=['status', 'check_out']),
+            # Expiry of abandoned pending holds (booking.lifecycle)
+            models.Index(fields=['status', 'created_at']),
         ]
 
     def __str__(self):
@@ -62,6 +71,7 @@ class Booking(models.Model):
         if self.status == 'pending':
             self.status = 'confirmed'
             self.save()
+            bookings.inc(event='confirmed')
 
     def update_status_based_on_dates(self):
         """
@@ -77,17 +87,21 @@ class Booking(models.Model):
 
     def cancel_booking(self):
         """
-        Cancels the booking if it is not yet completed and triggers refund if necessary.
+        Cancels the booking if it is not yet completed and queues a refund if necessary.
+        The refund itself is made by the refund workers (process_refunds), not in the request.
         """
+        from payment.models import RefundJob  # payment.models imports this module
+
         if self.status not in ['cancelled', 'completed']:
-            self.status = 'cancelled'
-            self.save()
-            
-            # Check if payment was completed and trigger refund
-            payment = self.payment_set.filter(payment_status='completed').first()
-            if payment:
-                razorpay_client = Client(auth=("RAZORPAY_KEY_ID", "RAZORPAY_KEY_SECRET"))
-                payment.refund_payment(razorpay_client)
+            with transaction.atomic():
+                self.status = 'cancelled'
+                self.save()
+
+                # Check if payment was completed and queue the refund
+                payment = self.payment_set.filter(payment_status='completed').first()
+                if payment:
+                    RefundJob.enqueue(payment)
+            bookings.inc(event='cancelled')
 
     def complete_booking(self):
         """
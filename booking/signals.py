@@ -0,0 +1,16 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from booking.models import Booking
+from booking.availability import invalidate_blocked_ranges
+from properties.search import invalidate_availability_cache
+
+
+# Cached date-range searches and the per-property blocked-date calendar
+# depend on which bookings hold which dates
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def booking_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_availability_cache()
+    invalidate_blocked_ranges(instance.property_id)
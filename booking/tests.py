@@ -1,3 +1,172 @@
+import io
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from booking.availability import get_blocked_ranges, ranges_key
+from booking.lifecycle import advance_booking_statuses, expire_pending_holds
+from booking.models import Booking
+from core.models import JobLock
+from payment.models import Payment
+from properties.models import Property
+from properties.search import AVAILABILITY_GENERATION_KEY, GENERATION_KEY, get_cache
+
+
+class DisabledDatesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        guest = CustomUser.objects.create_user(
+            username='guest', email='guest@example.com', password='secret')
+        cls.property = Property.objects.create(
+            owner=guest, title='Sea View', city='Goa', state='Goa', zip_code='403001',
+            price_per_night=1000, max_guests=4)
+        check_in = timezone.now() + timedelta(days=10)
+        Booking.objects.create(
+            user=guest, property=cls.property, check_in=check_in,
+            check_out=check_in + timedelta(days=3), total_cost=3000, guests=2, status='confirmed')
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, **headers):
+        return self.client.get(
+            reverse('booking:disabled-dates', args=[self.property.pk]), headers=headers)
+
+    def test_unchanged_calendar_is_not_modified(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['disabled_ranges']), 1)
+
+        self.assertEqual(self.get(If_None_Match=response['ETag']).status_code, 304)
+        self.assertEqual(self.get(If_Modified_Since=response['Last-Modified']).status_code, 304)
+
+    def test_validators_move_with_the_default_window(self):
+        response = self.get()
+        tomorrow = timezone.now() + timedelta(days=1)
+
+        with mock.patch('django.utils.timezone.now', return_value=tomorrow):
+            for headers in ({'If_None_Match': response['ETag']},
+                            {'If_Modified_Since': response['Last-Modified']}):
+                moved = self.get(**headers)
+                self.assertEqual(moved.status_code, 200)
+                self.assertEqual(moved.json()['start'], timezone.localdate(tomorrow).isoformat())
+                self.assertNotEqual(moved['ETag'], response['ETag'])
+                self.assertNotEqual(moved['Last-Modified'], response['Last-Modified'])
+
+
+class BookingSignalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.guest = CustomUser.objects.create_user(
+            username='guest', email='guest@example.com', password='secret')
+        cls.property = Property.objects.create(
+            owner=cls.guest, title='Sea View', city='Goa', state='Goa', zip_code='403001',
+            price_per_night=1000, max_guests=4)
+
+    def setUp(self):
+        cache.clear()
+        get_cache().set_many({GENERATION_KEY: 1, AVAILABILITY_GENERATION_KEY: 1}, None)
+
+    def generations(self):
+        return get_cache().get(GENERATION_KEY), get_cache().get(AVAILABILITY_GENERATION_KEY)
+
+    def test_booking_changes_drop_date_caches_only(self):
+        get_blocked_ranges(self.property.pk)
+        check_in = timezone.now() + timedelta(days=10)
+
+        booking = Booking.objects.create(
+            user=self.guest, property=self.property, check_in=check_in,
+            check_out=check_in + timedelta(days=3), total_cost=3000, guests=2, status='confirmed')
+
+        self.assertIsNone(cache.get(ranges_key(self.property.pk)))
+        self.assertEqual(len(get_blocked_ranges(self.property.pk)[0]), 1)
+        generation, availability = self.generations()
+        self.assertEqual(generation, 1)
+        self.assertNotEqual(availability, 1)
+
+        booking.delete()
+        self.assertEqual(get_blocked_ranges(self.property.pk)[0], [])
+        self.assertNotEqual(self.generations()[1], availability)
+
+
+class BookingLifecycleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.guest = CustomUser.objects.create_user(
+            username='guest', email='guest@example.com', password='secret')
+        cls.property = Property.objects.create(
+            owner=cls.guest, title='Sea View', city='Goa', state='Goa', zip_code='403001',
+            price_per_night=1000, max_guests=4)
+
+    def setUp(self):
+        self.now = timezone.now()
+
+    def make_booking(self, status, starts_in_days=10, nights=3, age=timedelta()):
+        check_in = self.now + timedelta(days=starts_in_days)
+        booking = Booking.objects.create(
+            user=self.guest, property=self.property, check_in=check_in,
+            check_out=check_in + timedelta(days=nights), total_cost=3000, guests=2, status=status)
+        Booking.objects.filter(pk=booking.pk).update(created_at=self.now - age)
+        return booking
+
+    def statuses(self, *bookings):
+        return [Booking.objects.get(pk=booking.pk).status for booking in bookings]
+
+    def test_advance_moves_bookings_by_their_dates(self):
+        future = self.make_booking('confirmed')
+        started = self.make_booking('confirmed', starts_in_days=-1)
+        over = self.make_booking('confirmed', starts_in_days=-5)
+        ending = self.make_booking('ongoing', starts_in_days=-5)
+        pending = self.make_booking('pending', starts_in_days=-5)
+
+        changed = advance_booking_statuses(now=self.now, batch_size=1)
+
+        self.assertEqual(changed, {
+            'ongoing -> completed': 1, 'confirmed -> completed': 1, 'confirmed -> ongoing': 1})
+        self.assertEqual(
+            self.statuses(future, started, over, ending, pending),
+            ['confirmed', 'ongoing', 'completed', 'completed', 'pending'])
+        self.assertEqual(sum(advance_booking_statuses(now=self.now).values()), 0)
+
+    def test_expire_cancels_stale_holds_and_fails_their_payments(self):
+        stale = self.make_booking('pending', age=timedelta(hours=1))
+        fresh = self.make_booking('pending', age=timedelta(minutes=5))
+        paid = self.make_booking('confirmed', age=timedelta(hours=1))
+        payment = Payment.objects.create(
+            user=self.guest, booking=stale, amount=stale.total_cost, payment_method='upi')
+
+        expired = expire_pending_holds(now=self.now, ttl=timedelta(minutes=30), batch_size=1)
+
+        self.assertEqual(expired, {'bookings': 1, 'payments': 1})
+        self.assertEqual(self.statuses(stale, fresh, paid), ['cancelled', 'pending', 'confirmed'])
+        payment.refresh_from_db()
+        self.assertEqual(payment.payment_status, 'failed')
+
+    def test_commands_skip_while_another_run_holds_the_lock(self):
+        stale = self.make_booking('pending', age=timedelta(hours=1))
+        over = self.make_booking('confirmed', starts_in_days=-5)
+        for name in ('advance_booking_statuses', 'expire_pending_bookings'):
+            self.assertIsNotNone(JobLock.acquire(name, timedelta(minutes=10)))
+            out = io.StringIO()
+            call_command(name, stdout=out)
+            self.assertIn('Another run is in progress; skipping.', out.getvalue())
+        self.assertEqual(self.statuses(stale, over), ['pending', 'confirmed'])
+
+        # A lease left by a crashed run expires
+        JobLock.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        call_command('advance_booking_statuses', stdout=io.StringIO())
+        call_command('expire_pending_bookings', stdout=io.StringIO())
+        self.assertEqual(self.statuses(stale, over), ['cancelled', 'completed'])
 
-# Create your tests here.
+    def test_lock_is_released_after_a_run(self):
+        out = io.StringIO()
+        call_command('expire_pending_bookings', stdout=out)
+        self.assertIn('Cancelled 0 pending bookings', out.getvalue())
+        self.assertIsNone(JobLock.objects.get(name='expire_pending_bookings').locked_until)
+        self.assertIsNotNone(JobLock.acquire('expire_pending_bookings', timedelta(minutes=1)))
@@ -9,7 +9,11 @@ from properties.models import Property
 from django.core.exceptions import ValidationError
 from django.contrib.auth.mixins import LoginRequiredMixin
 from payment.models import Payment  # Assumed to be in payments app
-from django.http import JsonResponse
+from django.http import JsonResponse, Http404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from .availability import calendar_payload
+from core.metrics import bookings
 
 
 # Booking a specific property
@@ -26,9 +30,15 @@ class BookPropertyView(LoginRequiredMixin, CreateView):
         context['property'] = property_instance
         return context
 
+    def get_form_kwargs(self):
+        # The form validates against the property, so it must be set up front
+        kwargs = super().get_form_kwargs()
+        kwargs['instance'] = Booking(
+            user=self.request.user,
+            property=get_object_or_404(Property, id=self.kwargs.get('id')))
+        return kwargs
+
     def form_valid(self, form):
-        form.instance.user = self.request.user
-        form.instance.property = get_object_or_404(Property, id=self.kwargs.get('id'))
         form.instance.total_cost = form.instance.calculate_total_cost()
 
         # Check for overlapping bookings and other validations
@@ -41,6 +51,7 @@ class BookPropertyView(LoginRequiredMixin, CreateView):
         booking = form.save(commit=False)
         booking.status = 'pending'
         booking.save()
+        bookings.inc(event='created')
 
         # Redirect to the payment page
         return redirect('payments:initiate-payment', booking_id=booking.id)
@@ -72,14 +83,13 @@ class BookingUpdateView(LoginRequiredMixin, UpdateView):
 
 # Booking detail
 class BookingDetailView(LoginRequiredMixin, DetailView):
-    model = Booking
+    queryset = Booking.objects.select_related('property')
     template_name = 'booking/booking_detail.html'
     context_object_name = 'booking'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        booking = self.get_object()
-        payment = Payment.objects.filter(booking=booking).first()
+        payment = Payment.objects.filter(booking=self.object).first()
         context['payment'] = payment
         return context
 
@@ -90,7 +100,8 @@ class BookingListView(LoginRequiredMixin, ListView):
     context_object_name = 'bookings'
 
     def get_queryset(self):
-        return Booking.objects.filter(user=self.request.user).order_by('-created_at')
+        return Booking.objects.filter(user=self.request.user).select_related(
+            'property').order_by('-created_at')
 
 # Booking cancellation
 class BookingCancelView(LoginRequiredMixin, View):
@@ -142,16 +153,21 @@ class BookingConfirmView(LoginRequiredMixin, View):
         return render(request, self.template_name, {'booking': booking})
 
 
-# View to return disabled (unavailable) booking dates for a property
+# View to return disabled (unavailable) booking dates for a property as merged
+# [start, end) ranges within ?start=YYYY-MM-DD&end=YYYY-MM-DD (default: a year
+# from today). Supports conditional requests via ETag / Last-Modified.
 def disabled_dates(request, id):
-    property_instance = get_object_or_404(Property, id=id)
-    bookings = Booking.objects.filter(property=property_instance, status='confirmed')
-
-    disabled_dates = []
-    for booking in bookings:
-        # Add all dates between check-in and check-out to disabled_dates
-        date_range = [booking.check_in + timezone.timedelta(days=i)
-                      for i in range((booking.check_out - booking.check_in).days)]
-        disabled_dates.extend(date_range)
-
-    return JsonResponse(disabled_dates, safe=False)
\ No newline at end of file
+    if not Property.objects.filter(id=id).exists():
+        raise Http404("No Property matches the given query.")
+
+    payload, etag, last_modified = calendar_payload(
+        id, request.GET.get('start'), request.GET.get('end'))
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp()))
+    if response is None:
+        response = JsonResponse(payload)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
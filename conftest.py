@@ -0,0 +1,5 @@
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'my_homerent.settings')
+
+pytest_plugins = ['core.pytest_plugin']
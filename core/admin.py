@@ -1,3 +1,14 @@
 from django.contrib import admin
+from core.models import JobLock, MediaBlob
 
-# Register your models here.
+
+@admin.register(JobLock)
+class JobLockAdmin(admin.ModelAdmin):
+    list_display = ('name', 'owner', 'locked_until')
+    search_fields = ('name',)
+
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'refcount', 'created_at')
+    search_fields = ('name',)
@@ -0,0 +1,61 @@
+import os
+
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+
+@register(Tags.urls)
+def check_query_budgets(app_configs, **kwargs):
+    """
+    Every named URL needs an entry in the query budget file (core.querycount).
+    """
+    from core.querycount import load_budgets, missing_budgets
+
+    path = getattr(settings, 'QUERY_BUDGET_FILE', None)
+    if not path:
+        return []
+    if not os.path.exists(path):
+        return [Warning(f'Query budget file {path} does not exist.', id='core.W002')]
+    missing = missing_budgets(load_budgets(str(path)))
+    if not missing:
+        return []
+    return [Warning(
+        f"URL names without a query budget: {', '.join(missing)}.",
+        hint=f'Add them to {path}.',
+        id='core.W001',
+    )]
+
+
+@register(Tags.caches, deploy=True)
+def check_session_cache(app_configs, **kwargs):
+    """
+    Cached sessions need a cache every process shares, or a logout only
+    reaches the process that served it. Runs with ``check --deploy`` (the test
+    runner switches DEBUG off too).
+    """
+    if settings.DEBUG or settings.SESSION_ENGINE not in (
+            'django.contrib.sessions.backends.cache',
+            'django.contrib.sessions.backends.cached_db'):
+        return []
+    backend = settings.CACHES.get(settings.SESSION_CACHE_ALIAS, {}).get('BACKEND', '')
+    if not backend.endswith('.LocMemCache'):
+        return []
+    return [Error(
+        f"SESSION_CACHE_ALIAS '{settings.SESSION_CACHE_ALIAS}' is a per-process LocMemCache.",
+        hint='Set SESSION_CACHE_URL to a shared cache, or use the db session engine.',
+        id='core.E001',
+    )]
+
+
+@register(deploy=True)
+def check_metrics_token(app_configs, **kwargs):
+    """
+    Outside DEBUG /metrics/ is only served to scrapers with METRICS_TOKEN.
+    """
+    if settings.DEBUG or settings.METRICS_TOKEN:
+        return []
+    return [Error(
+        'METRICS_TOKEN is not set, so /metrics/ refuses every request.',
+        hint='Set METRICS_TOKEN and have the scraper send it as a bearer token.',
+        id='core.E002',
+    )]
@@ -0,0 +1,64 @@
+import io
+import statistics
+import time
+
+from django import forms
+from django.core.files.images import get_image_dimensions
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from core.validators import HeaderImageField, inspect_image
+
+
+class Command(BaseCommand):
+    help = ('Compare full-decode upload validation (forms.ImageField + get_image_dimensions) '
+            'with the header-only validator on large synthetic images.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000x750,3000x2000,6000x4000',
+                            help='Comma-separated WIDTHxHEIGHT images to test.')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        for size in options['sizes'].split(','):
+            width, height = (int(part) for part in size.split('x'))
+            for image_format, extension in (('JPEG', 'jpg'), ('PNG', 'png'), ('WEBP', 'webp')):
+                data = self.make_image(width, height, image_format)
+                before = self.time(data, extension, self.full_decode, options['repeat'])
+                after = self.time(data, extension, self.header_only, options['repeat'])
+                self.stdout.write(
+                    f'{size} {image_format:<4} {len(data) / 1024 / 1024:6.1f}MB: '
+                    f'full decode {before:8.2f}ms, header only {after:6.3f}ms '
+                    f'({before / after:,.0f}x)')
+
+    def make_image(self, width, height, image_format):
+        image = Image.effect_noise((width, height), 64).convert('RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, image_format, quality=90)
+        return buffer.getvalue()
+
+    def upload(self, data, extension):
+        # Uploads above FILE_UPLOAD_MAX_MEMORY_SIZE arrive as temporary files
+        upload = TemporaryUploadedFile(f'bench.{extension}', 'image/jpeg', len(data), None)
+        upload.write(data)
+        upload.seek(0)
+        return upload
+
+    def full_decode(self, upload):
+        forms.ImageField().to_python(upload)
+        get_image_dimensions(upload)
+
+    def header_only(self, upload):
+        HeaderImageField().to_python(upload)
+        inspect_image(upload)
+
+    def time(self, data, extension, validate, repeat):
+        timings = []
+        for _ in range(repeat):
+            upload = self.upload(data, extension)
+            started = time.perf_counter()
+            validate(upload)
+            timings.append((time.perf_counter() - started) * 1000)
+            upload.close()
+        return statistics.median(timings)
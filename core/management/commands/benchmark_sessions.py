@@ -0,0 +1,72 @@
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from accounts.models import CustomUser
+
+# Database-backed sessions saved on every request, as configured before
+BASELINE = {
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+    'SESSION_SAVE_EVERY_REQUEST': True,
+    'SESSION_REFRESH_INTERVAL': 0,
+}
+
+
+class Command(BaseCommand):
+    help = ('Count django_session reads and writes per request for a logged-in user, with '
+            'database sessions saved on every request and with the current settings.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests per configuration.')
+        parser.add_argument('--paths', default='/,/properties/,/accounts/user_dashboard/',
+                            help='Comma-separated paths requested in turn.')
+
+    def handle(self, *args, **options):
+        paths = options['paths'].split(',')
+        user = CustomUser.objects.create(
+            username=f'session-bench-{uuid.uuid4().hex[:8]}', profile_pic='')
+        try:
+            baseline = self.run(user, paths, options['requests'], BASELINE)
+            current = self.run(user, paths, options['requests'], {})
+        finally:
+            user.delete()
+
+        self.stdout.write(f"{'configuration':<28}{'reads/req':>10}{'writes/req':>11}{'ms/req':>8}")
+        for label, (counts, elapsed) in (('db, saved every request', baseline),
+                                         (f'{settings.SESSION_ENGINE.rsplit(".", 1)[-1]}, '
+                                          f'refresh {settings.SESSION_REFRESH_INTERVAL}s', current)):
+            requests = options['requests']
+            writes = counts['INSERT'] + counts['UPDATE'] + counts['DELETE']
+            self.stdout.write(f"{label:<28}{counts['SELECT'] / requests:>10.2f}"
+                              f"{writes / requests:>11.2f}{elapsed * 1000 / requests:>8.2f}")
+        saved = sum(baseline[0][kind] - current[0][kind] for kind in ('INSERT', 'UPDATE', 'DELETE'))
+        self.stdout.write(self.style.SUCCESS(
+            f'{saved / options["requests"]:.2f} session writes saved per request.'))
+
+    def run(self, user, paths, requests, overrides):
+        counts = Counter()
+
+        def count(execute, sql, params, many, context):
+            if 'django_session' in sql:
+                counts[sql.split(None, 1)[0].upper()] += 1
+            return execute(sql, params, many, context)
+
+        with override_settings(**overrides):
+            caches[settings.SESSION_CACHE_ALIAS].clear()
+            client = Client(raise_request_exception=False)
+            client.force_login(user)
+            started = time.perf_counter()
+            with connection.execute_wrapper(count):
+                for i in range(requests):
+                    client.get(paths[i % len(paths)])
+            elapsed = time.perf_counter() - started
+            client.logout()
+        return counts, elapsed
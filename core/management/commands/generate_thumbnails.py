@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts.models import CustomUser
+from core.thumbnails import generate
+from properties.models import Property, PropertyImage
+
+SOURCES = [
+    (Property, 'primary_image'),
+    (PropertyImage, 'image'),
+    (CustomUser, 'profile_pic'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Generate missing thumbnails for every stored property image and profile picture.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Regenerate thumbnails that already exist.')
+
+    def handle(self, *args, **options):
+        names = set()
+        for model, field in SOURCES:
+            names.update(
+                model._default_manager.exclude(**{f'{field}__in': ['', None]})
+                .values_list(field, flat=True).distinct())
+
+        def run(name):
+            try:
+                return bool(generate(name, force=options['force']))
+            except Exception as exc:
+                self.stderr.write(f'{name}: {exc}')
+                return None
+
+        with ThreadPoolExecutor(settings.THUMBNAIL_WORKERS) as pool:
+            results = list(pool.map(run, sorted(names)))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{results.count(True)} generated, {results.count(False)} already present, '
+            f'{results.count(None)} failed, out of {len(names)} images.'))
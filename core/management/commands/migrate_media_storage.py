@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.management.commands.generate_thumbnails import SOURCES
+from core.models import JobLock
+from core.storage import incref, is_blob, recount_media
+from core.thumbnails import delete_derivatives
+
+
+class Command(BaseCommand):
+    help = ('Move uploaded media stored by file name into the content-addressed layout, '
+            'pointing every row at its blob and counting the references.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report the files that would be moved.')
+        parser.add_argument('--delete-originals', action='store_true',
+                            help='Delete the old files (and their thumbnails) once moved.')
+        parser.add_argument('--recount', action='store_true',
+                            help='Afterwards rebuild every reference count from the rows.')
+        parser.add_argument('--lock-ttl', type=int, default=3600,
+                            help='Seconds after which a lock left by a crashed run expires.')
+
+    def handle(self, *args, **options):
+        with JobLock.hold('migrate_media_storage', timedelta(seconds=options['lock_ttl'])) as locked:
+            if not locked:
+                self.stdout.write(self.style.WARNING('Another run is in progress; skipping.'))
+                return
+            self.migrate(options)
+
+    def migrate(self, options):
+        legacy = FileSystemStorage(location=settings.MEDIA_ROOT, base_url=settings.MEDIA_URL)
+        moved = rows = missing = 0
+        blobs, originals = set(), set()
+        for model, field in SOURCES:
+            default = model._meta.get_field(field).get_default()
+            names = (
+                model._base_manager.exclude(**{f'{field}__in': ['', default]})
+                .exclude(**{f'{field}__isnull': True})
+                .values_list(field, flat=True).distinct())
+            for name in list(names):
+                if is_blob(name):
+                    continue
+                if not legacy.exists(name):
+                    self.stderr.write(f'{model.__name__}.{field}: {name} is missing; left as is.')
+                    missing += 1
+                    continue
+                if options['dry_run']:
+                    moved += 1
+                    continue
+
+                with legacy.open(name, 'rb') as source:
+                    blob = default_storage.save(name, source)
+                with transaction.atomic():
+                    updated = model._base_manager.filter(**{field: name}).update(**{field: blob})
+                    incref(blob, updated)
+                if blob != name:
+                    originals.add(name)
+                moved += 1
+                rows += updated
+                blobs.add(blob)
+
+        # Only once every model has moved, as rows of several models can share a file
+        if options['delete_originals']:
+            for name in originals:
+                legacy.delete(name)
+                delete_derivatives(name, legacy)
+
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {moved} files into {len(blobs)} blobs ({rows} rows updated, {missing} missing).'))
+
+        if options['recount'] and not options['dry_run']:
+            counted = recount_media(SOURCES)
+            self.stdout.write(self.style.SUCCESS(f'Recounted references of {counted} blobs.'))
@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+
+from core.models import JobLock
+from core.sessions import (
+    BATCH_SIZE, VACUUM_THRESHOLD, compact_database, database_size, purge_expired_sessions)
+
+
+class Command(BaseCommand):
+    help = ('Delete expired sessions in small batches, then on SQLite VACUUM the database '
+            'once enough space is free and ANALYZE the sessions table.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Sessions deleted per transaction.')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to wait between batches.')
+        parser.add_argument('--vacuum-threshold', type=int, default=VACUUM_THRESHOLD,
+                            help='Free bytes in the SQLite file above which it is vacuumed.')
+        parser.add_argument('--vacuum', action='store_true',
+                            help='Vacuum regardless of the threshold.')
+        parser.add_argument('--lock-ttl', type=int, default=3600,
+                            help='Seconds after which a lock left by a crashed run expires.')
+
+    def handle(self, *args, **options):
+        with JobLock.hold('purge_sessions', timedelta(seconds=options['lock_ttl'])) as locked:
+            if not locked:
+                self.stdout.write(self.style.WARNING('Another run is in progress; skipping.'))
+                return
+
+            deleted = purge_expired_sessions(options['batch_size'], options['pause'])
+            remaining = Session.objects.count()
+            self.stdout.write(self.style.SUCCESS(
+                f'Deleted {deleted} expired sessions; {remaining} remain.'))
+
+            size = database_size()
+            if size is None:
+                return
+            reclaimed = compact_database(options['vacuum_threshold'], options['vacuum'])
+            if reclaimed is None:
+                self.stdout.write(
+                    f'Database is {size[0]} bytes with {size[1]} free; below the vacuum threshold.')
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Vacuumed: {size[0]} -> {size[0] - reclaimed} bytes ({reclaimed} reclaimed).'))
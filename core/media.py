@@ -0,0 +1,158 @@
+"""
+Serving of uploaded media.
+
+serve_media() answers conditional requests (ETag, If-None-Match,
+If-Modified-Since) with 304 and single byte-range requests (Range, If-Range)
+with 206. When settings.MEDIA_SENDFILE names a front-server offload header,
+the response carries no body: 'x-accel-redirect' hands nginx the path under
+MEDIA_ACCEL_REDIRECT_PREFIX (an `internal` location aliased to MEDIA_ROOT)
+and 'x-sendfile' hands Apache/lighttpd the file path, and the front server
+does the transfer, ranges included. Otherwise whole files go out as a
+FileResponse, which the WSGI server can send with sendfile(), and ranges are
+streamed from the open file.
+
+MediaMiddleware routes MEDIA_URL to serve_media() before the session and
+auth middleware run.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from core.storage import BLOB_PREFIX
+
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+MEDIA_MAX_AGE = 60 * 60
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single-range Range header, None to ignore
+    it (absent, malformed or several ranges), or False if it cannot be
+    satisfied.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if not length:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        return False
+    if end < start:
+        return None
+    return start, end
+
+
+def read_range(handle, start, length):
+    try:
+        handle.seek(start)
+        while length > 0:
+            data = handle.read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        handle.close()
+
+
+def cache_control(name):
+    # Blobs (and thumbnails named after them) never change under the same name
+    if name.startswith((BLOB_PREFIX, f'thumbs/{BLOB_PREFIX}')):
+        return f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f'public, max-age={MEDIA_MAX_AGE}'
+
+
+def sendfile_response(name, path):
+    response = HttpResponse(content_type=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+        response.headers['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(name)
+    else:
+        response.headers['X-Sendfile'] = path
+    return response
+
+
+def serve_media(request, path):
+    """
+    Serve MEDIA_ROOT/`path`.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (OSError, ValueError):
+        raise Http404('Media file not found.')
+    if not os.path.isfile(full_path):
+        raise Http404('Media file not found.')
+
+    etag = '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+    # A 304 carries the same validators and caching headers as the 200 would
+    # (RFC 9110 section 15.4.5)
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None and settings.MEDIA_SENDFILE:
+        response = sendfile_response(path, full_path)
+    elif response is None:
+        response = file_response(request, full_path, stat, etag)
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(stat.st_mtime)
+    response.headers['Cache-Control'] = cache_control(path)
+    return response
+
+
+def file_response(request, full_path, stat, etag):
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    byte_range = None
+    if request.method == 'GET' and 'HTTP_RANGE' in request.META:
+        if_range = request.META.get('HTTP_IF_RANGE')
+        # A stale If-Range means the client's partial copy is outdated: send it all
+        if not if_range or if_range == etag or parse_http_date_safe(if_range) == int(stat.st_mtime):
+            byte_range = parse_range(request.META['HTTP_RANGE'], stat.st_size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response.headers['Content-Range'] = f'bytes */{stat.st_size}'
+    elif byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            read_range(open(full_path, 'rb'), start, end - start + 1),
+            status=206, content_type=content_type)
+        response.headers['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response.headers['Content-Length'] = str(end - start + 1)
+    else:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+
+class MediaMiddleware:
+    """
+    Serve MEDIA_URL with serve_media(). Place it near the top of MIDDLEWARE,
+    before the session and auth middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = '/' + settings.MEDIA_URL.lstrip('/')
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix):
+            try:
+                return serve_media(request, request.path_info[len(self.prefix):])
+            except Http404:
+                pass
+        return self.get_response(request)
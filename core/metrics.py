@@ -0,0 +1,250 @@
+"""
+Counters and histograms exported in the Prometheus text format.
+
+Metrics are declared once at import time (see the bottom of this module) and
+updated from the code paths they describe:
+
+    bookings.inc(event='created')
+    with gateway_duration.time(operation='POST /v1/orders'):
+        ...
+
+Updates are a dict lookup and a few additions under a lock. The metrics view
+(core.views) renders everything at /metrics/ for scrapers that pass
+can_scrape(): a bearer token when METRICS_TOKEN is set, otherwise a client
+address in METRICS_ALLOWED_IPS. Behind a reverse proxy REMOTE_ADDR is the
+proxy's address, so the client address is taken from X-Forwarded-For only
+when REMOTE_ADDR is one of METRICS_TRUSTED_PROXIES; a forwarded request from
+any other address is refused.
+
+Pre-forked WSGI servers run several processes with separate memory. When
+settings.METRICS_MULTIPROCESS_DIR is set, each process writes its values to
+its own file there (at most every METRICS_FLUSH_INTERVAL seconds, and at
+exit) and /metrics/ adds up the files of all processes, so any worker can
+answer a scrape. Point the directory at a tmpfs and empty it when the server
+restarts; counters of exited workers are kept until then.
+"""
+import atexit
+import hmac
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+
+PREFIX = 'homerent_'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} takes labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry.update(self, self.key(labels), lambda value: (value or 0) + amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(registry, name, documentation, labelnames)
+
+    def observe(self, value, **labels):
+        def add(state):
+            # Per-bucket counts (not cumulative) followed by the sum
+            state = state or [0] * (len(self.buckets) + 1) + [0.0]
+            index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+            state[index] += 1
+            state[-1] += value
+            return state
+
+        self.registry.update(self, self.key(labels), add)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.values = {}
+        self.pid = None
+        self.last_flush = 0.0
+        self.path = None
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def update(self, metric, key, change):
+        with self.lock:
+            self.check_process()
+            series = self.values.setdefault(metric.name, {})
+            series[key] = change(series.get(key))
+            if self.path and time.monotonic() - self.last_flush >= settings.METRICS_FLUSH_INTERVAL:
+                self.write()
+
+    def check_process(self):
+        # A forked worker starts empty; its parent's values stay in the parent's file
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.values = {}
+            directory = getattr(settings, 'METRICS_MULTIPROCESS_DIR', None)
+            self.path = (
+                os.path.join(directory, f'{self.pid}-{uuid.uuid4().hex[:8]}.json') if directory else None)
+
+    def write(self):
+        payload = {
+            name: [[list(key), value] for key, value in series.items()]
+            for name, series in self.values.items()
+        }
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as handle:
+            json.dump(payload, handle)
+        os.replace(temporary, self.path)
+        self.last_flush = time.monotonic()
+
+    def flush(self):
+        with self.lock:
+            self.check_process()
+            if self.path:
+                self.write()
+
+    def collect(self):
+        """
+        {metric name: {label values: value}} for this process, or summed over
+        every process's file in multiprocess mode.
+        """
+        self.flush()
+        with self.lock:
+            if not self.path:
+                return {name: dict(series) for name, series in self.values.items()}
+            directory = os.path.dirname(self.path)
+
+        totals = {}
+        for file_name in os.listdir(directory):
+            if not file_name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, file_name), encoding='utf-8') as handle:
+                    payload = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            for name, series in payload.items():
+                merged = totals.setdefault(name, {})
+                for key, value in series:
+                    key = tuple(key)
+                    current = merged.get(key)
+                    if current is None:
+                        merged[key] = value
+                    elif isinstance(value, list):
+                        merged[key] = [a + b for a, b in zip(current, value)]
+                    else:
+                        merged[key] = current + value
+        return totals
+
+    def render(self):
+        """
+        The Prometheus text exposition (version 0.0.4) of every metric.
+        """
+        values = self.collect()
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for key, value in sorted(values.get(name, {}).items()):
+                labels = [f'{label}="{escape(item)}"' for label, item in zip(metric.labelnames, key)]
+                if metric.kind == 'counter':
+                    lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), value[:-1]):
+                    cumulative += count
+                    le = 'le="{}"'.format('+Inf' if bound == float('inf') else format_value(bound))
+                    lines.append(f'{name}_bucket{format_labels(labels + [le])} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {format_value(value[-1])}')
+                lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def client_address(request):
+    """
+    The scraper's address, or None if it cannot be trusted.
+    """
+    remote = request.META.get('REMOTE_ADDR')
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if remote in settings.METRICS_TRUSTED_PROXIES:
+        # The last entry is the one our proxy appended; earlier ones are client-supplied
+        hops = [hop.strip() for hop in (forwarded or '').split(',') if hop.strip()]
+        return hops[-1] if hops else None
+    return None if forwarded else remote
+
+
+def can_scrape(request):
+    """
+    The bearer token decides when METRICS_TOKEN is set. The address allow-list
+    alone is only trusted under DEBUG: a local proxy that does not send
+    X-Forwarded-For makes every visitor look like loopback.
+    """
+    if settings.METRICS_TOKEN:
+        expected = f'Bearer {settings.METRICS_TOKEN}'
+        return hmac.compare_digest(request.headers.get('Authorization', ''), expected)
+    return settings.DEBUG and client_address(request) in settings.METRICS_ALLOWED_IPS
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(labels):
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+atexit.register(lambda: registry.path and registry.flush())
+
+
+bookings = Counter(
+    registry, 'bookings_total', 'Bookings created, cancelled and confirmed.', ['event'])
+payment_verifications = Counter(
+    registry, 'payment_verifications_total', 'Payment signature verifications.', ['result'])
+refunds = Counter(
+    registry, 'refunds_total', 'Refund attempts made with the gateway.', ['result'])
+gateway_duration = Histogram(
+    registry, 'gateway_request_duration_seconds', 'Payment gateway API call latency.',
+    ['operation', 'outcome'])
+search_requests = Counter(
+    registry, 'search_requests_total', 'Listing and search page requests.', ['view'])
+search_duration = Histogram(
+    registry, 'search_request_duration_seconds', 'Listing and search page latency.', ['view'])
+search_cache = Counter(
+    registry, 'search_cache_total', 'Listing result cache lookups.', ['result'])
@@ -1,3 +1,70 @@
-from django.db import models
+import os
+import socket
+import uuid
+from contextlib import contextmanager
 
-# Create your models here.
+from django.db import models, IntegrityError
+from django.db.models import Q
+from django.utils import timezone
+
+
+class JobLock(models.Model):
+    """
+    Named lease held by a scheduled job so that overlapping runs of the same
+    job (e.g. a slow cron tick) skip instead of doing the work twice.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    owner = models.CharField(max_length=255, blank=True)
+    locked_until = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def acquire(cls, name, ttl):
+        """
+        Take the lock for `ttl` (a timedelta). Returns an owner token, or None
+        if another run holds an unexpired lease.
+        """
+        try:
+            cls.objects.get_or_create(name=name)
+        except IntegrityError:
+            pass  # Created concurrently by another run
+
+        now = timezone.now()
+        owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}'
+        acquired = cls.objects.filter(
+            Q(locked_until__isnull=True) | Q(locked_until__lte=now), name=name
+        ).update(owner=owner, locked_until=now + ttl)
+        return owner if acquired else None
+
+    @classmethod
+    def release(cls, name, owner):
+        cls.objects.filter(name=name, owner=owner).update(locked_until=None)
+
+    @classmethod
+    @contextmanager
+    def hold(cls, name, ttl):
+        """
+        Context manager yielding True if the lock was taken, False otherwise.
+        """
+        owner = cls.acquire(name, ttl)
+        try:
+            yield owner is not None
+        finally:
+            if owner:
+                cls.release(name, owner)
+
+
+class MediaBlob(models.Model):
+    """
+    Reference count of a content-addressed media file (see core.storage).
+    The file is deleted when the last row using it lets go.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refcount = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount} refs)'
@@ -0,0 +1,213 @@
+"""
+Per-view performance instrumentation.
+
+PerformanceMiddleware measures a sample of requests (settings.PERF_SAMPLE_RATE)
+and records, per resolved URL name: wall time, number of DB queries, DB time,
+template render time and response size. Each measure goes into a
+RollingHistogram: fixed buckets counted per minute over the last
+PERF_WINDOW_MINUTES minutes, so recording is a few integer increments and
+memory does not grow with traffic. Sampled responses also carry a
+Server-Timing header (when PERF_SERVER_TIMING is on) that browser dev tools
+show next to the request.
+
+Template time comes from TimedDjangoTemplates, a DjangoTemplates backend that
+times each top-level render; use it as the TEMPLATES backend. Staff can
+read the histograms at /perf/ (core.views.performance_stats_view).
+"""
+import bisect
+import contextvars
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+from django.db import connection
+
+# Upper bucket bounds per measure; values above the last go in an overflow bucket
+BOUNDS = {
+    'wall_ms': (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+    'db_ms': (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000),
+    'template_ms': (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+    'queries': (0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+    'response_bytes': (1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+}
+WINDOW_SECONDS = 60
+
+# Measures of the request being handled, for the template backend
+_current = contextvars.ContextVar('perf_request', default=None)
+
+
+class RollingHistogram:
+    """
+    Bucketed counts of recent values, one set per minute for `windows`
+    minutes. Not thread-safe on its own; PerformanceStats holds the lock.
+    """
+
+    def __init__(self, bounds, windows):
+        self.bounds = bounds
+        self.slots = [[None, [0] * (len(bounds) + 1), 0.0, 0.0] for _ in range(windows)]
+
+    def record(self, value, now):
+        epoch = int(now // WINDOW_SECONDS)
+        slot = self.slots[epoch % len(self.slots)]
+        if slot[0] != epoch:
+            slot[:] = [epoch, [0] * (len(self.bounds) + 1), 0.0, 0.0]
+        slot[1][bisect.bisect_left(self.bounds, value)] += 1
+        slot[2] += value
+        slot[3] = max(slot[3], value)
+
+    def snapshot(self, now):
+        """
+        {count, mean, max, p50, p95, p99, buckets} over the live windows.
+        Percentiles are bucket upper bounds (None in the overflow bucket).
+        """
+        oldest = int(now // WINDOW_SECONDS) - len(self.slots) + 1
+        counts = [0] * (len(self.bounds) + 1)
+        total = maximum = 0.0
+        for epoch, slot_counts, slot_total, slot_max in self.slots:
+            if epoch is not None and epoch >= oldest:
+                counts = [a + b for a, b in zip(counts, slot_counts)]
+                total += slot_total
+                maximum = max(maximum, slot_max)
+        count = sum(counts)
+        if not count:
+            return None
+
+        def percentile(fraction):
+            rank, seen = fraction * count, 0
+            for index, bucket in enumerate(counts):
+                seen += bucket
+                if seen >= rank:
+                    return self.bounds[index] if index < len(self.bounds) else None
+
+        return {
+            'count': count,
+            'mean': round(total / count, 2),
+            'max': round(maximum, 2),
+            'p50': percentile(0.50),
+            'p95': percentile(0.95),
+            'p99': percentile(0.99),
+            'buckets': {
+                (f'le_{bound}' if index < len(self.bounds) else 'more'): bucket
+                for index, (bound, bucket) in enumerate(zip(self.bounds + (None,), counts))
+            },
+        }
+
+
+class PerformanceStats:
+    """
+    Thread-safe {view name: {measure: RollingHistogram}}.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def record(self, view_name, measures, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            histograms = self.views.get(view_name)
+            if histograms is None:
+                windows = settings.PERF_WINDOW_MINUTES
+                histograms = self.views[view_name] = {
+                    measure: RollingHistogram(bounds, windows) for measure, bounds in BOUNDS.items()}
+            for measure, histogram in histograms.items():
+                histogram.record(measures[measure], now)
+
+    def snapshot(self, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            result = {}
+            for view_name, histograms in self.views.items():
+                measures = {measure: histogram.snapshot(now) for measure, histogram in histograms.items()}
+                if measures['wall_ms']:
+                    result[view_name] = measures
+            return result
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+
+performance_stats = PerformanceStats()
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        measures = _current.get()
+        # Templates rendered from inside another render are already being timed
+        if measures is None or measures['rendering']:
+            return super().render(context, request)
+        measures['rendering'] = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            measures['rendering'] = False
+            measures['template_ms'] += (time.perf_counter() - started) * 1000
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    DjangoTemplates backend whose templates report their render time to
+    PerformanceMiddleware.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def response_size(response):
+    if response.streaming:
+        return int(response.headers.get('Content-Length') or 0)
+    return len(response.content)
+
+
+class PerformanceMiddleware:
+    """
+    Measure a PERF_SAMPLE_RATE fraction of requests into performance_stats
+    and add a Server-Timing header to them.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.PERF_SAMPLE_RATE
+        self.server_timing = settings.PERF_SERVER_TIMING
+
+    def __call__(self, request):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        measures = {'queries': 0, 'db_ms': 0.0, 'template_ms': 0.0, 'rendering': False}
+
+        def time_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                measures['queries'] += 1
+                measures['db_ms'] += (time.perf_counter() - started) * 1000
+
+        token = _current.set(measures)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(time_query):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        measures['wall_ms'] = (time.perf_counter() - started) * 1000
+        measures['response_bytes'] = response_size(response)
+
+        match = request.resolver_match
+        performance_stats.record(match.view_name if match else '<unresolved>', measures)
+        if self.server_timing:
+            response.headers['Server-Timing'] = (
+                f"total;dur={measures['wall_ms']:.1f}, "
+                f"db;dur={measures['db_ms']:.1f};desc=\"{measures['queries']} queries\", "
+                f"tpl;dur={measures['template_ms']:.1f}")
+        return response
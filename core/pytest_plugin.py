@@ -0,0 +1,60 @@
+"""
+pytest plugin for the query budgets in core.querycount.
+
+The project's conftest.py loads it. Tests still need database access the
+usual way (for example pytest-django's `db` fixture).
+
+Fixtures:
+- budgeted_client: a BudgetedClient; a request whose view goes over its
+  budget, or runs the same query shape too often, fails the test.
+- query_budget: the core.querycount.query_budget context manager, for code
+  outside a request: `with query_budget(max_queries=2): ...`.
+
+Marker:
+- @pytest.mark.query_budget(max_queries=..., max_repeats=...) overrides the
+  budget file for the budgeted_client requests of one test.
+
+--check-query-budgets stops the run before any test if a named URL has no
+entry in the budget file.
+"""
+import os
+
+import pytest
+
+from core import querycount
+
+
+def pytest_addoption(parser):
+    parser.addoption('--check-query-budgets', action='store_true',
+                     help='Fail if a named URL has no entry in the query budget file.')
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers', 'query_budget(max_queries=None, max_repeats=None): override the query budget '
+                   'for the requests made through budgeted_client.')
+
+
+def pytest_sessionstart(session):
+    if not session.config.getoption('check_query_budgets'):
+        return
+    import django
+    from django.apps import apps
+
+    if not apps.ready and os.environ.get('DJANGO_SETTINGS_MODULE'):
+        django.setup()
+    missing = querycount.missing_budgets()
+    if missing:
+        raise pytest.UsageError('URL names without a query budget: ' + ', '.join(missing))
+
+
+@pytest.fixture
+def budgeted_client(request):
+    marker = request.node.get_closest_marker('query_budget')
+    budget = {key: value for key, value in (marker.kwargs if marker else {}).items() if value is not None}
+    return querycount.BudgetedClient(budget=budget)
+
+
+@pytest.fixture
+def query_budget():
+    return querycount.query_budget
@@ -0,0 +1,174 @@
+"""
+Query budgets and N+1 detection for views.
+
+settings.QUERY_BUDGET_FILE (query_budgets.json) declares, per URL name, the
+most queries a request may run ("max_queries") and how many times the same
+query shape may repeat ("max_repeats"); keys may be fnmatch patterns such as
+"admin:*", and "default" applies to the rest. A query shape is the SQL with
+literals and IN lists collapsed, so a query issued once per row of a loop
+(the N+1 pattern) shows up as one shape with a large count.
+
+QueryRecorder captures the SQL of a block; check_budget() raises
+QueryBudgetExceeded (an AssertionError) with the offending queries.
+BudgetedClient is a test Client that checks every request against the
+budget of the view it resolved to. core.pytest_plugin wraps these as
+fixtures, and the core.W001 system check reports URL names missing from the
+budget file.
+"""
+import fnmatch
+import json
+import re
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections
+from django.test import Client
+from django.urls import Resolver404, URLResolver, get_resolver
+
+DEFAULT_BUDGET = {'max_queries': 20, 'max_repeats': 3}
+
+# Transaction control repeats legitimately and says nothing about the view
+IGNORED = re.compile(r'^\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b', re.I)
+LITERALS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)'), '(...)'),
+    (re.compile(r'%s'), '?'),
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_shape(sql):
+    for pattern, replacement in LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return ' '.join(sql.split())
+
+
+class QueryRecorder:
+    """
+    Context manager recording the SQL run on `using` connections (all by default).
+    """
+
+    def __init__(self, using=None):
+        self.using = using
+        self.queries = []
+
+    def __enter__(self):
+        aliases = [self.using] if self.using else list(connections)
+        self.wrappers = [connections[alias].execute_wrapper(self.record) for alias in aliases]
+        for wrapper in self.wrappers:
+            wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        for wrapper in reversed(self.wrappers):
+            wrapper.__exit__(*exc_info)
+
+    def record(self, execute, sql, params, many, context):
+        if not IGNORED.match(sql):
+            self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def repeated(self, limit):
+        """
+        [(shape, count)] of the query shapes run more than `limit` times.
+        """
+        counts = Counter(query_shape(sql) for sql in self.queries)
+        return [(shape, count) for shape, count in counts.most_common() if count > limit]
+
+
+@lru_cache(maxsize=None)
+def load_budgets(path=None):
+    with open(path or settings.QUERY_BUDGET_FILE, encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def budget_for(view_name, budgets=None):
+    budgets = budgets if budgets is not None else load_budgets()
+    budget = dict(DEFAULT_BUDGET, **budgets.get('default', {}))
+    views = budgets.get('views', {})
+    if view_name in views:
+        return dict(budget, **views[view_name])
+    for pattern, values in views.items():
+        if fnmatch.fnmatchcase(view_name, pattern):
+            return dict(budget, **values)
+    return budget
+
+
+def check_budget(recorder, label, max_queries, max_repeats):
+    problems = []
+    if len(recorder.queries) > max_queries:
+        problems.append(f'{len(recorder.queries)} queries (budget {max_queries})')
+    for shape, count in recorder.repeated(max_repeats):
+        problems.append(f'same query {count} times (max {max_repeats}), likely N+1: {shape}')
+    if problems:
+        listing = '\n'.join(f'  {number}. {sql}' for number, sql in enumerate(recorder.queries, 1))
+        raise QueryBudgetExceeded(f'{label}: ' + '; '.join(problems) + f'\nQueries run:\n{listing}')
+
+
+@contextmanager
+def query_budget(max_queries=None, max_repeats=None, view_name=None, using=None):
+    """
+    Fail the block if it runs too many queries or repeats one too often.
+    Limits not given come from the budget of `view_name` (or the default).
+    """
+    budget = budget_for(view_name) if view_name else dict(DEFAULT_BUDGET, **load_budgets().get('default', {}))
+    max_queries = budget['max_queries'] if max_queries is None else max_queries
+    max_repeats = budget['max_repeats'] if max_repeats is None else max_repeats
+    with QueryRecorder(using) as recorder:
+        yield recorder
+    check_budget(recorder, view_name or 'block', max_queries, max_repeats)
+
+
+class BudgetedClient(Client):
+    """
+    Test client that checks each request against the query budget of the
+    view it resolves to. `budget` overrides the file for every request.
+    """
+
+    def __init__(self, *args, budget=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.budget = budget or {}
+
+    def request(self, **request):
+        with QueryRecorder() as recorder:
+            response = super().request(**request)
+        try:
+            # resolver_match resolves lazily and fails for paths with no view
+            view_name = response.resolver_match.view_name
+        except (AttributeError, Resolver404):
+            view_name = None
+        if view_name is not None:
+            budget = dict(budget_for(view_name), **self.budget)
+            check_budget(recorder, f"{view_name} ({request.get('PATH_INFO')})",
+                         budget['max_queries'], budget['max_repeats'])
+        return response
+
+
+def url_names(patterns=None, namespace=None):
+    """
+    Yield the (namespaced) name of every named URL pattern.
+    """
+    for pattern in patterns if patterns is not None else get_resolver().url_patterns:
+        if isinstance(pattern, URLResolver):
+            inner = namespace
+            if pattern.namespace:
+                inner = f'{namespace}:{pattern.namespace}' if namespace else pattern.namespace
+            yield from url_names(pattern.url_patterns, inner)
+        elif pattern.name:
+            yield f'{namespace}:{pattern.name}' if namespace else pattern.name
+
+
+def missing_budgets(budgets=None):
+    """
+    URL names that have no entry (or matching pattern) in the budget file.
+    """
+    views = (budgets if budgets is not None else load_budgets()).get('views', {})
+    return sorted(
+        name for name in set(url_names())
+        if name not in views and not any(fnmatch.fnmatchcase(name, pattern) for pattern in views))
@@ -0,0 +1,71 @@
+"""
+Housekeeping for the django_session table.
+
+purge_expired_sessions() deletes expired sessions in batches of primary
+keys, one short transaction per batch (optionally pausing between batches),
+so requests that save sessions never wait long behind it. On SQLite, deleted
+rows only turn into free pages inside the database file; compact_database()
+runs VACUUM once those free pages reach a threshold, and ANALYZE to refresh
+the planner statistics.
+"""
+import time
+
+from django.contrib.sessions.models import Session
+from django.db import connection, transaction
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+VACUUM_THRESHOLD = 64 * 1024 * 1024
+
+
+def purge_expired_sessions(batch_size=BATCH_SIZE, pause=0.0, now=None):
+    """
+    Delete sessions that expired before `now`. Returns the number deleted.
+    """
+    now = now or timezone.now()
+    expired = Session.objects.filter(expire_date__lt=now)
+    deleted = 0
+    while True:
+        keys = list(expired.values_list('session_key', flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        with transaction.atomic():
+            # Sessions extended since they were read are kept
+            count, _ = expired.filter(session_key__in=keys).delete()
+        deleted += count
+        if pause:
+            time.sleep(pause)
+
+
+def database_size():
+    """
+    (total bytes, free bytes) of the SQLite database file, or None on other
+    databases.
+    """
+    if connection.vendor != 'sqlite':
+        return None
+    values = []
+    with connection.cursor() as cursor:
+        for pragma in ('page_size', 'page_count', 'freelist_count'):
+            cursor.execute(f'PRAGMA {pragma}')
+            values.append(cursor.fetchone()[0])
+    page_size, pages, free = values
+    return pages * page_size, free * page_size
+
+
+def compact_database(threshold=VACUUM_THRESHOLD, force=False):
+    """
+    On SQLite, VACUUM once at least `threshold` bytes are free (or always
+    with force) and ANALYZE the sessions table. Returns the bytes reclaimed,
+    or None if nothing was done.
+    """
+    size = database_size()
+    if size is None:
+        return None
+    total, free = size
+    with connection.cursor() as cursor:
+        cursor.execute(f'ANALYZE {Session._meta.db_table}')
+        if not force and free < threshold:
+            return None
+        cursor.execute('VACUUM')
+    return total - database_size()[0]
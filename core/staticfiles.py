@@ -0,0 +1,204 @@
+"""
+Fingerprinted, precompressed static files.
+
+collectstatic with CompressedManifestStaticFilesStorage writes every file under
+a content-hashed name (css/styles.3f2a9c81d0e4.css) as Django's manifest
+storage does, then a gzip copy (.gz) and, when the brotli package is
+installed, a brotli copy (.br) of each hashed text asset, kept only when it
+is smaller. The manifest (STATIC_ROOT/staticfiles.json) also records which
+encodings each hashed file has, so serving never has to look for them.
+
+StaticAssetMiddleware serves STATIC_URL from STATIC_ROOT using that manifest:
+hashed names are cached for a year as immutable, and the precompressed variant
+the client accepts (brotli, then gzip) is sent with Content-Encoding. Files
+that are not in the manifest are left to the rest of the stack.
+"""
+import gzip
+import json
+import mimetypes
+import os
+import threading
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.files.base import ContentFile
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip copies are written
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.map', '.json', '.svg', '.txt', '.xml', '.html', '.ico', '.ttf', '.otf', '.eot')
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+PLAIN_MAX_AGE = 60
+
+# Preferred first; (Content-Encoding, file suffix)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def compress(data):
+    """
+    {encoding: bytes} of the precompressed variants worth keeping for `data`.
+    """
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    return {encoding: content for encoding, content in variants.items() if len(content) < len(data) * 0.95}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage that also writes .gz/.br copies of the hashed
+    files and lists them in the manifest under 'encodings'.
+    """
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        encodings = {}
+        for hashed_name in set(self.hashed_files.values()):
+            if not hashed_name.endswith(COMPRESSIBLE) or not self.exists(hashed_name):
+                continue
+            with self.open(hashed_name) as source:
+                data = source.read()
+            if len(data) < MIN_COMPRESS_SIZE:
+                continue
+            variants = compress(data)
+            for encoding, suffix in ENCODINGS:
+                if encoding in variants:
+                    if self.exists(hashed_name + suffix):
+                        self.delete(hashed_name + suffix)
+                    self._save(hashed_name + suffix, ContentFile(variants[encoding]))
+            if variants:
+                encodings[hashed_name] = sorted(variants)
+
+        payload = json.loads(self.read_manifest())
+        payload['encodings'] = encodings
+        self.manifest_storage.delete(self.manifest_name)
+        self.manifest_storage._save(self.manifest_name, ContentFile(json.dumps(payload).encode()))
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Referenced from a template but never collected: link the plain name
+            return name
+
+
+def accepted_encodings(header):
+    """
+    Content codings allowed by an Accept-Encoding header (q=0 excludes one).
+    """
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = params.strip().removeprefix('q=')
+        try:
+            if params and float(quality) <= 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticManifest:
+    """
+    The collected manifest, read once per process (and again when
+    collectstatic rewrites it).
+    """
+
+    def __init__(self, root, name):
+        self.path = os.path.join(root, name)
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.hashed = set()
+        self.plain = set()
+        self.encodings = {}
+
+    def refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self.mtime:
+            return
+        with self.lock:
+            if mtime == self.mtime:
+                return
+            payload = {}
+            if mtime is not None:
+                with open(self.path, encoding='utf-8') as handle:
+                    payload = json.load(handle)
+            paths = payload.get('paths', {})
+            self.hashed = set(paths.values())
+            self.plain = set(paths) - self.hashed
+            self.encodings = payload.get('encodings', {})
+            self.mtime = mtime
+
+
+class StaticAssetMiddleware:
+    """
+    Serve collected static files with far-future caching and precompressed
+    variants. Place it near the top of MIDDLEWARE, before the session and
+    auth middleware, so asset requests skip them.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+        self.root = settings.STATIC_ROOT
+        self.manifest = StaticManifest(self.root, staticfiles_storage.manifest_name) if self.root else None
+
+    def __call__(self, request):
+        if (self.manifest is None or request.method not in ('GET', 'HEAD')
+                or not request.path_info.startswith(self.prefix)):
+            return self.get_response(request)
+
+        self.manifest.refresh()
+        name = request.path_info[len(self.prefix):]
+        if name in self.manifest.hashed:
+            cache_control = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        elif name in self.manifest.plain:
+            cache_control = f'public, max-age={PLAIN_MAX_AGE}'
+        else:
+            return self.get_response(request)
+        return self.serve(request, name, cache_control)
+
+    def serve(self, request, name, cache_control):
+        path = os.path.join(self.root, name)
+        available = self.manifest.encodings.get(name, ())
+        encoding = None
+        if available:
+            accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+            for candidate, suffix in ENCODINGS:
+                if candidate in available and candidate in accepted:
+                    encoding, path = candidate, path + suffix
+                    break
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return self.get_response(request)
+
+        # Each coding of a file is a different representation, so it gets its own tag
+        etag = '"%s-%s-%d"' % (name, encoding or 'identity', stat.st_mtime)
+        response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+        if response is None:
+            content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            response = FileResponse(
+                open(path, 'rb'), content_type=content_type, filename=os.path.basename(name))
+            response.headers['Last-Modified'] = http_date(stat.st_mtime)
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = cache_control
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if available:
+            patch_vary_headers(response, ('Accept-Encoding',))
+        return response
@@ -0,0 +1,174 @@
+"""
+Content-addressed media storage.
+
+Uploads are stored as `blobs/<aa>/<bb>/<sha256><ext>`, named by the hash of
+their content, so the same photo uploaded to several listings (or as a
+profile picture) is written once. Saving content that is already stored skips
+the write and returns the existing name.
+
+Blobs are shared, so deleting a row must not delete its file. MediaBlob keeps
+a reference count per blob, maintained by track_media() for every model image
+field: it goes up when a row starts using a blob and down when the row is
+deleted or switches to another file. A blob whose count drops to zero is
+deleted, with its thumbnails, once the transaction commits. Queryset
+.update() calls on image fields bypass the counts; use recount_media() to
+rebuild them.
+"""
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+
+BLOB_PREFIX = 'blobs/'
+
+# Spellings of the same format share one blob
+EXTENSION_ALIASES = {'.jpeg': '.jpg'}
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_PREFIX)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that names files by the SHA-256 of their content and
+    never writes the same content twice.
+    """
+    # Files derived from a blob (thumbnails) are named after it instead
+    derived_prefixes = ('thumbs/',)
+
+    def blob_name(self, content, name):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        extension = os.path.splitext(name)[1].lower()
+        extension = EXTENSION_ALIASES.get(extension, extension)
+        hexdigest = digest.hexdigest()
+        return f'{BLOB_PREFIX}{hexdigest[:2]}/{hexdigest[2:4]}/{hexdigest}{extension}'
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        if name.startswith(self.derived_prefixes):
+            return super().save(name, content, max_length)
+
+        blob = self.blob_name(content, name)
+        if self.exists(blob):
+            return blob
+        return self._save(blob, content)
+
+
+def incref(name, count=1):
+    """
+    Record `count` more rows using the blob `name`.
+    """
+    if not is_blob(name) or count < 1:
+        return
+    from core.models import MediaBlob
+
+    if MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + count):
+        return
+    try:
+        with transaction.atomic():
+            MediaBlob.objects.create(name=name, size=default_storage.size(name), refcount=count)
+    except IntegrityError:
+        # Created concurrently by another upload of the same content
+        MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + count)
+
+
+def decref(name):
+    """
+    Record one row fewer using the blob `name`; the file goes once unused.
+    """
+    if not is_blob(name):
+        return
+    from core.models import MediaBlob
+
+    MediaBlob.objects.filter(name=name).update(refcount=F('refcount') - 1)
+    transaction.on_commit(lambda: release(name))
+
+
+def release(name):
+    from core.models import MediaBlob
+    from core.thumbnails import delete_derivatives
+
+    deleted, _ = MediaBlob.objects.filter(name=name, refcount__lte=0).delete()
+    if deleted:
+        default_storage.delete(name)
+        delete_derivatives(name)
+
+
+def discard(names):
+    """
+    Delete blobs written for rows that were never saved, e.g. when the
+    transaction meant to register them rolled back. Blobs some row already
+    uses are kept.
+    """
+    from core.models import MediaBlob
+
+    names = {name for name in names if is_blob(name)}
+    if not names:
+        return
+    used = set(MediaBlob.objects.filter(name__in=names, refcount__gt=0).values_list('name', flat=True))
+    for name in names - used:
+        default_storage.delete(name)
+
+
+def track_media(model, *fields):
+    """
+    Keep MediaBlob counts in step with the image `fields` of `model`.
+    """
+    def remember(sender, instance, update_fields=None, **kwargs):
+        instance._stored_media = {}
+        if update_fields is not None and not set(fields) & set(update_fields):
+            return
+        if not instance._state.adding and instance.pk is not None:
+            instance._stored_media = sender._base_manager.filter(
+                pk=instance.pk).values(*fields).first() or {}
+
+    def changed(sender, instance, update_fields=None, **kwargs):
+        stored = getattr(instance, '_stored_media', {})
+        for field in fields:
+            if update_fields is not None and field not in update_fields:
+                continue
+            old, new = stored.get(field), getattr(instance, field).name
+            if old != new:
+                incref(new)
+                decref(old)
+
+    def deleted(sender, instance, **kwargs):
+        for field in fields:
+            decref(getattr(instance, field).name)
+
+    pre_save.connect(remember, sender=model, weak=False)
+    post_save.connect(changed, sender=model, weak=False)
+    post_delete.connect(deleted, sender=model, weak=False)
+
+
+def recount_media(sources):
+    """
+    Rebuild every MediaBlob count from the rows in `sources`, a list of
+    (model, field) pairs. Returns the number of blobs counted.
+    """
+    from collections import Counter
+    from core.models import MediaBlob
+
+    counts = Counter()
+    for model, field in sources:
+        rows = model._base_manager.filter(**{f'{field}__startswith': BLOB_PREFIX})
+        counts.update(dict(Counter(rows.values_list(field, flat=True))))
+
+    with transaction.atomic():
+        MediaBlob.objects.exclude(name__in=list(counts)).update(refcount=0)
+        for name, count in counts.items():
+            updated = MediaBlob.objects.filter(name=name).update(refcount=count)
+            if not updated and default_storage.exists(name):
+                MediaBlob.objects.create(name=name, size=default_storage.size(name), refcount=count)
+    return len(counts)
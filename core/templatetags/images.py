@@ -0,0 +1,41 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from core.thumbnails import FORMATS, derivative_urls, thumbnail_url as get_thumbnail_url
+
+register = template.Library()
+
+
+def srcset(urls):
+    return ', '.join(f'{url} {width}w' for url, width in urls)
+
+
+@register.simple_tag
+def responsive_image(field_file, sizes='100vw', **attrs):
+    """
+    <picture> for an image field with WebP and JPEG srcsets of its thumbnails,
+    e.g. {% responsive_image property.primary_image sizes="(min-width: 768px) 33vw, 100vw" class="card-img-top" alt=property.title %}
+    Falls back to a plain <img> of the original until thumbnails exist.
+    """
+    if not field_file:
+        return ''
+    attributes = format_html_join(' ', '{}="{}"', sorted(attrs.items()))
+    jpeg = derivative_urls(field_file, 'jpg')
+    if not jpeg:
+        return format_html('<img src="{}" loading="lazy" {}>', field_file.url, attributes)
+
+    webp = derivative_urls(field_file, 'webp')
+    return format_html(
+        '<picture><source type="{}" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" loading="lazy" {}></picture>',
+        FORMATS['webp'][1], srcset(webp), sizes,
+        jpeg[-1][0], srcset(jpeg), sizes, attributes,
+    )
+
+
+@register.filter
+def thumbnail_url(field_file, width=320):
+    """
+    {{ user.profile_pic|thumbnail_url:320 }}
+    """
+    return get_thumbnail_url(field_file, int(width))
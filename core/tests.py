@@ -1,3 +1,519 @@
-from django.test import TestCase
+import fnmatch
+import io
+import os
+import shutil
+import struct
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core import checks
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from accounts.models import CustomUser
+from booking.models import Booking
+from core import querycount
+from core import thumbnails
+from core.media import parse_range
+from core.models import JobLock
+from core.sessions import compact_database, database_size, purge_expired_sessions
+from core.validators import HeaderImageField, inspect_image, validate_image_upload
+from properties.models import Property, Review
+
+# (URL name, URL kwargs, method, user) for every view in query_budgets.json;
+# objects are filled in by QueryBudgetTests.setUpTestData
+BUDGETED_REQUESTS = [
+    ('home', {}, 'get', None),
+    ('homepage', {}, 'get', None),
+    ('about', {}, 'get', None),
+    ('contact', {}, 'get', None),
+    ('faqs', {}, 'get', None),
+    ('home_properties', {}, 'get', None),
+    ('performance_stats', {}, 'get', 'staff'),
+    ('metrics', {}, 'get', None),
+    ('login', {}, 'get', None),
+    ('register', {}, 'get', None),
+    ('logout', {}, 'get', 'guest'),
+    ('user_dashboard', {}, 'get', 'guest'),
+    ('user_profile', {'id': 'guest'}, 'get', 'guest'),
+    ('update_profile', {'id': 'guest'}, 'get', 'guest'),
+    ('change_password', {}, 'get', 'guest'),
+    ('forgot_password', {}, 'get', None),
+    ('reset_password', {}, 'get', None),
+    ('password_reset_done', {}, 'get', None),
+    ('password_reset_confirm', {'uidb64': 'MQ', 'token': 'set-password'}, 'get', None),
+    ('password_reset_complete', {}, 'get', None),
+    ('add_property', {}, 'get', 'owner'),
+    ('edit_property', {'id': 'property'}, 'get', 'owner'),
+    ('delete_property', {'id': 'property'}, 'get', 'owner'),
+    ('add_images', {'id': 'property'}, 'get', 'owner'),
+    ('edit_images', {'id': 'property'}, 'get', 'owner'),
+    ('properties_list', {}, 'get', None),
+    ('property_details', {'id': 'property'}, 'get', 'guest'),
+    ('my_properties', {}, 'get', 'owner'),
+    ('booking:book_property', {'id': 'property'}, 'get', 'guest'),
+    ('booking:booking-update', {'pk': 'booking'}, 'get', 'guest'),
+    ('booking:booking-detail', {'pk': 'booking'}, 'get', 'guest'),
+    ('booking:booking-list', {}, 'get', 'guest'),
+    ('booking:booking-cancel', {'pk': 'booking'}, 'get', 'guest'),
+    ('booking:booking-confirm', {}, 'get', 'guest'),
+    ('booking:disabled-dates', {'id': 'property'}, 'get', None),
+    ('payments:initiate-payment', {'booking_id': 'booking'}, 'post', 'guest'),
+    ('payments:payment-confirmation', {}, 'post', 'guest'),
+    ('payments:payment-webhook', {}, 'post', None),
+    ('admin:index', {}, 'get', 'staff'),
+]
+
+
+@override_settings(PAYMENT_GATEWAY='fake', FAKE_GATEWAY_LATENCY=0.0)
+class QueryBudgetTests(TestCase):
+    """
+    Requests every budgeted view through BudgetedClient (what the
+    budgeted_client fixture returns), with enough rows for an N+1 loop to
+    show up as repeated queries.
+    """
+    client_class = querycount.BudgetedClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = CustomUser.objects.create_user(
+            username='owner', email='owner@example.com', password='secret')
+        cls.guest = CustomUser.objects.create_user(
+            username='guest', email='guest@example.com', password='secret')
+        cls.staff = CustomUser.objects.create_superuser(
+            username='staff', email='staff@example.com', password='secret')
+        properties = [
+            Property.objects.create(
+                owner=cls.owner, title=f'Home {number}', city='Goa', state='Goa',
+                zip_code='403001', price_per_night=1000, max_guests=4)
+            for number in range(5)]
+        cls.property = properties[0]
+        for number in range(5):
+            reviewer = CustomUser.objects.create_user(
+                username=f'reviewer{number}', email=f'reviewer{number}@example.com', password='secret')
+            Review.objects.create(property=cls.property, user=reviewer, rating=4, comment='Lovely')
+        check_in = timezone.now() + timedelta(days=10)
+        bookings = [
+            Booking.objects.create(
+                user=cls.guest, property=home, check_in=check_in,
+                check_out=check_in + timedelta(days=2), guests=2)
+            for home in properties]
+        cls.booking = bookings[0]
+
+    def url(self, name, kwargs):
+        objects = {'guest': self.guest.pk, 'property': self.property.pk, 'booking': self.booking.pk}
+        return reverse(name, kwargs={key: objects.get(value, value) for key, value in kwargs.items()})
+
+    def test_every_budgeted_view_is_requested(self):
+        views = querycount.load_budgets()['views']
+        requested = {name for name, *_ in BUDGETED_REQUESTS}
+        self.assertEqual(
+            sorted(name for name in views if not any(
+                fnmatch.fnmatchcase(other, name) for other in requested)),
+            [])
+
+    def test_views_stay_within_their_query_budget(self):
+        users = {'guest': self.guest, 'owner': self.owner, 'staff': self.staff}
+        for name, kwargs, method, user in BUDGETED_REQUESTS:
+            with self.subTest(view=name):
+                self.client.logout()
+                if user:
+                    self.client.force_login(users[user])
+                data = {'booking_id': self.booking.pk} if name == 'booking:booking-confirm' else {}
+                response = getattr(self.client, method)(self.url(name, kwargs), data)
+                self.assertLess(response.status_code, 500)
+
+    def test_over_budget_request_fails(self):
+        client = querycount.BudgetedClient(budget={'max_queries': 1})
+        with self.assertRaises(querycount.QueryBudgetExceeded):
+            client.get(reverse('properties_list'))
+
+
+def upload(name, content):
+    return SimpleUploadedFile(name, content)
+
+
+def encoded(image_format, size=(40, 30), **options):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def png_header(width, height):
+    return b'\x89PNG\r\n\x1a\n' + b'\x00\x00\x00\rIHDR' + struct.pack('>II', width, height) + b'\x08\x02\x00\x00\x00'
+
+
+def jpeg_header(width, height, padding=b''):
+    app0 = b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'
+    sof0 = b'\xff\xc0' + struct.pack('>HBHH', 11, 8, height, width) + b'\x01\x01\x11\x00'
+    return b'\xff\xd8' + app0 + padding + sof0 + b'\xff\xd9'
+
+
+class ImageHeaderTests(TestCase):
+    def test_encoded_images_are_identified(self):
+        for image_format, options in (('JPEG', {}), ('JPEG', {'progressive': True}),
+                                      ('PNG', {}), ('WEBP', {}), ('WEBP', {'lossless': True})):
+            with self.subTest(format=image_format, **options):
+                info = inspect_image(upload('photo', encoded(image_format, **options)))
+                self.assertEqual(info, (image_format.lower(), 40, 30))
+
+    def test_crafted_headers(self):
+        self.assertEqual(inspect_image(upload('a.png', png_header(7, 9))), ('png', 7, 9))
+        self.assertEqual(inspect_image(upload('a.jpg', jpeg_header(7, 9))), ('jpeg', 7, 9))
+        # VP8X: 24-bit width and height minus one
+        vp8x = b'RIFF\x00\x00\x00\x00WEBPVP8X' + b'\x0a\x00\x00\x00' + b'\x00' * 4 + \
+            (99).to_bytes(3, 'little') + (49).to_bytes(3, 'little')
+        self.assertEqual(inspect_image(upload('a.webp', vp8x)), ('webp', 100, 50))
+
+    def test_truncated_or_malformed_headers_are_rejected(self):
+        full_jpeg = jpeg_header(7, 9)
+        cases = {
+            'empty': b'',
+            'png signature only': b'\x89PNG\r\n\x1a\n',
+            'png without IHDR': b'\x89PNG\r\n\x1a\n' + b'\x00' * 24,
+            'png zero width': png_header(0, 9),
+            'jpeg soi only': b'\xff\xd8\xff',
+            'jpeg cut in the frame header': full_jpeg[:full_jpeg.index(b'\xff\xc0') + 6],
+            'jpeg segment longer than the file': b'\xff\xd8\xff\xe0\xff\xff' + b'\x00' * 30,
+            'jpeg segment length below two': b'\xff\xd8\xff\xe0\x00\x01' + b'\x00' * 30,
+            'jpeg scan before the frame': b'\xff\xd8\xff\xda\x00\x08' + b'\x00' * 30,
+            'webp unknown chunk': b'RIFF\x00\x00\x00\x00WEBPVP8Z' + b'\x00' * 20,
+            'text': b'GIF89a not really an image at all.........',
+        }
+        for label, content in cases.items():
+            with self.subTest(label):
+                self.assertIsNone(inspect_image(upload('photo.jpg', content)))
+
+    def test_result_is_cached_and_position_restored(self):
+        file = upload('a.png', png_header(7, 9))
+        file.seek(5)
+        inspect_image(file)
+        self.assertEqual(file.tell(), 5)
+        with mock.patch('core.validators.sniff') as sniff:
+            self.assertEqual(inspect_image(file), ('png', 7, 9))
+        sniff.assert_not_called()
+
+    def test_extension_must_match_the_content(self):
+        for name, content in (('photo.jpg', png_header(7, 9)), ('photo.png', jpeg_header(7, 9)),
+                              ('photo.txt', png_header(7, 9)), ('photo.jpg', b'MZ' + b'\x00' * 40)):
+            with self.subTest(name=name):
+                with self.assertRaises(ValidationError):
+                    validate_image_upload(upload(name, content))
+        self.assertEqual(validate_image_upload(upload('PHOTO.JPEG', jpeg_header(7, 9))), ('jpeg', 7, 9))
+
+    def test_format_restriction(self):
+        with self.assertRaises(ValidationError):
+            validate_image_upload(upload('photo.webp', encoded('WEBP')), formats=('jpeg', 'png'))
+
+    def test_oversized_dimensions_and_files_are_rejected(self):
+        # The header claims 60000x60000; nothing is decoded, so this is cheap
+        with self.assertRaisesMessage(ValidationError, 'dimensions are too large'):
+            validate_image_upload(upload('huge.png', png_header(60000, 60000)), max_dimensions=(5000, 5000))
+        self.assertIsNotNone(
+            validate_image_upload(upload('edge.png', png_header(5000, 5000)), max_dimensions=(5000, 5000)))
+        with self.assertRaisesMessage(ValidationError, 'too large'):
+            validate_image_upload(upload('big.png', png_header(7, 9) + b'\x00' * 64), max_size=64)
+
+    def test_stored_files_are_not_opened(self):
+        stored = mock.Mock(_committed=True)
+        self.assertIsNone(validate_image_upload(stored))
+        stored.open.assert_not_called()
+
+    def test_form_field_rejects_non_images(self):
+        field = HeaderImageField()
+        with self.assertRaises(ValidationError):
+            field.clean(upload('photo.png', b'not an image at all'))
+        cleaned = field.clean(upload('photo.png', png_header(7, 9)))
+        self.assertEqual(cleaned.content_type, 'image/png')
+
+
+class ParseRangeTests(TestCase):
+    def test_ranges(self):
+        cases = {
+            'bytes=0-3': (0, 3),
+            'bytes=4-': (4, 9),
+            'bytes=5-100': (5, 9),
+            'bytes=-4': (6, 9),
+            'bytes=-100': (0, 9),
+            'bytes = 1 - 2': (1, 2),
+            'bytes=10-': False,
+            'bytes=-0': False,
+            'bytes=0-1,4-5': None,
+            'bytes=5-2': None,
+            'bytes=-': None,
+            'items=0-3': None,
+            '': None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(parse_range(header, 10), expected)
+
+
+class ServeMediaTests(TestCase):
+    content = b'0123456789'
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, MEDIA_SENDFILE='')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        os.makedirs(os.path.join(media_root, 'blobs', 'ab'))
+        for name in ('photo.jpg', 'blobs/ab/abcdef.jpg'):
+            with open(os.path.join(media_root, name), 'wb') as handle:
+                handle.write(self.content)
+
+    def get(self, path='photo.jpg', **headers):
+        return self.client.get(f'/media/{path}', headers=headers)
+
+    def test_whole_file(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+    def test_blobs_are_immutable(self):
+        self.assertIn('immutable', self.get('blobs/ab/abcdef.jpg')['Cache-Control'])
+
+    def test_byte_and_suffix_ranges(self):
+        for header, body, content_range in (('bytes=2-5', b'2345', 'bytes 2-5/10'),
+                                            ('bytes=7-', b'789', 'bytes 7-9/10'),
+                                            ('bytes=-4', b'6789', 'bytes 6-9/10')):
+            with self.subTest(range=header):
+                response = self.get(Range=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(b''.join(response.streaming_content), body)
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(response['Content-Length'], str(len(body)))
+
+    def test_multiple_ranges_get_the_whole_file(self):
+        response = self.get(Range='bytes=0-1,4-5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_unsatisfiable_range(self):
+        response = self.get(Range='bytes=10-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_if_range(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(Range='bytes=0-1', If_Range=etag).status_code, 206)
+        self.assertEqual(self.get(Range='bytes=0-1', If_Range='"stale"').status_code, 200)
+
+    def test_conditional_requests(self):
+        first = self.get()
+        for headers in ({'If_None_Match': first['ETag']},
+                        {'If_Modified_Since': first['Last-Modified']}):
+            response = self.get(**headers)
+            self.assertEqual(response.status_code, 304)
+            for header in ('ETag', 'Last-Modified', 'Cache-Control'):
+                self.assertEqual(response[header], first[header])
+        self.assertEqual(self.get(If_None_Match='"other"').status_code, 200)
+
+    def test_missing_and_outside_files(self):
+        self.assertEqual(self.get('missing.jpg').status_code, 404)
+        # safe_join raises SuspiciousFileOperation, which Django answers with 400
+        self.assertEqual(self.get('../settings.py').status_code, 400)
+        self.assertEqual(self.get('blobs').status_code, 404)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect', MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_x_accel_redirect(self):
+        response = self.get('blobs/ab/abcdef.jpg', Range='bytes=0-1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/blobs/ab/abcdef.jpg')
+        self.assertEqual(response.content, b'')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.get('blobs/ab/abcdef.jpg', If_None_Match=response['ETag']).status_code, 304)
+
+    @override_settings(MEDIA_SENDFILE='x-sendfile')
+    def test_x_sendfile(self):
+        response = self.get()
+        self.assertEqual(response['X-Sendfile'], os.path.join(settings.MEDIA_ROOT, 'photo.jpg'))
+        self.assertEqual(response.content, b'')
+
+
+@override_settings(METRICS_TOKEN='', METRICS_ALLOWED_IPS=('127.0.0.1',), METRICS_TRUSTED_PROXIES=())
+@override_settings(DEBUG=True)
+class MetricsViewTests(TestCase):
+    def get(self, remote_addr='127.0.0.1', **headers):
+        return self.client.get(reverse('metrics'), REMOTE_ADDR=remote_addr, headers=headers)
+
+    def test_route_has_a_trailing_slash(self):
+        self.assertEqual(reverse('metrics'), '/metrics/')
+
+    def test_allowed_address(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn(b'# TYPE homerent_bookings_total counter', response.content)
+        self.assertEqual(self.get('203.0.113.5').status_code, 403)
+
+    def test_forwarded_request_from_an_untrusted_proxy_is_refused(self):
+        # nginx on the same host: REMOTE_ADDR is loopback for every visitor
+        self.assertEqual(self.get(X_Forwarded_For='203.0.113.5').status_code, 403)
+
+    @override_settings(METRICS_TRUSTED_PROXIES=('10.0.0.2',))
+    def test_trusted_proxy_forwards_the_client_address(self):
+        self.assertEqual(self.get('10.0.0.2', X_Forwarded_For='127.0.0.1').status_code, 200)
+        self.assertEqual(self.get('10.0.0.2', X_Forwarded_For='203.0.113.5').status_code, 403)
+        # Only the hop our proxy appended counts, not what the client sent
+        self.assertEqual(self.get('10.0.0.2', X_Forwarded_For='127.0.0.1, 203.0.113.5').status_code, 403)
+        self.assertEqual(self.get('10.0.0.2').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_token_is_required_when_set(self):
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(self.get(Authorization='Bearer wrong').status_code, 403)
+        self.assertEqual(self.get('203.0.113.5', Authorization='Bearer s3cret').status_code, 200)
+
+    @override_settings(DEBUG=False)
+    def test_token_is_required_outside_debug(self):
+        # e.g. a local proxy that forwards visitors without X-Forwarded-For
+        self.assertEqual(self.get().status_code, 403)
+        with override_settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.get(Authorization='Bearer s3cret').status_code, 200)
+
+    def test_missing_token_fails_the_deploy_check_outside_debug(self):
+        def errors(**overrides):
+            with override_settings(**overrides):
+                return [message.id for message in checks.run_checks(include_deployment_checks=True)
+                        if message.id == 'core.E002']
+
+        self.assertEqual(errors(DEBUG=False), ['core.E002'])
+        self.assertEqual(errors(DEBUG=False, METRICS_TOKEN='s3cret'), [])
+        self.assertEqual(errors(DEBUG=True), [])
+
+
+class SessionCacheCheckTests(TestCase):
+    LOCMEM = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    SHARED = {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+              'LOCATION': 'redis://127.0.0.1:6379/1'}
+
+    def errors(self, **overrides):
+        caches = {'default': self.LOCMEM, 'sessions': overrides.pop('cache', self.LOCMEM)}
+        with override_settings(CACHES=caches, SESSION_CACHE_ALIAS='sessions', **overrides):
+            return [message.id for message in checks.run_checks(
+                tags=[checks.Tags.caches], include_deployment_checks=True)
+                    if message.id.startswith('core.')]
+
+    def test_local_memory_session_cache_fails_outside_debug(self):
+        self.assertEqual(self.errors(DEBUG=False), ['core.E001'])
+
+    def test_allowed_in_debug_with_a_shared_cache_or_the_db_engine(self):
+        self.assertEqual(self.errors(DEBUG=True), [])
+        self.assertEqual(self.errors(DEBUG=False, cache=self.SHARED), [])
+        self.assertEqual(self.errors(
+            DEBUG=False, SESSION_ENGINE='django.contrib.sessions.backends.db'), [])
+
+
+class ThumbnailScheduleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = CustomUser.objects.create_user(
+            username='owner', email='owner@example.com', password='secret')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        schedule = mock.patch('core.thumbnails.schedule')
+        self.schedule = schedule.start()
+        self.addCleanup(schedule.stop)
+
+    def save(self, home):
+        with self.captureOnCommitCallbacks(execute=True):
+            home.save()
+
+    def test_placeholder_image_is_not_scheduled(self):
+        self.save(Property(
+            owner=self.owner, title='Sea View', city='Goa', state='Goa', zip_code='403001',
+            price_per_night=1000))
+        self.schedule.assert_not_called()
+
+    def test_only_a_changed_image_is_scheduled(self):
+        home = Property(
+            owner=self.owner, title='Sea View', city='Goa', state='Goa', zip_code='403001',
+            price_per_night=1000, primary_image=upload('sea.png', encoded('PNG')))
+        self.save(home)
+        self.schedule.assert_called_once_with(home.primary_image.name)
+
+        home.price_per_night = 1200
+        self.save(home)
+        home.save(update_fields=['price_per_night'])
+        self.schedule.assert_called_once()
+
+    def test_missing_source_is_a_warning_without_traceback(self):
+        with self.assertLogs('core.thumbnails', 'WARNING') as logs:
+            thumbnails._generate_in_background('home_default.jpg')
+        self.assertEqual(logs.records[0].levelname, 'WARNING')
+        self.assertIsNone(logs.records[0].exc_info)
+        self.assertIn('home_default.jpg', logs.records[0].getMessage())
+
+
+def make_sessions(count, expired):
+    expire_date = timezone.now() + timedelta(days=-1 if expired else 1)
+    prefix = 'expired' if expired else 'live'
+    Session.objects.bulk_create(
+        Session(session_key=f'{prefix}{number:032d}', session_data='e30', expire_date=expire_date)
+        for number in range(count))
+
+
+class PurgeSessionsTests(TestCase):
+    def setUp(self):
+        make_sessions(5, expired=True)
+        make_sessions(2, expired=False)
+
+    def test_expired_sessions_are_deleted_in_batches(self):
+        self.assertEqual(purge_expired_sessions(batch_size=2), 5)
+        self.assertEqual(set(Session.objects.values_list('session_key', flat=True)),
+                         {f'live{number:032d}' for number in range(2)})
+        self.assertEqual(purge_expired_sessions(), 0)
+
+    def test_compaction_waits_for_the_threshold(self):
+        total, free = database_size()
+        self.assertGreater(total, 0)
+        self.assertIsNone(compact_database(threshold=free + 1))
+
+    def test_command_reports_and_respects_the_lock(self):
+        out = io.StringIO()
+        call_command('purge_sessions', '--vacuum-threshold', str(2 ** 40), stdout=out)
+        self.assertIn('Deleted 5 expired sessions; 2 remain.', out.getvalue())
+        self.assertIn('below the vacuum threshold', out.getvalue())
+
+        make_sessions(1, expired=True)
+        JobLock.acquire('purge_sessions', timedelta(minutes=10))
+        out = io.StringIO()
+        call_command('purge_sessions', stdout=out)
+        self.assertIn('Another run is in progress; skipping.', out.getvalue())
+        self.assertEqual(Session.objects.count(), 3)
+
+
+class CompactDatabaseTests(TransactionTestCase):
+    # VACUUM cannot run inside the transaction TestCase wraps each test in
+
+    def test_forced_vacuum_reclaims_free_pages(self):
+        make_sessions(500, expired=True)
+        purge_expired_sessions()
+        self.assertGreater(database_size()[1], 0)
+
+        self.assertGreaterEqual(compact_database(force=True), 0)
+        self.assertEqual(database_size()[1], 0)
+
+        out = io.StringIO()
+        call_command('purge_sessions', '--vacuum', stdout=out)
+        self.assertIn('Vacuumed:', out.getvalue())
@@ -0,0 +1,225 @@
+"""
+Resized WebP/JPEG derivatives of uploaded images.
+
+For an image stored as `property_images/villa.jpg` the derivatives are
+`thumbs/property_images/villa.<width>w.webp` and `.jpg` for each width in
+settings.THUMBNAIL_WIDTHS narrower than the original (images are never
+upscaled; one smaller than every width gets only the smallest). Names depend
+only on the source name, so they can be found again without a lookup table.
+
+Saving a model with an image schedules generation (see schedule()): a small
+thread pool reads the source and hands the decoding and resizing to a process
+pool, so neither the request nor the GIL is held while Pillow works. The
+`responsive_image` template tag (core.templatetags.images) emits srcset
+attributes for whichever derivatives exist and falls back to the original.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpg': ('JPEG', 'image/jpeg'),
+}
+
+_lock = threading.Lock()
+_pending = set()
+_processes = None
+_threads = None
+
+
+def derivative_name(name, width, extension):
+    return f'thumbs/{os.path.splitext(name)[0]}.{width}w.{extension}'
+
+
+def cache_key(name):
+    return f'thumbs:{name}'
+
+
+def render_derivatives(data, widths, quality):
+    """
+    Decode an image and return [(width, extension, bytes)] for every
+    derivative. Runs in a worker process; it only needs Pillow.
+    """
+    from PIL import Image, ImageOps
+
+    image = Image.open(io.BytesIO(data))
+    # Let the JPEG decoder downscale while decoding when only small sizes are needed
+    image.draft('RGB', (max(widths), 1))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    targets = [width for width in widths if width < image.width] or [min(widths)]
+    results = []
+    for width in sorted(targets, reverse=True):
+        if width < image.width:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        else:
+            resized = image
+        for extension, (pil_format, _) in FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, pil_format, quality=quality, optimize=pil_format == 'JPEG')
+            results.append((width, extension, buffer.getvalue()))
+    return results
+
+
+def process_pool():
+    global _processes
+    with _lock:
+        if _processes is None:
+            _processes = ProcessPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'))
+        return _processes
+
+
+def reset_process_pool(broken):
+    global _processes
+    with _lock:
+        if _processes is broken:
+            _processes = None
+    broken.shutdown(wait=False)
+
+
+def generate(name, storage=default_storage, force=False):
+    """
+    Create (or with force, recreate) the derivatives of a stored image.
+    Returns the widths generated.
+    """
+    widths = tuple(settings.THUMBNAIL_WIDTHS)
+    if not force and storage.exists(derivative_name(name, min(widths), 'webp')):
+        return []
+    with storage.open(name, 'rb') as source:
+        data = source.read()
+    pool = process_pool()
+    try:
+        results = pool.submit(render_derivatives, data, widths, settings.THUMBNAIL_QUALITY).result()
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool next time
+        reset_process_pool(pool)
+        raise
+
+    for width, extension, content in results:
+        target = derivative_name(name, width, extension)
+        if storage.exists(target):
+            storage.delete(target)
+        storage.save(target, ContentFile(content))
+    generated = sorted({width for width, _, _ in results})
+    cache.set(cache_key(name), generated, None)
+    return generated
+
+
+def _generate_in_background(name):
+    try:
+        generate(name)
+    except FileNotFoundError:
+        logger.warning('Thumbnail source %s does not exist', name)
+    except Exception:
+        logger.exception('Could not generate thumbnails for %s', name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+
+
+def schedule(name):
+    """
+    Generate derivatives of `name` in the background, once per process at a time.
+    """
+    global _threads
+    if not name:
+        return
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+        if _threads is None:
+            _threads = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS, thread_name_prefix='thumbnails')
+        _threads.submit(_generate_in_background, name)
+
+
+def available_widths(name, storage=default_storage):
+    """
+    Widths with derivatives on disk for `name`, smallest first. Missing ones
+    are scheduled; the answer is cached until they are generated.
+    """
+    if not name:
+        return []
+    widths = cache.get(cache_key(name))
+    if widths is None:
+        widths = [
+            width for width in settings.THUMBNAIL_WIDTHS
+            if storage.exists(derivative_name(name, width, 'webp'))
+        ]
+        if widths:
+            cache.set(cache_key(name), widths, None)
+        else:
+            cache.set(cache_key(name), widths, 60)
+            if storage.exists(name):
+                schedule(name)
+    return widths
+
+
+def derivative_urls(field_file, extension):
+    """
+    [(url, width)] of the derivatives of an image field value.
+    """
+    storage = field_file.storage
+    return [
+        (storage.url(derivative_name(field_file.name, width, extension)), width)
+        for width in available_widths(field_file.name, storage)
+    ]
+
+
+def thumbnail_url(field_file, width):
+    """
+    URL of the smallest JPEG derivative at least `width` wide (or the largest
+    there is), falling back to the original.
+    """
+    if not field_file:
+        return ''
+    urls = derivative_urls(field_file, 'jpg')
+    for url, derivative_width in urls:
+        if derivative_width >= width:
+            return url
+    return urls[-1][0] if urls else field_file.url
+
+
+def delete_derivatives(name, storage=default_storage):
+    for width in settings.THUMBNAIL_WIDTHS:
+        for extension in FORMATS:
+            target = derivative_name(name, width, extension)
+            if storage.exists(target):
+                storage.delete(target)
+    cache.delete(cache_key(name))
+
+
+def schedule_for(instance, field_name, update_fields=None):
+    """
+    Signal helper: schedule derivatives for an image field once the
+    surrounding transaction commits. Only a save that stores a different,
+    existing file counts; the previous name is the one track_media() read
+    before the save.
+    """
+    if update_fields is not None and field_name not in update_fields:
+        return
+    field_file = getattr(instance, field_name)
+    name = field_file.name if field_file else ''
+    if not name or getattr(instance, '_stored_media', {}).get(field_name) == name:
+        return
+    if field_file.storage.exists(name):
+        transaction.on_commit(lambda: schedule(name))
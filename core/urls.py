@@ -8,4 +8,6 @@ urlpatterns = [
     path('contact/', views.contact, name='contact'),
     path('faqs/', views.faqs, name='faqs'),
     path('all_properties/', views.home_properties, name='home_properties'),
+    path('perf/', views.performance_stats_view, name='performance_stats'),
+    path('metrics/', views.metrics_view, name='metrics'),
 ]
@@ -0,0 +1,150 @@
+"""
+Upload checks for image fields that only read the image header.
+
+inspect_image() identifies JPEG, PNG and WebP files from their magic bytes and
+reads the dimensions from the header (for JPEG it seeks from segment to
+segment up to the frame header instead of reading the data). The result is
+cached on the file object, so the form field, the form's clean() and the
+model's clean()/save() share a single read per upload. Files already in
+storage are not checked again, which keeps saves of unchanged images free.
+"""
+import struct
+from collections import namedtuple
+
+from django import forms
+from django.core.exceptions import ValidationError
+
+MAX_IMAGE_SIZE = 5 * 1024 * 1024
+IMAGE_FORMATS = ('jpeg', 'png', 'webp')
+EXTENSIONS = {
+    'jpeg': ('.jpg', '.jpeg'),
+    'png': ('.png',),
+    'webp': ('.webp',),
+}
+
+# JPEG start-of-frame markers, which carry the dimensions
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+ImageInfo = namedtuple('ImageInfo', 'format width height')
+
+
+def jpeg_dimensions(file):
+    file.seek(2)
+    while True:
+        byte = file.read(1)
+        while byte and byte != b'\xff':
+            byte = file.read(1)
+        while byte == b'\xff':
+            byte = file.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            continue
+        if marker in (0xD9, 0xDA):
+            return None
+        length = file.read(2)
+        if len(length) < 2 or struct.unpack('>H', length)[0] < 2:
+            return None
+        if marker in SOF_MARKERS:
+            frame = file.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack('>HH', frame[1:5])
+            return width, height
+        file.seek(struct.unpack('>H', length)[0] - 2, 1)
+
+
+def webp_dimensions(header):
+    chunk = header[12:16]
+    if chunk == b'VP8 ' and header[23:26] == b'\x9d\x01\x2a':
+        width, height = struct.unpack('<HH', header[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and header[20:21] == b'\x2f':
+        bits = int.from_bytes(header[21:25], 'little')
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X':
+        return int.from_bytes(header[24:27], 'little') + 1, int.from_bytes(header[27:30], 'little') + 1
+    return None
+
+
+def sniff(file):
+    """
+    Return ImageInfo for a JPEG, PNG or WebP file, or None if it is not one.
+    """
+    header = file.read(32)
+    if header.startswith(b'\xff\xd8\xff'):
+        dimensions, image_format = jpeg_dimensions(file), 'jpeg'
+    elif header.startswith(b'\x89PNG\r\n\x1a\n') and header[12:16] == b'IHDR':
+        dimensions, image_format = struct.unpack('>II', header[16:24]), 'png'
+    elif header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        dimensions, image_format = webp_dimensions(header), 'webp'
+    else:
+        return None
+    if not dimensions or not all(dimensions):
+        return None
+    return ImageInfo(image_format, *dimensions)
+
+
+def inspect_image(file):
+    """
+    Header-only ImageInfo for an uploaded file, cached on the file object.
+    Returns None if the file is not a supported image.
+    """
+    if not hasattr(file, '_image_info'):
+        position = file.tell() if hasattr(file, 'tell') else 0
+        try:
+            file.seek(0)
+            file._image_info = sniff(file)
+        except (OSError, struct.error):
+            file._image_info = None
+        finally:
+            file.seek(position)
+    return file._image_info
+
+
+def is_stored(value):
+    """
+    True for a field value that is already in storage rather than a new upload.
+    """
+    return getattr(value, '_committed', False)
+
+
+def validate_image_upload(value, formats=IMAGE_FORMATS, max_size=MAX_IMAGE_SIZE, max_dimensions=None):
+    """
+    Validate a new image upload (a form file or an uncommitted FieldFile).
+    Stored files pass without being opened.
+    """
+    if not value or is_stored(value):
+        return None
+    upload = value.file if hasattr(value, '_committed') else value
+
+    if upload.size > max_size:
+        raise ValidationError(f'Image file too large ( > {max_size // (1024 * 1024)}mb ).')
+    extensions = tuple(ext for image_format in formats for ext in EXTENSIONS[image_format])
+    info = inspect_image(upload)
+    # The extension must name the detected format: blobs keep it (core.storage)
+    if info is None or info.format not in formats or not value.name.lower().endswith(EXTENSIONS[info.format]):
+        raise ValidationError(
+            f"Invalid image format. Supported formats are {', '.join(extensions)}.")
+    if max_dimensions and (info.width > max_dimensions[0] or info.height > max_dimensions[1]):
+        raise ValidationError(
+            f'Image dimensions are too large (max {max_dimensions[0]}x{max_dimensions[1]}).')
+    return info
+
+
+class HeaderImageField(forms.ImageField):
+    """
+    forms.ImageField that identifies the upload from its header instead of
+    decoding the whole image with Pillow.
+    """
+
+    def to_python(self, data):
+        upload = forms.FileField.to_python(self, data)
+        if upload is None:
+            return None
+        info = inspect_image(upload)
+        if info is None:
+            raise ValidationError(self.error_messages['invalid_image'], code='invalid_image')
+        upload.content_type = f'image/{info.format}'
+        return upload
@@ -1,19 +1,23 @@
 from django.shortcuts import render, redirect
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.core.mail import send_mail
 from django.conf import settings
 from django.contrib import messages
 from .forms import ContactForm
+from core.metrics import can_scrape, registry, search_duration, search_requests
+from core.perf import performance_stats
 from properties.models import Property
+from properties.search import PropertySearch
 from django.db.models import Q
-from django.core.paginator import Paginator
 
 def homepage_view(request):
     if request.user.is_authenticated:
         # Authenticated users see the dashboard
-        return render(request, 'dashboard.html')
+        return render(request, 'core/dashboard.html')
     else:
         # Guest users see the homepage
-        return render(request, 'homepage.html')
+        return render(request, 'core/homepage.html')
 
 def home(request):
     if request.user.is_authenticated:
@@ -30,56 +34,11 @@ def home(request):
 
 
 def home_properties(request):
-    properties = Property.objects.filter(is_available=True)
-    
-    # Get filter values from the GET request
-    query = request.GET.get('query', '').strip()  # Search query for title or city
-    price_range = request.GET.get('price_range', '')  # Price range filter
-    rooms = request.GET.get('rooms', '')  # Number of rooms filter
-    bathrooms = request.GET.get('bathrooms', '')  # Number of bathrooms filter
-    max_guests = request.GET.get('max_guests', '')  # Max guests filter
-
-    # Apply filters based on query input
-    if query:
-        properties = properties.filter(
-            Q(title__icontains=query) | 
-            Q(city__icontains=query) |
-            Q(state__icontains=query)
-            ) 
-
-    # Apply price range filter
-    if price_range:
-        properties = properties.filter(price_per_night__lte=price_range)
-
-    # Apply rooms filter (greater than or equal to the selected number)
-    if rooms:
-        properties = properties.filter(rooms__gte=rooms)
-
-    # Apply bathrooms filter (greater than or equal to the selected number)
-    if bathrooms:
-        properties = properties.filter(bathrooms__gte=bathrooms)
-
-    # Apply max guests filter (greater than or equal to the selected number)
-    if max_guests:
-        properties = properties.filter(max_guests__gte=max_guests)
-
-
-    # Paginate the filtered results (40 properties per page)
-    paginator = Paginator(properties, 40)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    # Pass filters to context to retain filter values in the template
-    context = {
-        'properties': page_obj,
-        'query': query,
-        'price_range': price_range,
-        'rooms': rooms,
-        'bathrooms': bathrooms,
-        'max_guests': max_guests,
-    }
-
-    return render(request, 'core/home_properties.html', context)
+    # Filtering, pagination and result caching are shared with properties_list
+    search_requests.inc(view='home_properties')
+    with search_duration.time(view='home_properties'):
+        search = PropertySearch(request.GET)
+        return render(request, 'core/home_properties.html', search.context())
 
 
 # def home_properties(request):
@@ -167,3 +126,26 @@ def contact(request):
     
     return render(request, 'core/contact.html', {'form': form})
 
+
+# Rolling per-view timings recorded by core.perf.PerformanceMiddleware in this
+# process, slowest in total first
+@staff_member_required
+def performance_stats_view(request):
+    views = performance_stats.snapshot()
+    ranked = sorted(
+        views.items(),
+        key=lambda item: item[1]['wall_ms']['count'] * item[1]['wall_ms']['mean'],
+        reverse=True)
+    return JsonResponse({
+        'sample_rate': settings.PERF_SAMPLE_RATE,
+        'window_minutes': settings.PERF_WINDOW_MINUTES,
+        'views': [dict(view=name, **measures) for name, measures in ranked],
+    })
+
+
+# Prometheus scrape endpoint (core.metrics), summed over all worker processes
+# when METRICS_MULTIPROCESS_DIR is set; see core.metrics.can_scrape for access
+def metrics_view(request):
+    if not can_scrape(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,25 +1,47 @@
+import time
+
 from django.conf import settings
 
+# Session keys the middleware maintains
+REFRESHED_AT = '_refreshed_at'
+
+# Path prefix: (flag, expiry in seconds)
+SESSION_AREAS = (
+    ('/admin/', 'is_admin_session', 3600),  # Admin session timeout in 1 hour
+    ('/accounts/', 'is_user_session', 86400),  # User session timeout in 24 hours
+    ('/users/', 'is_user_session', 86400),
+)
+
 
 class AdminSessionMiddleware:
+    """
+    Flag admin and user sessions and give them their own expiry, writing the
+    session only when something changes. SessionMiddleware saves it once, on
+    the way out, if this (or the view) modified it.
+
+    Sessions are not saved on every request; instead, sliding expiry is kept
+    by touching each session at most once per SESSION_REFRESH_INTERVAL seconds.
+    """
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.refresh_interval = settings.SESSION_REFRESH_INTERVAL
 
     def __call__(self, request):
-        # Check if the request is for the admin site
-        if request.path.startswith('/admin/'):
-            # Modify session for admin requests
-            # Flag for admin session
-            request.session['is_admin_session'] = True
-            request.session.set_expiry(3600)  # Admin session timeout in 1 hour
-            request.session.save()
-
-        # Else, handle user session separately
-        elif request.path.startswith('/accounts/') or request.path.startswith('/users/'):
-            request.session['is_user_session'] = True  # Flag for user session
-            # User session timeout in 24 hours
-            request.session.set_expiry(86400)
-            request.session.save()
+        session = request.session
+        for prefix, flag, expiry in SESSION_AREAS:
+            if request.path.startswith(prefix):
+                if session.get(flag) is not True:
+                    session[flag] = True
+                if session.get('_session_expiry') != expiry:
+                    session.set_expiry(expiry)
+                break
+
+        # Push the expiry date forward, but not on every request
+        if session.session_key:
+            now = int(time.time())
+            if session.modified or now - session.get(REFRESHED_AT, 0) >= self.refresh_interval:
+                session[REFRESHED_AT] = now
 
         response = self.get_response(request)
         return response
@@ -43,6 +43,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.staticfiles.StaticAssetMiddleware',
+    'core.media.MediaMiddleware',
+    'core.perf.PerformanceMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -57,7 +60,8 @@ ROOT_URLCONF = 'my_homerent.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that reports render time to core.perf
+        'BACKEND': 'core.perf.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -83,6 +87,61 @@ DATABASES = {
 }
 
 
+# Most queries each view may run, checked by the test client and pytest
+# plugin in core.querycount and, for coverage of every URL name, by the
+# core.W001 system check
+QUERY_BUDGET_FILE = BASE_DIR / 'query_budgets.json'
+
+# Per-view timings (core.perf): the fraction of requests measured, whether
+# they get a Server-Timing header, and how many minutes of history the
+# staff-only /perf/ page covers. Every request is measured under DEBUG; in
+# production 1% is enough for the rolling percentiles and keeps the overhead
+# off the rest
+PERF_SAMPLE_RATE = env.float('PERF_SAMPLE_RATE', default=1.0 if DEBUG else 0.01)
+PERF_SERVER_TIMING = env.bool('PERF_SERVER_TIMING', default=DEBUG)
+PERF_WINDOW_MINUTES = env.int('PERF_WINDOW_MINUTES', default=15)
+
+# Prometheus metrics (core.metrics) at /metrics/. Scrapers send
+# "Authorization: Bearer <METRICS_TOKEN>"; outside DEBUG the token is required
+# (check core.E002). Under DEBUG without a token, client addresses in
+# METRICS_ALLOWED_IPS may read it; behind nginx list the proxy in
+# METRICS_TRUSTED_PROXIES so the client address is read from X-Forwarded-For.
+# Under a pre-forked server set METRICS_MULTIPROCESS_DIR to an empty directory
+# (ideally tmpfs, cleared on restart): every worker writes its values there at
+# most every METRICS_FLUSH_INTERVAL seconds and the endpoint sums them
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+METRICS_ALLOWED_IPS = env.tuple('METRICS_ALLOWED_IPS', default=('127.0.0.1', '::1'))
+METRICS_TRUSTED_PROXIES = env.tuple('METRICS_TRUSTED_PROXIES', default=())
+METRICS_MULTIPROCESS_DIR = env('METRICS_MULTIPROCESS_DIR', default='') or None
+METRICS_FLUSH_INTERVAL = 1.0
+
+
+# Cache
+# 'search' holds listing result pages (ids only); entries expire after
+# TIMEOUT seconds and the least recently used are evicted past MAX_ENTRIES.
+# Point it at a shared cache (e.g. Redis) when running several processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'search': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'property-search',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+    # Session data in front of the django_session table (cached_db). With
+    # several processes this must be a shared cache (e.g.
+    # SESSION_CACHE_URL=redis://127.0.0.1:6379/1), or a logout in one process
+    # leaves the session alive in the others; `check --deploy` fails on a
+    # local-memory cache here outside DEBUG (core.E001).
+    'sessions': env.cache(
+        'SESSION_CACHE_URL', default='locmemcache://sessions?MAX_ENTRIES=10000'),
+}
+
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -122,9 +181,37 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static')
 ]
 
+# collectstatic writes hashed, precompressed copies here (core.staticfiles);
+# StaticAssetMiddleware serves them when there is no front server to do it
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Media is served by core.media.MediaMiddleware. Set MEDIA_SENDFILE to
+# 'x-accel-redirect' (nginx, with an internal location at the prefix aliased
+# to MEDIA_ROOT) or 'x-sendfile' (Apache/lighttpd) to let the front server
+# send the bytes
+MEDIA_SENDFILE = env('MEDIA_SENDFILE', default='')
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# Uploads are stored once per distinct content and reference-counted
+# (core.storage); run migrate_media_storage to move existing media over
+STORAGES = {
+    'default': {
+        'BACKEND': 'core.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'core.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Resized WebP/JPEG copies of uploaded images (core.thumbnails): widths in
+# pixels, encoder quality and the number of resizing processes
+THUMBNAIL_WIDTHS = (320, 640, 1280)
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_WORKERS = 2
+
 
 MESSAGE_TAGS = {
     messages.DEBUG: 'custom-debug',
@@ -134,7 +221,13 @@ MESSAGE_TAGS = {
     messages.ERROR: 'custom-error',
 }
 
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Sessions are read from the 'sessions' cache and written through to the
+# database. They are saved only when modified; AdminSessionMiddleware touches
+# each one at most every SESSION_REFRESH_INTERVAL seconds to keep the expiry
+# sliding
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_REFRESH_INTERVAL = 300
 
 # Custom session settings to separate admin and website sessions
 SESSION_COOKIE_NAME = 'website_sessionid'  # website session cookie name
@@ -142,7 +235,7 @@ ADMIN_SESSION_COOKIE_NAME = 'admin_sessionid'  # admin session cookie name
 # session expires when the browser is closed
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 SESSION_COOKIE_AGE = 3600  # 1 hour
-SESSION_SAVE_EVERY_REQUEST = True  # save session on every request
+SESSION_SAVE_EVERY_REQUEST = False  # see SESSION_REFRESH_INTERVAL
 SESSION_COOKIE_SECURE = True  # session cookie is secure
 
 # SMTP email settings configuration
@@ -158,6 +251,37 @@ EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD')
 # Razorpay configuration
 RAZORPAY_KEY = env('RAZORPAY_KEY')
 RAZORPAY_SECRET = env('RAZORPAY_SECRET')
+RAZORPAY_WEBHOOK_SECRET = env('RAZORPAY_WEBHOOK_SECRET', default='')
+
+# 'razorpay' for the real gateway, 'fake' for the offline stand-in in
+# payment.fake_gateway (mean latency in seconds, fraction of failed calls)
+PAYMENT_GATEWAY = env('PAYMENT_GATEWAY', default='razorpay')
+FAKE_GATEWAY_LATENCY = env.float('FAKE_GATEWAY_LATENCY', default=0.2)
+FAKE_GATEWAY_FAILURE_RATE = env.float('FAKE_GATEWAY_FAILURE_RATE', default=0.0)
+# API host for the real client; empty for Razorpay's own. Set it to the
+# run_fake_gateway server (e.g. http://127.0.0.1:8765) to load-test over HTTP
+PAYMENT_GATEWAY_URL = env('PAYMENT_GATEWAY_URL', default='')
+
+# Gateway HTTP client: (connect, read) timeouts in seconds and the size of the
+# per-process connection pool
+PAYMENT_GATEWAY_TIMEOUT = (3.05, 10)
+PAYMENT_GATEWAY_POOL_SIZE = 10
+
+# Refund queue (payment.refunds): attempts before a job is marked failed and
+# the base delay in seconds of the exponential retry backoff
+REFUND_MAX_ATTEMPTS = 8
+REFUND_RETRY_BASE_SECONDS = 30
+
+# Pending bookings (unpaid holds) older than this are cancelled by the
+# expire_pending_bookings command
+BOOKING_HOLD_TTL_MINUTES = 30
+
+# How long a created gateway order is reused for the same booking and amount
+PAYMENT_ORDER_CACHE_SECONDS = BOOKING_HOLD_TTL_MINUTES * 60
+
+# Gateway payloads of settled payments untouched for this many days are moved
+# to the compressed archive table by archive_gateway_responses
+PAYMENT_ARCHIVE_AFTER_DAYS = 90
 
 
 CRISPY_ALLOWED_TEMPLATE_PACKS = 'bootstrap5'
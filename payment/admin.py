@@ -1,3 +1,16 @@
 from django.contrib import admin
+from payment.models import SettlementImport, SettlementDiscrepancy
 
-# Register your models here.
+
+@admin.register(SettlementImport)
+class SettlementImportAdmin(admin.ModelAdmin):
+    list_display = ('file_name', 'started_at', 'finished_at', 'rows', 'matched', 'skipped', 'discrepancies')
+
+
+@admin.register(SettlementDiscrepancy)
+class SettlementDiscrepancyAdmin(admin.ModelAdmin):
+    list_display = ('settlement_import', 'line_number', 'kind', 'razorpay_payment_id',
+                    'razorpay_order_id', 'settled_amount', 'recorded_amount')
+    list_filter = ('kind', 'settlement_import')
+    search_fields = ('razorpay_payment_id', 'razorpay_order_id')
+    raw_id_fields = ('payment',)
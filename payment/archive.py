@@ -0,0 +1,84 @@
+"""
+Cold storage for gateway payloads.
+
+Payment.payment_gateway_response is only read when someone looks at a single
+payment, yet it is the bulk of each row. Payloads of settled payments that
+have not changed for settings.PAYMENT_ARCHIVE_AFTER_DAYS are compressed into
+PaymentGatewayArchive and cleared from the payment row, one short transaction
+per batch. Payment.gateway_response reads either location.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum, TextField
+from django.db.models.functions import Cast, Length
+from django.utils import timezone
+
+from payment.models import Payment, PaymentGatewayArchive
+
+BATCH_SIZE = 500
+SETTLED_STATUSES = ('completed', 'refunded', 'failed')
+
+
+def archive_gateway_responses(days=None, batch_size=BATCH_SIZE, dry_run=False):
+    """
+    Move payloads of settled payments older than `days` to the archive table.
+    With dry_run nothing is written.
+
+    Returns a dict with the payments archived and their payload sizes in bytes
+    before and after compression.
+    """
+    days = settings.PAYMENT_ARCHIVE_AFTER_DAYS if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    candidates = Payment.objects.filter(
+        payment_status__in=SETTLED_STATUSES,
+        updated_at__lt=cutoff,
+        payment_gateway_response__isnull=False,
+    ).exclude(refund_job__status__in=('queued', 'running')).order_by('pk')
+
+    totals = {'payments': 0, 'bytes_before': 0, 'bytes_after': 0}
+    last_id = 0
+    while True:
+        rows = list(candidates.filter(pk__gt=last_id).values_list(
+            'pk', 'payment_gateway_response')[:batch_size])
+        if not rows:
+            return totals
+
+        archives = []
+        for pk, response in rows:
+            data, original_size = PaymentGatewayArchive.compress(response)
+            archives.append(PaymentGatewayArchive(payment_id=pk, data=data, original_size=original_size))
+            totals['bytes_before'] += original_size
+            totals['bytes_after'] += len(data)
+        totals['payments'] += len(archives)
+
+        if not dry_run:
+            with transaction.atomic():
+                PaymentGatewayArchive.objects.bulk_create(
+                    archives, update_conflicts=True, unique_fields=['payment'],
+                    update_fields=['data', 'original_size', 'archived_at'])
+                # Payments written since they were read keep their (newer) payload
+                Payment.objects.filter(
+                    pk__in=[pk for pk, _ in rows], updated_at__lt=cutoff
+                ).update(payment_gateway_response=None)
+        last_id = rows[-1][0]
+
+
+def storage_report():
+    """
+    Return payload counts and sizes in bytes, inline and archived.
+    """
+    inline = Payment.objects.filter(payment_gateway_response__isnull=False).aggregate(
+        count=Count('pk'),
+        size=Sum(Length(Cast('payment_gateway_response', TextField()))),
+    )
+    archived = PaymentGatewayArchive.objects.aggregate(
+        count=Count('pk'), original_size=Sum('original_size'), size=Sum(Length('data')))
+    return {
+        'inline_count': inline['count'],
+        'inline_bytes': inline['size'] or 0,
+        'archived_count': archived['count'],
+        'archived_original_bytes': archived['original_size'] or 0,
+        'archived_bytes': archived['size'] or 0,
+    }
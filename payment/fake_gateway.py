@@ -0,0 +1,199 @@
+"""
+Offline stand-in for razorpay.Client.
+
+Implements the parts of the client this project uses (order.create,
+payment.refund, payment.fetch_multiple_refund and utility signature checks) with configurable latency and
+failure rate, so payment flows and workers can be exercised and load-tested
+without reaching the real gateway. Enable it with PAYMENT_GATEWAY = 'fake'.
+
+FakeGatewayHandler serves the same calls over HTTP in Razorpay's REST format
+(run_fake_gateway), so the real client, its connection pool and timeouts can
+be exercised end to end by pointing PAYMENT_GATEWAY_URL at it.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from razorpay.errors import ServerError  # type: ignore
+from razorpay.utility.utility import Utility  # type: ignore
+
+
+def sign_payment(order_id, payment_id, secret):
+    """
+    The signature Razorpay checkout would post back for this order/payment.
+    """
+    return hmac.new(
+        secret.encode(), f'{order_id}|{payment_id}'.encode(), hashlib.sha256).hexdigest()
+
+
+def new_id(prefix):
+    return f'{prefix}_{uuid.uuid4().hex[:14]}'
+
+
+class FakeOrders:
+    def __init__(self, client):
+        self.client = client
+
+    def create(self, data=None, **kwargs):
+        self.client.simulate_call()
+        data = data or {}
+        return {
+            'id': new_id('order'),
+            'entity': 'order',
+            'amount': data.get('amount'),
+            'currency': data.get('currency', 'INR'),
+            'receipt': data.get('receipt'),
+            'status': 'created',
+            'created_at': int(time.time()),
+        }
+
+
+class FakePayments:
+    """
+    Refunds are kept per payment; a repeated X-Refund-Idempotency header
+    returns the refund already made for it, as the gateway does.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.lock = threading.Lock()
+        self.refunds = {}
+        self.idempotent = {}
+
+    def refund(self, payment_id, data=None, headers=None, **kwargs):
+        self.client.simulate_call()
+        data = data or {}
+        key = (headers or {}).get('X-Refund-Idempotency')
+        with self.lock:
+            if key and key in self.idempotent:
+                return self.idempotent[key]
+            refund = {
+                'id': new_id('rfnd'),
+                'entity': 'refund',
+                'payment_id': payment_id,
+                'amount': data.get('amount'),
+                'receipt': data.get('receipt'),
+                'status': 'processed',
+                'created_at': int(time.time()),
+            }
+            self.refunds.setdefault(payment_id, []).append(refund)
+            if key:
+                self.idempotent[key] = refund
+        return refund
+
+    def fetch_multiple_refund(self, payment_id, data=None, **kwargs):
+        self.client.simulate_call()
+        with self.lock:
+            items = list(self.refunds.get(payment_id, []))
+        return {'entity': 'collection', 'count': len(items), 'items': items}
+
+
+class FakeGatewayClient:
+    """
+    Drop-in replacement for razorpay.Client. `latency` is the mean delay in
+    seconds added to every gateway call; `failure_rate` is the fraction of
+    calls that raise razorpay.errors.ServerError.
+    """
+
+    def __init__(self, auth=None, latency=0.0, failure_rate=0.0, seed=None):
+        self.auth = auth or ('rzp_test_fake', 'fake_secret')
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.order = FakeOrders(self)
+        self.payment = FakePayments(self)
+        self.utility = Utility(self)
+
+    def simulate_call(self):
+        if self.latency:
+            time.sleep(self.random.uniform(0.5, 1.5) * self.latency)
+        if self.random.random() < self.failure_rate:
+            raise ServerError('Simulated gateway failure')
+
+
+class FakeGatewayHandler(BaseHTTPRequestHandler):
+    """
+    POST /v1/orders, POST /v1/payments/<id>/refund and GET
+    /v1/payments/<id>/refunds, answered by the server's FakeGatewayClient. Errors use Razorpay's JSON error format so the
+    real client raises the same exceptions it would in production.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        client = self.server.client
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        if not self.authorized(client.auth):
+            return self.send_error_json(401, 'BAD_REQUEST_ERROR', 'Authentication failed')
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            return self.send_error_json(400, 'BAD_REQUEST_ERROR', 'Invalid JSON body')
+
+        parts = urlparse(self.path).path.strip('/').split('/')
+        try:
+            if parts == ['v1', 'orders']:
+                result = client.order.create(data)
+            elif len(parts) == 4 and parts[:2] == ['v1', 'payments'] and parts[3] == 'refund':
+                key = self.headers.get('X-Refund-Idempotency')
+                headers = {'X-Refund-Idempotency': key} if key else {}
+                result = client.payment.refund(parts[2], data, headers=headers)
+            else:
+                return self.send_error_json(
+                    404, 'BAD_REQUEST_ERROR', 'The requested URL was not found on the server.')
+        except ServerError as exc:
+            return self.send_error_json(500, 'SERVER_ERROR', str(exc))
+        self.send_json(200, result)
+
+    def do_GET(self):
+        client = self.server.client
+        if not self.authorized(client.auth):
+            return self.send_error_json(401, 'BAD_REQUEST_ERROR', 'Authentication failed')
+
+        parts = urlparse(self.path).path.strip('/').split('/')
+        try:
+            if len(parts) == 4 and parts[:2] == ['v1', 'payments'] and parts[3] == 'refunds':
+                result = client.payment.fetch_multiple_refund(parts[2])
+            else:
+                return self.send_error_json(
+                    404, 'BAD_REQUEST_ERROR', 'The requested URL was not found on the server.')
+        except ServerError as exc:
+            return self.send_error_json(500, 'SERVER_ERROR', str(exc))
+        self.send_json(200, result)
+
+    def authorized(self, auth):
+        expected = base64.b64encode(f'{auth[0]}:{auth[1]}'.encode()).decode()
+        return hmac.compare_digest(self.headers.get('Authorization', ''), f'Basic {expected}')
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, code, description):
+        self.send_json(status, {'error': {'code': code, 'description': description}})
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(host, port, auth, latency=0.0, failure_rate=0.0, verbose=False):
+    """
+    Build (but do not start) a threaded fake gateway HTTP server.
+    """
+    server = ThreadingHTTPServer((host, port), FakeGatewayHandler)
+    server.daemon_threads = True
+    server.client = FakeGatewayClient(auth=auth, latency=latency, failure_rate=failure_rate)
+    server.verbose = verbose
+    return server
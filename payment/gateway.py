@@ -0,0 +1,154 @@
+"""
+Single place where payment code gets a gateway client.
+
+settings.PAYMENT_GATEWAY selects the real Razorpay client ('razorpay') or the
+offline stand-in from payment.fake_gateway ('fake'); PAYMENT_GATEWAY_URL
+points the real client at another API host, such as the run_fake_gateway
+server. The real client is built once per process around a pooled requests
+session that enforces connect/read timeouts on every call and records its
+latency (see gateway_latency).
+
+Orders are cached per (booking, amount) so re-submitting the payment page
+reuses the order instead of creating a new one at the gateway.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.cache import cache
+import razorpay  # type: ignore
+import requests
+from requests.adapters import HTTPAdapter
+
+from core.metrics import gateway_duration
+from payment.fake_gateway import FakeGatewayClient
+
+logger = logging.getLogger(__name__)
+
+
+class GatewayLatency:
+    """
+    Thread-safe per-operation latency stats for gateway calls, in seconds.
+    """
+
+    def __init__(self, samples=1000):
+        self.lock = threading.Lock()
+        self.samples = samples
+        self.operations = {}
+
+    def record(self, operation, seconds, failed=False):
+        with self.lock:
+            stats = self.operations.setdefault(operation, {
+                'count': 0, 'errors': 0, 'total': 0.0, 'max': 0.0,
+                'recent': deque(maxlen=self.samples),
+            })
+            stats['count'] += 1
+            stats['errors'] += int(failed)
+            stats['total'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+            stats['recent'].append(seconds)
+
+    def snapshot(self):
+        """
+        Return {operation: {count, errors, mean, max, p50, p95}} for recent calls.
+        """
+        with self.lock:
+            result = {}
+            for operation, stats in self.operations.items():
+                recent = sorted(stats['recent'])
+                result[operation] = {
+                    'count': stats['count'],
+                    'errors': stats['errors'],
+                    'mean': stats['total'] / stats['count'],
+                    'max': stats['max'],
+                    'p50': recent[len(recent) // 2],
+                    'p95': recent[min(len(recent) - 1, int(len(recent) * 0.95))],
+                }
+            return result
+
+
+gateway_latency = GatewayLatency()
+
+
+class GatewaySession(requests.Session):
+    """
+    requests session with a bounded connection pool, default timeouts and
+    latency recording for every gateway call.
+    """
+
+    def __init__(self, timeout, pool_size):
+        super().__init__()
+        self.timeout = timeout
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        # /v1/payments/pay_123/refund -> POST /v1/payments/refund
+        path = '/'.join(
+            part for part in urlparse(url).path.split('/') if part and '_' not in part)
+        operation = f'{method.upper()} /{path}'
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = super().request(method, url, **kwargs)
+            failed = response.status_code >= 400
+            return response
+        finally:
+            elapsed = time.perf_counter() - started
+            gateway_latency.record(operation, elapsed, failed)
+            gateway_duration.observe(elapsed, operation=operation, outcome='error' if failed else 'ok')
+            logger.debug('Gateway %s took %.1fms', operation, elapsed * 1000)
+
+
+@lru_cache(maxsize=None)
+def build_client(gateway, key, secret, timeout, pool_size, latency, failure_rate, base_url):
+    if gateway == 'fake':
+        return FakeGatewayClient(auth=(key, secret), latency=latency, failure_rate=failure_rate)
+    options = {'base_url': base_url} if base_url else {}
+    return razorpay.Client(session=GatewaySession(timeout, pool_size), auth=(key, secret), **options)
+
+
+def get_gateway_client():
+    """
+    Return the process-wide client for the current settings.
+    """
+    return build_client(
+        settings.PAYMENT_GATEWAY,
+        settings.RAZORPAY_KEY,
+        settings.RAZORPAY_SECRET,
+        tuple(settings.PAYMENT_GATEWAY_TIMEOUT),
+        settings.PAYMENT_GATEWAY_POOL_SIZE,
+        settings.FAKE_GATEWAY_LATENCY,
+        settings.FAKE_GATEWAY_FAILURE_RATE,
+        settings.PAYMENT_GATEWAY_URL,
+    )
+
+
+def order_cache_key(booking_id, amount):
+    return f'payment:order:{booking_id}:{amount}'
+
+
+def get_or_create_order(booking, client=None):
+    """
+    Return the gateway order for the booking's current amount, creating it only
+    if no order for that (booking, amount) was created recently.
+    """
+    amount = int(booking.total_cost * 100)
+    key = order_cache_key(booking.id, amount)
+    order = cache.get(key)
+    if order is None:
+        client = client or get_gateway_client()
+        order = client.order.create(data={
+            'amount': amount,
+            'currency': 'INR',
+            'receipt': f'booking_{booking.id}',
+            'payment_capture': '1',
+        })
+        cache.set(key, order, settings.PAYMENT_ORDER_CACHE_SECONDS)
+    return order
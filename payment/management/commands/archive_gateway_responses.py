@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from core.models import JobLock
+from payment.archive import archive_gateway_responses, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Compress gateway payloads of old, settled payments into the archive table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Archive payments untouched for this many days '
+                                 '(default: settings.PAYMENT_ARCHIVE_AFTER_DAYS).')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Payments archived per transaction.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be archived.')
+        parser.add_argument('--lock-ttl', type=int, default=3600,
+                            help='Seconds after which a lock left by a crashed run expires.')
+
+    def handle(self, *args, **options):
+        with JobLock.hold('archive_gateway_responses', timedelta(seconds=options['lock_ttl'])) as locked:
+            if not locked:
+                self.stdout.write(self.style.WARNING('Another run is in progress; skipping.'))
+                return
+
+            totals = archive_gateway_responses(
+                days=options['days'], batch_size=options['batch_size'], dry_run=options['dry_run'])
+
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {totals['payments']} payloads: {totals['bytes_before']} bytes "
+            f"-> {totals['bytes_after']} bytes compressed."))
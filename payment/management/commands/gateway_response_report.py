@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from payment.archive import storage_report
+
+
+class Command(BaseCommand):
+    help = 'Show how much space gateway payloads take inline and in the archive.'
+
+    def handle(self, *args, **options):
+        report = storage_report()
+        before = report['inline_bytes'] + report['archived_original_bytes']
+        after = report['inline_bytes'] + report['archived_bytes']
+
+        self.stdout.write(f"Inline: {report['inline_count']} payloads, {report['inline_bytes']} bytes")
+        self.stdout.write(
+            f"Archived: {report['archived_count']} payloads, {report['archived_original_bytes']} bytes "
+            f"uncompressed, {report['archived_bytes']} bytes stored")
+        saved = 100 * (before - after) / before if before else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Total: {before} bytes before archiving, {after} bytes now ({saved:.0f}% saved).'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from payment.settlements import import_settlement, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = ('Match a gateway settlement file (CSV, JSON array or newline-delimited JSON) '
+            'against payments and record discrepancies.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Settlement file to import.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Rows matched per database lookup.')
+        parser.add_argument('--amount-in-paise', action='store_true',
+                            help='Amounts in the file are in paise rather than rupees.')
+
+    def handle(self, *args, **options):
+        try:
+            result = import_settlement(
+                options['path'], batch_size=options['batch_size'],
+                amount_in_paise=options['amount_in_paise'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Could not read {options["path"]}: {exc}')
+
+        self.stdout.write(
+            f'{result.rows} rows: {result.matched} matched, {result.skipped} skipped '
+            f'(not payments), {result.discrepancies} discrepancies.')
+        self.stdout.write(self.style.SUCCESS(f'Saved as settlement import #{result.pk}.'))
@@ -0,0 +1,157 @@
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from booking.models import Booking
+from payment.fake_gateway import new_id, sign_payment
+from payment.gateway import gateway_latency
+from properties.models import Property
+
+STEPS = ('book', 'initiate', 'confirm')
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = ('Load-test checkout end to end: concurrent users book, initiate payment and confirm '
+            'it through the real views against a fake gateway. Reports latency percentiles and '
+            'queries per request. Synthetic rows are deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20,
+                            help='Virtual users, each with its own property.')
+        parser.add_argument('--iterations', type=int, default=5,
+                            help='Checkouts per user.')
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='Users running at the same time.')
+        parser.add_argument('--latency', type=float, default=0.05,
+                            help='Mean in-process fake gateway latency in seconds.')
+        parser.add_argument('--failure-rate', type=float, default=0.0,
+                            help='Fraction of in-process fake gateway calls that fail.')
+        parser.add_argument('--gateway-url',
+                            help='Use the real client against this host (e.g. a run_fake_gateway '
+                                 'server) instead of the in-process fake.')
+
+    def handle(self, *args, **options):
+        if options['gateway_url']:
+            overrides = {'PAYMENT_GATEWAY': 'razorpay', 'PAYMENT_GATEWAY_URL': options['gateway_url']}
+        else:
+            overrides = {'PAYMENT_GATEWAY': 'fake', 'FAKE_GATEWAY_LATENCY': options['latency'],
+                         'FAKE_GATEWAY_FAILURE_RATE': options['failure_rate']}
+
+        tag = uuid.uuid4().hex[:8]
+        self.samples = defaultdict(list)
+        self.lock = threading.Lock()
+        try:
+            pairs = self.populate(tag, options['users'])
+            started = time.perf_counter()
+            with override_settings(**overrides), ThreadPoolExecutor(options['concurrency']) as pool:
+                list(pool.map(lambda pair: self.run_user(*pair, options['iterations']), pairs))
+            elapsed = time.perf_counter() - started
+            self.report(elapsed, bool(options['gateway_url']))
+        finally:
+            CustomUser.objects.filter(username__startswith=f'loadtest-{tag}-').delete()
+
+    def populate(self, tag, count):
+        users = CustomUser.objects.bulk_create([
+            CustomUser(username=f'loadtest-{tag}-{i}', email=f'loadtest-{tag}-{i}@example.com',
+                       profile_pic='')
+            for i in range(count)
+        ])
+        properties = Property.objects.bulk_create([
+            Property(owner=user, title=f'loadtest-{tag}-{i}', slug=f'loadtest-{tag}-{i}',
+                     city='Goa', state='Goa', zip_code='403001', price_per_night=1000, max_guests=4)
+            for i, user in enumerate(users)
+        ])
+        return list(zip(users, properties))
+
+    def timed(self, step, request, *args, **kwargs):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count):
+            response = request(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        ok = response.status_code < 400
+        with self.lock:
+            self.samples[step].append((elapsed, queries, ok))
+        return response
+
+    def run_user(self, user, property_instance, iterations):
+        client = Client(raise_request_exception=False)
+        client.force_login(user)
+        today = timezone.localdate()
+        try:
+            for i in range(iterations):
+                check_in = today + timedelta(days=2 + 3 * i)
+                book_url = reverse('booking:book_property', args=[property_instance.pk])
+                response = self.timed('book', client.post, book_url, {
+                    'check_in': check_in.isoformat(),
+                    'check_out': (check_in + timedelta(days=2)).isoformat(),
+                    'guests': 2,
+                })
+                if response.status_code != 302 or 'initiate-payment' not in response.url:
+                    continue
+                booking_id = int(response.url.rstrip('/').rsplit('/', 1)[-1])
+
+                response = self.timed(
+                    'initiate', client.post, reverse('payments:initiate-payment', args=[booking_id]))
+                order_id = Booking.objects.filter(pk=booking_id).values_list(
+                    'razorpay_order_id', flat=True).first()
+                if response.status_code != 200 or not order_id:
+                    continue
+
+                payment_id = new_id('pay')
+                self.timed('confirm', client.post, reverse('payments:payment-confirmation'), {
+                    'razorpay_order_id': order_id,
+                    'razorpay_payment_id': payment_id,
+                    'razorpay_signature': sign_payment(order_id, payment_id, settings.RAZORPAY_SECRET),
+                })
+                with self.lock:
+                    self.samples['confirmed'].append(
+                        Booking.objects.filter(pk=booking_id, status='confirmed').exists())
+        finally:
+            client.logout()
+            connection.close()
+
+    def report(self, elapsed, over_http):
+        confirmed = sum(self.samples['confirmed'])
+        self.stdout.write(f'{confirmed} checkouts confirmed in {elapsed:.2f}s ({confirmed / elapsed:.1f}/s)')
+        self.stdout.write(f"{'step':<10}{'requests':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}"
+                          f"{'p99 ms':>9}{'queries':>9}{'max q':>7}")
+        for step in STEPS:
+            samples = self.samples[step]
+            if not samples:
+                continue
+            timings = sorted(elapsed for elapsed, _, _ in samples)
+            queries = [count for _, count, _ in samples]
+            errors = sum(1 for _, _, ok in samples if not ok)
+            self.stdout.write(
+                f'{step:<10}{len(samples):>9}{errors:>8}'
+                f'{percentile(timings, 0.50) * 1000:>9.1f}{percentile(timings, 0.95) * 1000:>9.1f}'
+                f'{percentile(timings, 0.99) * 1000:>9.1f}{sum(queries) / len(queries):>9.1f}{max(queries):>7}')
+
+        if over_http:
+            for operation, stats in gateway_latency.snapshot().items():
+                self.stdout.write(
+                    f"gateway {operation}: {stats['count']} calls, {stats['errors']} errors, "
+                    f"p50 {stats['p50'] * 1000:.1f}ms, p95 {stats['p95'] * 1000:.1f}ms")
@@ -0,0 +1,74 @@
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from booking.models import Booking
+from payment.fake_gateway import FakeGatewayClient
+from payment.models import Payment, RefundJob
+from payment.refunds import run_workers
+from properties.models import Property
+
+
+class Command(BaseCommand):
+    help = ('Load-test the refund workers offline: queue synthetic refunds, drain them '
+            'against the fake gateway and report throughput. Synthetic rows are deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--latency', type=float, default=0.2,
+                            help='Mean fake gateway latency in seconds.')
+        parser.add_argument('--failure-rate', type=float, default=0.1,
+                            help='Fraction of fake gateway calls that fail and get retried.')
+
+    def handle(self, *args, **options):
+        owner = self.populate(options['jobs'])
+        try:
+            client_factory = lambda: FakeGatewayClient(
+                latency=options['latency'], failure_rate=options['failure_rate'])
+            started = time.perf_counter()
+            # No backoff delay, so retries are due straight away and the run drains the queue
+            with override_settings(REFUND_RETRY_BASE_SECONDS=0):
+                outcomes = run_workers(
+                    workers=options['workers'], once=True, client_factory=client_factory,
+                    jobs=RefundJob.objects.filter(payment__user=owner))
+            elapsed = time.perf_counter() - started
+
+            attempts = sum(outcomes.values())
+            self.stdout.write(
+                f"{options['jobs']} jobs, {attempts} gateway attempts in {elapsed:.2f}s "
+                f"({options['jobs'] / elapsed:.1f} refunds/s) with {options['workers']} workers")
+            self.stdout.write(
+                f"succeeded: {outcomes['succeeded']}, retried: {outcomes['queued']}, "
+                f"failed: {outcomes['failed']}, refunded payments: "
+                f"{Payment.objects.filter(user=owner, payment_status='refunded').count()}")
+        finally:
+            owner.delete()
+
+    def populate(self, count):
+        tag = uuid.uuid4().hex[:8]
+        owner = CustomUser.objects.create(
+            username=f'loadtest-{tag}', email=f'loadtest-{tag}@example.com', profile_pic='')
+        property_instance = Property.objects.bulk_create([Property(
+            owner=owner, title=f'loadtest-{tag}', slug=f'loadtest-{tag}', city='Goa',
+            state='Goa', zip_code='403001', price_per_night=1000)])[0]
+
+        check_in = timezone.now() + timedelta(days=30)
+        bookings = Booking.objects.bulk_create([
+            Booking(user=owner, property=property_instance, check_in=check_in,
+                    check_out=check_in + timedelta(days=1), total_cost=1000, guests=1,
+                    status='cancelled')
+            for _ in range(count)
+        ])
+        payments = Payment.objects.bulk_create([
+            Payment(user=owner, booking=booking, amount=1000, payment_method='upi',
+                    payment_status='completed', razorpay_payment_id=f'pay_{tag}_{i}')
+            for i, booking in enumerate(bookings)
+        ])
+        RefundJob.objects.bulk_create([RefundJob(payment=payment) for payment in payments])
+        return owner
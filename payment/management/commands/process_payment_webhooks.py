@@ -0,0 +1,36 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from core.models import JobLock
+from payment.webhooks import process_pending_events, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Apply stored gateway webhook events to payments and bookings in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Events applied per transaction.')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new events instead of exiting.')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds between polls with --loop.')
+        parser.add_argument('--lock-ttl', type=int, default=600,
+                            help='Seconds after which a lock left by a crashed run expires.')
+
+    def handle(self, *args, **options):
+        lock_ttl = timedelta(seconds=options['lock_ttl'])
+        while True:
+            with JobLock.hold('process_payment_webhooks', lock_ttl) as locked:
+                if not locked:
+                    self.stdout.write(self.style.WARNING('Another run is in progress; skipping.'))
+                    return
+                totals = process_pending_events(batch_size=options['batch_size'])
+
+            if totals['events'] or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Applied {totals['events']} events ({totals['changes']} rows changed)."))
+            if not options['loop']:
+                return
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from payment.refunds import run_workers
+
+
+class Command(BaseCommand):
+    help = 'Process queued refunds against the payment gateway with a pool of workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Number of worker threads.')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when no job is due instead of polling.')
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help='Seconds to wait between polls when the queue is empty.')
+
+    def handle(self, *args, **options):
+        outcomes = run_workers(
+            workers=options['workers'], once=options['once'], poll_interval=options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Refunds succeeded: {outcomes['succeeded']}, retrying: {outcomes['queued']}, "
+            f"failed: {outcomes['failed']}"))
@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from core.models import JobLock
+from payment.reconciliation import reconcile_payments, CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Bring payment statuses in line with their bookings, in bulk.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Payment ids covered by each UPDATE statement.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the payments that would change.')
+        parser.add_argument('--lock-ttl', type=int, default=600,
+                            help='Seconds after which a lock left by a crashed run expires.')
+
+    def handle(self, *args, **options):
+        with JobLock.hold('reconcile_payments', timedelta(seconds=options['lock_ttl'])) as locked:
+            if not locked:
+                self.stdout.write(self.style.WARNING('Another run is in progress; skipping.'))
+                return
+
+            changed = reconcile_payments(
+                chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+
+        for transition, count in changed.items():
+            self.stdout.write(f'{transition}: {count}')
+        verb = 'Would update' if options['dry_run'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {sum(changed.values())} payments.'))
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from payment.fake_gateway import make_server
+
+
+class Command(BaseCommand):
+    help = ('Serve an offline Razorpay stand-in over HTTP (orders and refunds) for load tests. '
+            'Point the app at it with PAYMENT_GATEWAY_URL.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=settings.FAKE_GATEWAY_LATENCY,
+                            help='Mean added latency per call in seconds.')
+        parser.add_argument('--failure-rate', type=float, default=settings.FAKE_GATEWAY_FAILURE_RATE,
+                            help='Fraction of calls answered with a server error.')
+        parser.add_argument('--verbose', action='store_true', help='Log every request.')
+
+    def handle(self, *args, **options):
+        server = make_server(
+            options['host'], options['port'],
+            auth=(settings.RAZORPAY_KEY, settings.RAZORPAY_SECRET),
+            latency=options['latency'], failure_rate=options['failure_rate'],
+            verbose=options['verbose'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Fake gateway listening on http://{options['host']}:{options['port']} "
+            f"(latency {options['latency']}s, failure rate {options['failure_rate']})"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
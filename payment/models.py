@@ -4,8 +4,22 @@ from accounts.models import CustomUser
 from booking.models import Booking
 from django.utils import timezone
 from decimal import Decimal
+import json
+import zlib
 import razorpay  # type: ignore
 
+from core.metrics import payment_verifications, refunds
+
+
+class PaymentManager(models.Manager):
+    """
+    Leaves the gateway payload out of every default query; it is fetched only
+    when accessed (see Payment.gateway_response).
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().defer('payment_gateway_response')
+
 
 class Payment(models.Model):
     PAYMENT_METHOD_CHOICES = (
@@ -43,15 +57,30 @@ class Payment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PaymentManager()
+
     class Meta:
         ordering = ['-created_at', '-updated_at']
         indexes = [
             models.Index(fields=['user', 'payment_status']),
+            models.Index(fields=['payment_status', 'updated_at']),
         ]
 
     def __str__(self):
         return f"Payment for Booking ID: {self.booking.id} by {self.user.username}"
 
+    @property
+    def gateway_response(self):
+        """
+        The gateway payload, whether stored inline or moved to the archive.
+        """
+        if self.payment_gateway_response is not None:
+            return self.payment_gateway_response
+        try:
+            return self.gateway_archive.response
+        except PaymentGatewayArchive.DoesNotExist:
+            return None
+
     def clean(self):
         # Ensure the payment amount matches the booking total cost
         if self.amount <= Decimal('0.00'):
@@ -99,6 +128,7 @@ class Payment(models.Model):
             if self.booking.status == 'pending':
                 self.booking.confirm_booking()
 
+            payment_verifications.inc(result='success')
             return True
         except razorpay.errors.SignatureVerificationError:
             # Mark payment as failed
@@ -109,33 +139,42 @@ class Payment(models.Model):
             if self.booking.status == 'pending':
                 self.booking.cancel_booking()
 
+            payment_verifications.inc(result='failure')
         return False
 
-    def refund_payment(self, razorpay_client):
+    def refund_payment(self, razorpay_client, idempotency_key=None):
         """
         Refund the payment through Razorpay. This assumes that the payment was completed successfully.
+        With an idempotency key, repeating the call (e.g. after a timeout) returns
+        the refund already made instead of refunding again.
         """
         if self.payment_status == 'completed':
-            refund = razorpay_client.payment.refund(self.razorpay_payment_id, {
-                'amount': int(self.amount * 100),
-            })
+            data, options = {'amount': int(self.amount * 100)}, {}
+            if idempotency_key:
+                data['receipt'] = idempotency_key
+                options['headers'] = {'X-Refund-Idempotency': idempotency_key}
+            refund = razorpay_client.payment.refund(self.razorpay_payment_id, data, **options)
             if refund['status'] == 'processed':
                 self.payment_status = 'refunded'
                 self.save()
+                refunds.inc(result='processed')
                 return True
+            refunds.inc(result=refund['status'])
         return False
 
-    def update_status_based_on_dates(self):
+    def sync_refund_status(self, razorpay_client):
         """
-        Automatically update the payment status based on the booking status.
+        Mark the payment refunded if the gateway already holds a processed
+        refund for it, e.g. from an attempt whose response never arrived.
         """
-        if self.payment_status == 'pending' and self.booking.status == 'confirmed':
-            self.payment_status = 'completed'
-            self.save()
-        elif self.payment_status == 'completed' and self.booking.status != 'confirmed':
-            self.payment_status = 'failed'
-            self.save()
-        return self.payment_status
+        if self.payment_status == 'completed':
+            made = razorpay_client.payment.fetch_multiple_refund(self.razorpay_payment_id)
+            if any(refund['status'] == 'processed' for refund in made.get('items', [])):
+                self.payment_status = 'refunded'
+                self.save()
+                refunds.inc(result='processed')
+                return True
+        return self.payment_status == 'refunded'
 
     def cancel_payment(self):
         """
@@ -158,62 +197,153 @@ class Payment(models.Model):
             self.save()
         return self.payment_status
 
-    def update_payment_status(self):
-        """
-        Update the payment status based on the booking status.
-        """
-        if self.payment_status == 'pending' and self.booking.status == 'confirmed':
-            self.payment_status = 'completed'
-            self.save()
-        elif self.payment_status == 'completed' and self.booking.status != 'confirmed':
-            self.payment_status = 'failed'
-            self.save()
-        return self.payment_status
 
-    def update_payment_status_based_on_dates(self):
-        """
-        Automatically update the payment status based on the booking status.
-        """
-        if self.payment_status == 'pending' and self.booking.status == 'confirmed':
-            self.payment_status = 'completed'
-            self.save()
-        elif self.payment_status == 'completed' and self.booking.status != 'confirmed':
-            self.payment_status = 'failed'
-            self.save()
-        return self.payment_status
+class PaymentGatewayArchive(models.Model):
+    """
+    zlib-compressed gateway payload of a settled payment, moved out of the
+    payment row by archive_gateway_responses.
+    """
+    payment = models.OneToOneField(
+        Payment, on_delete=models.CASCADE, primary_key=True, related_name='gateway_archive')
+    data = models.BinaryField()
+    original_size = models.PositiveIntegerField()
+    archived_at = models.DateTimeField(auto_now_add=True)
 
-    def update_payment_status_based_on_booking(self):
-        """
-        Update the payment status based on the booking status.
-        """
-        if self.payment_status == 'pending' and self.booking.status == 'confirmed':
-            self.payment_status = 'completed'
-            self.save()
-        elif self.payment_status == 'completed' and self.booking.status != 'confirmed':
-            self.payment_status = 'failed'
-            self.save()
-        return self.payment_status
+    def __str__(self):
+        return f"Gateway response archive for Payment ID: {self.payment_id}"
 
-    def update_payment_status_based_on_booking_status(self):
-        """
-        Update the payment status based on the booking status.
-        """
-        if self.payment_status == 'pending' and self.booking.status == 'confirmed':
-            self.payment_status = 'completed'
-            self.save()
-        elif self.payment_status == 'completed' and self.booking.status != 'confirmed':
-            self.payment_status = 'failed'
-            self.save()
-        return self.payment_status
+    @staticmethod
+    def compress(response):
+        raw = json.dumps(response, separators=(',', ':')).encode()
+        return zlib.compress(raw, 9), len(raw)
+
+    @property
+    def response(self):
+        return json.loads(zlib.decompress(self.data))
+
+
+class RefundJob(models.Model):
+    """
+    Durable refund request processed by the refund workers (payment.refunds).
+    One job per payment, so cancelling twice never refunds twice.
+    """
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    )
+
+    payment = models.OneToOneField(
+        Payment, on_delete=models.CASCADE, related_name='refund_job')
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=255, blank=True)
+    locked_until = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
-    def update_payment_status_based_on_booking_dates(self):
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"Refund job for Payment ID: {self.payment_id} ({self.status})"
+
+    @classmethod
+    def enqueue(cls, payment):
         """
-        Automatically update the payment status based on the booking status.
+        Queue a refund for the payment; returns the existing job if there is one.
         """
-        if self.payment_status == 'pending' and self.booking.status == 'confirmed':
-            self.payment_status = 'completed'
-            self.save()
-        elif self.payment_status == 'completed' and self.booking.status != 'confirmed':
-            self.payment_status = 'failed'
-            self.save()
-        return self.payment_status
+        job, _ = cls.objects.get_or_create(payment=payment)
+        return job
+
+
+class WebhookEvent(models.Model):
+    """
+    Append-only inbox of verified gateway webhook deliveries. The endpoint only
+    stores the raw event; process_payment_webhooks applies it later. The unique
+    event id turns duplicate deliveries into no-ops.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('ignored', 'Ignored'),
+    )
+
+    event_id = models.CharField(max_length=100, unique=True)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default='pending')
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['received_at']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} ({self.event_id})"
+
+
+class SettlementImport(models.Model):
+    """
+    One run of the settlement importer (payment.settlements) over a gateway
+    settlement file, with its totals.
+    """
+    file_name = models.CharField(max_length=255)
+    rows = models.PositiveIntegerField(default=0)
+    matched = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    discrepancies = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"Settlement import {self.file_name} ({self.started_at:%Y-%m-%d %H:%M})"
+
+
+class SettlementDiscrepancy(models.Model):
+    """
+    A settlement row that does not agree with our Payment records.
+    """
+    KIND_CHOICES = (
+        ('missing', 'No matching payment'),
+        ('amount', 'Amount mismatch'),
+        ('status', 'Payment not completed'),
+        ('order', 'Order id mismatch'),
+        ('invalid', 'Unreadable row'),
+    )
+
+    settlement_import = models.ForeignKey(
+        SettlementImport, on_delete=models.CASCADE, related_name='discrepancy_rows')
+    line_number = models.PositiveIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    payment = models.ForeignKey(
+        Payment, on_delete=models.SET_NULL, blank=True, null=True)
+    razorpay_payment_id = models.CharField(max_length=100, blank=True)
+    razorpay_order_id = models.CharField(max_length=100, blank=True)
+    settled_amount = models.DecimalField(
+        max_digits=10, decimal_places=2, blank=True, null=True)
+    recorded_amount = models.DecimalField(
+        max_digits=10, decimal_places=2, blank=True, null=True)
+    details = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        ordering = ['settlement_import', 'line_number']
+        verbose_name_plural = 'settlement discrepancies'
+
+    def __str__(self):
+        return f"{self.get_kind_display()} on line {self.line_number}"
@@ -0,0 +1,52 @@
+"""
+Set-based reconciliation of payment statuses against their bookings.
+
+Replaces the old per-row Payment.update_payment_status*() methods, which each
+reloaded the booking and saved one payment at a time. Here every rule is one
+UPDATE ... WHERE per id range, with the booking condition applied as a join,
+so a run walks the payment table once per rule in fixed-size primary-key
+chunks and never loads model instances.
+
+A completed payment whose booking is not confirmed is left alone: the old
+methods marked it failed, which also hit ongoing and completed stays, and money
+taken for a cancelled booking is returned by the refund queue instead.
+"""
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from payment.models import Payment
+
+CHUNK_SIZE = 5000
+
+# (from_status, to_status, condition on the joined booking)
+RULES = [
+    ('pending', 'completed', Q(booking__status__in=('confirmed', 'ongoing', 'completed'))),
+    ('pending', 'failed', Q(booking__status='cancelled')),
+]
+
+
+def reconcile_payments(now=None, chunk_size=CHUNK_SIZE, dry_run=False):
+    """
+    Apply every rule in RULES to the whole payment table, `chunk_size` ids per
+    statement. With dry_run the matching rows are only counted.
+
+    Returns a dict of rows changed (or matched) per transition.
+    """
+    now = now or timezone.now()
+    bounds = Payment.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    summary = {f'{from_status} -> {to_status}': 0 for from_status, to_status, _ in RULES}
+    if bounds['low'] is None:
+        return summary
+
+    for start in range(bounds['low'], bounds['high'] + 1, chunk_size):
+        chunk = Q(pk__gte=start, pk__lt=start + chunk_size)
+        with transaction.atomic():
+            for from_status, to_status, condition in RULES:
+                rows = Payment.objects.filter(chunk, condition, payment_status=from_status)
+                if dry_run:
+                    changed = rows.count()
+                else:
+                    changed = rows.update(payment_status=to_status, updated_at=now)
+                summary[f'{from_status} -> {to_status}'] += changed
+    return summary
@@ -0,0 +1,159 @@
+"""
+Refund queue workers.
+
+Jobs (payment.models.RefundJob) are claimed with a conditional UPDATE that
+takes a short lease, so any number of worker threads or processes can pull
+from the same table and a job left behind by a crashed worker is picked up
+again once its lease expires. Transient gateway errors are retried with
+exponential backoff and jitter, up to settings.REFUND_MAX_ATTEMPTS.
+
+A timed-out call or a lost lease can hide a refund the gateway did make, so
+every call carries the job's idempotency key and a retry first looks up the
+refunds the gateway already holds for the payment.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from razorpay.errors import BadRequestError  # type: ignore
+
+from payment.gateway import get_gateway_client
+from payment.models import RefundJob
+
+logger = logging.getLogger(__name__)
+
+LEASE = timedelta(minutes=5)
+MAX_BACKOFF_SECONDS = 6 * 3600
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def claimable(now):
+    return Q(status='queued', next_attempt_at__lte=now) | Q(status='running', locked_until__lte=now)
+
+
+def claim_job(worker, jobs=None):
+    """
+    Lease the next due job (out of `jobs`, default all) to `worker`; returns
+    it, or None if nothing is due.
+    """
+    jobs = RefundJob.objects.all() if jobs is None else jobs
+    now = timezone.now()
+    candidates = jobs.filter(claimable(now)).order_by(
+        'next_attempt_at').values_list('pk', flat=True)[:10]
+    for pk in candidates:
+        claimed = RefundJob.objects.filter(claimable(now), pk=pk).update(
+            status='running', locked_by=worker, locked_until=now + LEASE, updated_at=now)
+        if claimed:
+            return RefundJob.objects.select_related('payment').get(pk=pk)
+    return None
+
+
+def backoff(attempts):
+    delay = min(settings.REFUND_RETRY_BASE_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def finish(job, worker, status, error='', next_attempt_at=None):
+    fields = {
+        'status': status,
+        'attempts': job.attempts,
+        'last_error': error,
+        'locked_until': None,
+        'updated_at': timezone.now(),
+    }
+    if next_attempt_at:
+        fields['next_attempt_at'] = next_attempt_at
+    RefundJob.objects.filter(pk=job.pk, locked_by=worker).update(**fields)
+    return status
+
+
+def idempotency_key(job):
+    return f'refund_job_{job.pk}'
+
+
+def already_refunded(payment, client):
+    """
+    Whether the gateway already holds a processed refund for the payment; a
+    failed lookup counts as no, since the idempotency key still guards the call.
+    """
+    try:
+        return payment.sync_refund_status(client)
+    except Exception as e:
+        logger.warning('Refund lookup for payment %s failed: %s', payment.pk, e)
+        return False
+
+
+def process_job(job, client, worker):
+    """
+    Make one refund attempt. Returns 'succeeded', 'queued' (retry later) or 'failed'.
+    """
+    payment = job.payment
+    if payment.payment_status == 'refunded':
+        return finish(job, worker, 'succeeded')
+    if payment.payment_status != 'completed':
+        return finish(job, worker, 'failed', f'Payment is {payment.payment_status}, not completed.')
+
+    # Recorded before the call, so a worker that takes over an expired lease
+    # knows an earlier attempt may have reached the gateway
+    job.attempts += 1
+    RefundJob.objects.filter(pk=job.pk, locked_by=worker).update(attempts=job.attempts)
+    if job.attempts > 1 and already_refunded(payment, client):
+        return finish(job, worker, 'succeeded')
+    try:
+        refunded = payment.refund_payment(client, idempotency_key(job))
+    except BadRequestError as e:
+        # Rejected by the gateway (e.g. already refunded): retrying cannot help
+        if already_refunded(payment, client):
+            return finish(job, worker, 'succeeded')
+        return finish(job, worker, 'failed', str(e))
+    except Exception as e:
+        logger.warning('Refund attempt %s for payment %s failed: %s', job.attempts, payment.pk, e)
+        if job.attempts >= settings.REFUND_MAX_ATTEMPTS:
+            return finish(job, worker, 'failed', str(e))
+        return finish(job, worker, 'queued', str(e), timezone.now() + backoff(job.attempts))
+
+    if refunded:
+        return finish(job, worker, 'succeeded')
+    # The gateway accepted the call but did not process the refund; retrying
+    # could refund twice, so leave it for manual follow-up.
+    return finish(job, worker, 'failed', 'Gateway did not process the refund.')
+
+
+def run_workers(workers=4, once=False, poll_interval=5.0, client_factory=get_gateway_client, jobs=None):
+    """
+    Run a pool of worker threads over `jobs` (default all). With once=True
+    each thread exits as soon as no job is due; otherwise they poll forever.
+    Returns a Counter of outcomes.
+    """
+    def work():
+        client = client_factory()
+        worker = worker_name()
+        outcomes = Counter()
+        try:
+            while True:
+                job = claim_job(worker, jobs)
+                if job is None:
+                    if once:
+                        return outcomes
+                    time.sleep(poll_interval)
+                    continue
+                outcomes[process_job(job, client, worker)] += 1
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = [pool.submit(work) for _ in range(workers)]
+        return sum((result.result() for result in results), Counter())
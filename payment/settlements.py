@@ -0,0 +1,215 @@
+"""
+Streaming import of gateway settlement files.
+
+Settlement exports can run to millions of rows, so the file is never loaded
+whole: CSV goes through csv.DictReader, newline-delimited JSON is read line by
+line and a top-level JSON array is decoded one element at a time. Rows are
+matched to Payment in batches, with one IN lookup on razorpay_payment_id per
+batch (plus one on razorpay_order_id for rows that did not match), and rows
+that disagree with our records are written to SettlementDiscrepancy. Memory
+use is bounded by the batch size, not the file size.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from pathlib import Path
+
+from django.utils import timezone
+
+from payment.models import Payment, SettlementImport, SettlementDiscrepancy
+
+BATCH_SIZE = 2000
+READ_SIZE = 64 * 1024
+
+PAYMENT_ID_FIELDS = ('razorpay_payment_id', 'payment_id', 'entity_id')
+ORDER_ID_FIELDS = ('razorpay_order_id', 'order_id')
+AMOUNT_FIELDS = ('amount', 'credit')
+SETTLED_STATUSES = ('completed', 'refunded')
+
+
+def iter_json_array(handle):
+    """
+    Yield the elements of a top-level JSON array without reading it all.
+    """
+    decoder = json.JSONDecoder()
+    buffer = handle.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('Expected a JSON array.')
+    position = 1
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # Element cut off at the end of the buffer: read more and retry
+            if eof:
+                raise
+            chunk = handle.read(READ_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item
+        position = end
+
+
+def read_rows(path):
+    """
+    Yield (line_number, row) for each record in a CSV, JSON array or
+    newline-delimited JSON file. row is None for lines that cannot be parsed.
+    """
+    path = Path(path)
+    with path.open(newline='', encoding='utf-8-sig') as handle:
+        if path.suffix.lower() == '.csv':
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, row
+            return
+
+        first = handle.read(1)
+        while first.isspace():
+            first = handle.read(1)
+        handle.seek(0)
+        if first == '[':
+            for number, row in enumerate(iter_json_array(handle), start=1):
+                yield number, row if isinstance(row, dict) else None
+            return
+
+        for number, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, row if isinstance(row, dict) else None
+
+
+def first_value(row, fields):
+    for field in fields:
+        value = row.get(field)
+        if value not in (None, ''):
+            return str(value).strip()
+    return ''
+
+
+def parse_row(row, amount_in_paise=False):
+    """
+    Pull the payment id, order id and amount out of a settlement row. Returns
+    None for rows that are not payments (refunds, adjustments, transfers).
+    """
+    if str(row.get('type') or 'payment').lower() != 'payment':
+        return None
+    payment_id = first_value(row, PAYMENT_ID_FIELDS)
+    if payment_id and not payment_id.startswith('pay_'):
+        payment_id = ''
+    amount = first_value(row, AMOUNT_FIELDS)
+    try:
+        amount = Decimal(amount) if amount else None
+    except InvalidOperation:
+        amount = None
+    if amount is not None and amount_in_paise:
+        amount /= 100
+    return {
+        'payment_id': payment_id,
+        'order_id': first_value(row, ORDER_ID_FIELDS),
+        'amount': amount,
+    }
+
+
+def lookup_payments(field, values):
+    """
+    Return {value: (id, payment_id, order_id, amount, status)} for one IN query.
+    """
+    if not values:
+        return {}
+    rows = Payment.objects.filter(**{f'{field}__in': values}).values_list(
+        'id', 'razorpay_payment_id', 'razorpay_order_id', 'amount', 'payment_status')
+    index = 1 if field == 'razorpay_payment_id' else 2
+    return {row[index]: row for row in rows}
+
+
+def match_batch(settlement_import, batch):
+    """
+    Match one batch of (line_number, parsed_row) pairs and record discrepancies.
+    Returns the number of rows matched to a payment.
+    """
+    by_payment_id = lookup_payments(
+        'razorpay_payment_id', {row['payment_id'] for _, row in batch if row['payment_id']})
+    by_order_id = lookup_payments(
+        'razorpay_order_id',
+        {row['order_id'] for _, row in batch if row['order_id'] and row['payment_id'] not in by_payment_id})
+
+    discrepancies = []
+    matched = 0
+    for line_number, row in batch:
+        payment = by_payment_id.get(row['payment_id']) or by_order_id.get(row['order_id'])
+        found = {
+            'settlement_import': settlement_import,
+            'line_number': line_number,
+            'razorpay_payment_id': row['payment_id'],
+            'razorpay_order_id': row['order_id'],
+            'settled_amount': row['amount'],
+        }
+        if payment is None:
+            discrepancies.append(SettlementDiscrepancy(kind='missing', **found))
+            continue
+
+        matched += 1
+        payment_pk, _, order_id, amount, status = payment
+        found.update(payment_id=payment_pk, recorded_amount=amount)
+        if row['order_id'] and order_id and row['order_id'] != order_id:
+            discrepancies.append(SettlementDiscrepancy(
+                kind='order', details=f'Payment is for order {order_id}', **found))
+        if row['amount'] is not None and row['amount'] != amount:
+            discrepancies.append(SettlementDiscrepancy(kind='amount', **found))
+        if status not in SETTLED_STATUSES:
+            discrepancies.append(SettlementDiscrepancy(
+                kind='status', details=f'Payment is {status}', **found))
+
+    SettlementDiscrepancy.objects.bulk_create(discrepancies)
+    settlement_import.discrepancies += len(discrepancies)
+    return matched
+
+
+def import_settlement(path, batch_size=BATCH_SIZE, amount_in_paise=False):
+    """
+    Stream a settlement file, match its payment rows and record discrepancies.
+    Returns the SettlementImport with the run's totals.
+    """
+    settlement_import = SettlementImport.objects.create(file_name=Path(path).name)
+    rows = read_rows(path)
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+        batch, invalid = [], []
+        for line_number, row in chunk:
+            parsed = parse_row(row, amount_in_paise) if row is not None else None
+            if row is None:
+                invalid.append(SettlementDiscrepancy(
+                    settlement_import=settlement_import, line_number=line_number,
+                    kind='invalid', details='Unparseable row'))
+            elif parsed is None:
+                settlement_import.skipped += 1
+            elif not (parsed['payment_id'] or parsed['order_id']):
+                invalid.append(SettlementDiscrepancy(
+                    settlement_import=settlement_import, line_number=line_number,
+                    kind='invalid', details='No payment or order id'))
+            else:
+                batch.append((line_number, parsed))
+
+        settlement_import.rows += len(chunk)
+        SettlementDiscrepancy.objects.bulk_create(invalid)
+        settlement_import.discrepancies += len(invalid)
+        if batch:
+            settlement_import.matched += match_batch(settlement_import, batch)
+
+    settlement_import.finished_at = timezone.now()
+    settlement_import.save()
+    return settlement_import
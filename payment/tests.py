@@ -1,3 +1,584 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from razorpay.errors import BadRequestError, ServerError  # type: ignore
+
+from accounts.models import CustomUser
+from booking.models import Booking
+from core.metrics import registry
+from core.models import JobLock
+from core.querycount import QueryRecorder
+from payment.archive import archive_gateway_responses, storage_report
+from payment.fake_gateway import FakeGatewayClient, sign_payment
+from payment.models import Payment, RefundJob, SettlementImport, WebhookEvent
+from payment.reconciliation import reconcile_payments
+from payment.refunds import LEASE, MAX_BACKOFF_SECONDS, backoff, claim_job, process_job
+from payment.settlements import import_settlement
+from payment.webhooks import process_pending_events, record_event
+from properties.models import Property
+
+
+def captured_event(order_id, payment_id='pay_1', event='payment.captured'):
+    return json.dumps({
+        'event': event,
+        'payload': {'payment': {'entity': {
+            'id': payment_id, 'order_id': order_id, 'method': 'upi', 'amount': 300000}}},
+    })
+
+
+def counter_value(name, *labels):
+    return registry.collect().get(name, {}).get(labels, 0)
+
+
+class PaymentTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='guest', email='guest@example.com', password='secret')
+        owner = CustomUser.objects.create_user(
+            username='owner', email='owner@example.com', password='secret')
+        cls.property = Property.objects.create(
+            owner=owner, title='Sea View', city='Goa', state='Goa', zip_code='403001',
+            price_per_night=1000, max_guests=4)
+
+    def make_booking(self, order_id, status='pending'):
+        check_in = timezone.now() + timedelta(days=10)
+        return Booking.objects.create(
+            user=self.user, property=self.property, check_in=check_in,
+            check_out=check_in + timedelta(days=3), guests=2, status=status,
+            razorpay_order_id=order_id)
+
+    def make_payment(self, status='completed', order_id='order_1'):
+        booking = self.make_booking(order_id, status='confirmed')
+        return Payment.objects.create(
+            user=self.user, booking=booking, amount=booking.total_cost, payment_method='upi',
+            payment_status=status, razorpay_order_id=order_id, razorpay_payment_id=f'pay_{order_id}')
+
+
+class ProcessWebhookEventsTests(PaymentTestCase):
+    def test_captured_event_confirms_booking_and_counts_it(self):
+        booking = self.make_booking('order_1')
+        record_event(captured_event('order_1'), event_id='evt_1')
+        before = counter_value('homerent_bookings_total', 'confirmed')
+
+        totals = process_pending_events()
+
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'confirmed')
+        payment = booking.payment_set.get()
+        self.assertEqual(payment.payment_status, 'completed')
+        self.assertEqual(payment.amount, Decimal('3000.00'))
+        self.assertEqual(totals, {'events': 1, 'changes': 2})
+        self.assertEqual(counter_value('homerent_bookings_total', 'confirmed'), before + 1)
+        self.assertEqual(WebhookEvent.objects.get().status, 'processed')
+
+
+class RecordEventTests(PaymentTestCase):
+    def test_duplicate_delivery_is_stored_once(self):
+        record_event(captured_event('order_1'), event_id='evt_1')
+        record_event(captured_event('order_1'), event_id='evt_1')
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+    def test_body_hash_identifies_events_without_an_id(self):
+        record_event(captured_event('order_1'))
+        record_event(captured_event('order_1'))
+        record_event(captured_event('order_2'))
+        self.assertEqual(WebhookEvent.objects.count(), 2)
+
+
+class ApplyWebhookEventsTests(PaymentTestCase):
+    def test_failed_event_marks_pending_payment_failed(self):
+        booking = self.make_booking('order_1')
+        payment = Payment.objects.create(
+            user=self.user, booking=booking, amount=booking.total_cost,
+            payment_method='upi', razorpay_order_id='order_1')
+        record_event(captured_event('order_1', event='payment.failed'), event_id='evt_1')
+
+        process_pending_events()
+
+        payment.refresh_from_db()
+        booking.refresh_from_db()
+        self.assertEqual(payment.payment_status, 'failed')
+        self.assertEqual(booking.status, 'pending')
+
+    def test_capture_wins_over_failure_in_the_same_batch(self):
+        booking = self.make_booking('order_1')
+        Payment.objects.create(
+            user=self.user, booking=booking, amount=booking.total_cost,
+            payment_method='upi', razorpay_order_id='order_1')
+        record_event(captured_event('order_1', event='payment.failed'), event_id='evt_1')
+        record_event(captured_event('order_1', payment_id='pay_2'), event_id='evt_2')
+
+        process_pending_events()
+
+        payment = booking.payment_set.get()
+        self.assertEqual(payment.payment_status, 'completed')
+        self.assertEqual(payment.razorpay_payment_id, 'pay_2')
+
+    def test_completed_payment_is_left_alone(self):
+        booking = self.make_booking('order_1', status='confirmed')
+        Payment.objects.create(
+            user=self.user, booking=booking, amount=booking.total_cost, payment_method='upi',
+            payment_status='completed', razorpay_order_id='order_1', razorpay_payment_id='pay_1')
+        record_event(captured_event('order_1', event='payment.failed'), event_id='evt_1')
+
+        self.assertEqual(process_pending_events(), {'events': 1, 'changes': 0})
+        self.assertEqual(booking.payment_set.get().payment_status, 'completed')
+
+    def test_unhandled_and_unmatched_events(self):
+        record_event(json.dumps({'event': 'refund.created', 'payload': {}}), event_id='evt_1')
+        record_event(captured_event('order_unknown'), event_id='evt_2')
+
+        self.assertEqual(process_pending_events(), {'events': 2, 'changes': 0})
+        self.assertEqual(
+            dict(WebhookEvent.objects.values_list('event_id', 'status')),
+            {'evt_1': 'ignored', 'evt_2': 'processed'})
+
+    def test_batch_resolves_orders_with_one_query_each(self):
+        for number in range(5):
+            self.make_booking(f'order_{number}')
+            record_event(captured_event(f'order_{number}', payment_id=f'pay_{number}'),
+                         event_id=f'evt_{number}')
+
+        # Fetch events, payments, bookings; insert payments; confirm bookings;
+        # look for cancelled holds; mark processed; mark ignored; then the
+        # empty fetch that ends the loop
+        with QueryRecorder() as recorder:
+            totals = process_pending_events()
+
+        self.assertEqual(len(recorder.queries), 9)
+
+        self.assertEqual(totals, {'events': 5, 'changes': 10})
+        self.assertEqual(Booking.objects.filter(status='confirmed').count(), 5)
+
+    def test_batches_are_applied_oldest_first(self):
+        for number in range(5):
+            self.make_booking(f'order_{number}')
+            record_event(captured_event(f'order_{number}', payment_id=f'pay_{number}'),
+                         event_id=f'evt_{number}')
+
+        self.assertEqual(process_pending_events(batch_size=2), {'events': 5, 'changes': 10})
+        self.assertFalse(WebhookEvent.objects.filter(status='pending').exists())
+
+    def test_failed_batch_is_rolled_back_and_retried(self):
+        booking = self.make_booking('order_1')
+        record_event(captured_event('order_1'), event_id='evt_1')
+
+        with mock.patch('payment.webhooks.invalidate_availability_cache', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                process_pending_events()
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'pending')
+        self.assertFalse(booking.payment_set.exists())
+        self.assertEqual(WebhookEvent.objects.get().status, 'pending')
+
+        self.assertEqual(process_pending_events(), {'events': 1, 'changes': 2})
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'confirmed')
+        self.assertEqual(WebhookEvent.objects.get().status, 'processed')
+
+    def test_capture_after_the_hold_expired_queues_a_refund(self):
+        booking = self.make_booking('order_1', status='cancelled')
+        record_event(captured_event('order_1'), event_id='evt_1')
+
+        process_pending_events()
+
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'cancelled')
+        payment = booking.payment_set.get()
+        self.assertEqual(payment.payment_status, 'completed')
+        self.assertEqual(payment.refund_job.status, 'queued')
+
+
+class PaymentConfirmationTests(PaymentTestCase):
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def confirm(self, order_id, payment_id='pay_1'):
+        return self.client.post(reverse('payments:payment-confirmation'), {
+            'razorpay_order_id': order_id,
+            'razorpay_payment_id': payment_id,
+            'razorpay_signature': sign_payment(order_id, payment_id, settings.RAZORPAY_SECRET),
+        })
+
+    def test_pending_booking_is_confirmed_once(self):
+        booking = self.make_booking('order_1')
+        before = counter_value('homerent_bookings_total', 'confirmed')
+
+        self.confirm('order_1')
+        self.confirm('order_1')
+
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'confirmed')
+        self.assertFalse(RefundJob.objects.exists())
+        self.assertEqual(counter_value('homerent_bookings_total', 'confirmed'), before + 1)
+
+    def test_expired_then_paid_is_refunded_not_confirmed(self):
+        booking = self.make_booking('order_1', status='cancelled')
+        before = counter_value('homerent_bookings_total', 'confirmed')
+
+        response = self.confirm('order_1')
+
+        self.assertRedirects(response, reverse('booking:booking-list'), fetch_redirect_response=False)
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'cancelled')
+        payment = booking.payment_set.get()
+        self.assertEqual((payment.payment_status, payment.razorpay_payment_id), ('completed', 'pay_1'))
+        self.assertEqual(payment.refund_job.status, 'queued')
+        self.assertEqual(counter_value('homerent_bookings_total', 'confirmed'), before)
+
+    def test_webhook_after_the_confirmation_view_queues_one_refund(self):
+        self.make_booking('order_1', status='cancelled')
+        self.confirm('order_1')
+        record_event(captured_event('order_1'), event_id='evt_1')
+
+        process_pending_events()
+
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(RefundJob.objects.count(), 1)
+
+
+@override_settings(REFUND_MAX_ATTEMPTS=3, REFUND_RETRY_BASE_SECONDS=30)
+class RefundQueueTests(PaymentTestCase):
+    def setUp(self):
+        self.job = RefundJob.enqueue(self.make_payment())
+
+    def test_enqueue_is_idempotent(self):
+        self.assertEqual(RefundJob.enqueue(self.job.payment), self.job)
+        self.assertEqual(RefundJob.objects.count(), 1)
+
+    def test_claim_takes_a_lease(self):
+        job = claim_job('worker-a')
+        self.assertEqual(job, self.job)
+        self.assertEqual((job.status, job.locked_by), ('running', 'worker-a'))
+        self.assertAlmostEqual(job.locked_until, timezone.now() + LEASE, delta=timedelta(seconds=5))
+        self.assertIsNone(claim_job('worker-b'))
+
+    def test_expired_lease_is_reclaimed(self):
+        stale = claim_job('worker-a')
+        RefundJob.objects.filter(pk=stale.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+        job = claim_job('worker-b')
+        self.assertEqual(job.locked_by, 'worker-b')
+        # The worker that lost its lease can no longer record an outcome
+        with self.assertLogs('payment.refunds', 'WARNING'):
+            process_job(stale, FakeGatewayClient(failure_rate=1.0), 'worker-a')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), ('running', 'worker-b'))
+
+        self.assertEqual(process_job(job, FakeGatewayClient(), 'worker-b'), 'succeeded')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'succeeded')
+        self.assertIsNone(job.locked_until)
+
+    def test_successful_refund(self):
+        self.assertEqual(process_job(claim_job('worker'), FakeGatewayClient(), 'worker'), 'succeeded')
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.attempts), ('succeeded', 1))
+        self.assertEqual(Payment.objects.get().payment_status, 'refunded')
+
+    def test_transient_failure_is_retried_after_backoff(self):
+        client = FakeGatewayClient(failure_rate=1.0)
+        before = timezone.now()
+        with self.assertLogs('payment.refunds', 'WARNING'):
+            self.assertEqual(process_job(claim_job('worker'), client, 'worker'), 'queued')
+
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.attempts), ('queued', 1))
+        self.assertIn('Simulated gateway failure', self.job.last_error)
+        self.assertGreaterEqual(self.job.next_attempt_at, before + timedelta(seconds=24))
+        self.assertIsNone(claim_job('worker'))
+
+        RefundJob.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(process_job(claim_job('worker'), FakeGatewayClient(), 'worker'), 'succeeded')
+
+    def test_gives_up_after_max_attempts(self):
+        client = FakeGatewayClient(failure_rate=1.0)
+        outcomes = []
+        with self.assertLogs('payment.refunds', 'WARNING'):
+            for _ in range(3):
+                RefundJob.objects.update(next_attempt_at=timezone.now())
+                outcomes.append(process_job(claim_job('worker'), client, 'worker'))
+
+        self.assertEqual(outcomes, ['queued', 'queued', 'failed'])
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.attempts), ('failed', 3))
+        self.assertIsNone(claim_job('worker'))
+        self.assertEqual(Payment.objects.get().payment_status, 'completed')
+
+    def test_gateway_rejection_is_not_retried(self):
+        client = FakeGatewayClient()
+        with mock.patch.object(client.payment, 'refund', side_effect=BadRequestError('already refunded')):
+            self.assertEqual(process_job(claim_job('worker'), client, 'worker'), 'failed')
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.attempts, 1)
+
+    def lose_response(self, client, error):
+        """
+        Make the next refund call reach the gateway but fail on the way back.
+        """
+        refund = client.payment.refund
+
+        def processed_then_failed(*args, **kwargs):
+            refund(*args, **kwargs)
+            raise error
+
+        return mock.patch.object(client.payment, 'refund', side_effect=processed_then_failed)
+
+    def test_refund_carries_the_job_idempotency_key(self):
+        client = FakeGatewayClient()
+        with mock.patch.object(client.payment, 'refund', wraps=client.payment.refund) as refund:
+            process_job(claim_job('worker'), client, 'worker')
+        key = f'refund_job_{self.job.pk}'
+        self.assertEqual(refund.call_args.args[1]['receipt'], key)
+        self.assertEqual(refund.call_args.kwargs['headers'], {'X-Refund-Idempotency': key})
+
+    def test_retry_after_a_lost_response_does_not_refund_twice(self):
+        client = FakeGatewayClient()
+        with self.lose_response(client, ServerError('timeout')), self.assertLogs('payment.refunds', 'WARNING'):
+            self.assertEqual(process_job(claim_job('worker'), client, 'worker'), 'queued')
+        self.assertEqual(Payment.objects.get().payment_status, 'completed')
+
+        RefundJob.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(process_job(claim_job('worker'), client, 'worker'), 'succeeded')
+
+        self.assertEqual(Payment.objects.get().payment_status, 'refunded')
+        self.assertEqual(client.payment.fetch_multiple_refund('pay_order_1')['count'], 1)
+
+    def test_rejection_of_a_refund_already_made_succeeds(self):
+        client = FakeGatewayClient()
+        with self.lose_response(client, BadRequestError('fully refunded already')):
+            self.assertEqual(process_job(claim_job('worker'), client, 'worker'), 'succeeded')
+        self.assertEqual(Payment.objects.get().payment_status, 'refunded')
+
+    def test_takeover_after_an_expired_lease_reuses_the_key(self):
+        client = FakeGatewayClient()
+        stale = claim_job('worker-a')
+        # worker-a records its attempt and calls the gateway, then stalls past its lease
+        with self.lose_response(client, ServerError('timeout')), self.assertLogs('payment.refunds', 'WARNING'):
+            process_job(stale, client, 'worker-a')
+        RefundJob.objects.filter(pk=stale.pk).update(
+            status='running', locked_by='worker-a', locked_until=timezone.now() - timedelta(seconds=1))
+
+        # The lookup is down as well: only the idempotency key prevents a second refund
+        with mock.patch.object(client.payment, 'fetch_multiple_refund', side_effect=ServerError('down')), \
+                self.assertLogs('payment.refunds', 'WARNING'):
+            self.assertEqual(process_job(claim_job('worker-b'), client, 'worker-b'), 'succeeded')
+
+        self.assertEqual(client.payment.fetch_multiple_refund('pay_order_1')['count'], 1)
+
+    def test_payment_state_short_circuits(self):
+        Payment.objects.update(payment_status='refunded')
+        self.assertEqual(process_job(claim_job('worker'), FakeGatewayClient(), 'worker'), 'succeeded')
+
+        other = RefundJob.enqueue(self.make_payment(status='pending', order_id='order_2'))
+        self.assertEqual(process_job(claim_job('worker'), FakeGatewayClient(), 'worker'), 'failed')
+        other.refresh_from_db()
+        self.assertEqual((other.attempts, other.last_error), (0, 'Payment is pending, not completed.'))
+
+    def test_backoff_schedule(self):
+        with mock.patch('payment.refunds.random.uniform', return_value=1.0):
+            delays = [backoff(attempt).total_seconds() for attempt in range(1, 6)]
+            self.assertEqual(delays, [30, 60, 120, 240, 480])
+            self.assertEqual(backoff(30).total_seconds(), MAX_BACKOFF_SECONDS)
+        for _ in range(20):
+            self.assertTrue(24 <= backoff(1).total_seconds() <= 36)
+
+
+class ReconcilePaymentsTests(PaymentTestCase):
+    def make(self, order_id, booking_status, payment_status='pending'):
+        booking = self.make_booking(order_id, status=booking_status)
+        return Payment.objects.create(
+            user=self.user, booking=booking, amount=booking.total_cost, payment_method='upi',
+            payment_status=payment_status, razorpay_order_id=order_id)
+
+    def statuses(self):
+        return dict(Payment.objects.values_list('razorpay_order_id', 'payment_status'))
+
+    def setUp(self):
+        self.make('order_confirmed', 'confirmed')
+        self.make('order_completed', 'completed')
+        self.make('order_cancelled', 'cancelled')
+        self.make('order_pending', 'pending')
+        self.make('order_paid', 'cancelled', payment_status='completed')
+        self.expected = {
+            'order_confirmed': 'completed', 'order_completed': 'completed',
+            'order_cancelled': 'failed', 'order_pending': 'pending', 'order_paid': 'completed',
+        }
+
+    def test_rules_are_applied_across_chunks(self):
+        # A gap in the ids leaves some chunks empty
+        Payment.objects.filter(razorpay_order_id='order_completed').update(id=1000)
+
+        summary = reconcile_payments(chunk_size=2)
+
+        self.assertEqual(summary, {'pending -> completed': 2, 'pending -> failed': 1})
+        self.assertEqual(self.statuses(), self.expected)
+        self.assertEqual(sum(reconcile_payments().values()), 0)
+
+    def test_dry_run_only_counts(self):
+        before = self.statuses()
+        self.assertEqual(
+            reconcile_payments(dry_run=True), {'pending -> completed': 2, 'pending -> failed': 1})
+        self.assertEqual(self.statuses(), before)
+
+    def test_empty_table(self):
+        Payment.objects.all().delete()
+        self.assertEqual(reconcile_payments(), {'pending -> completed': 0, 'pending -> failed': 0})
+
+    def test_command_reports_and_respects_the_lock(self):
+        out = io.StringIO()
+        call_command('reconcile_payments', '--dry-run', stdout=out)
+        self.assertIn('Would update 3 payments.', out.getvalue())
+
+        JobLock.acquire('reconcile_payments', timedelta(minutes=10))
+        out = io.StringIO()
+        call_command('reconcile_payments', stdout=out)
+        self.assertIn('Another run is in progress; skipping.', out.getvalue())
+        self.assertEqual(Payment.objects.filter(payment_status='pending').count(), 4)
+
+
+class ArchiveGatewayResponsesTests(PaymentTestCase):
+    response = {'id': 'pay_1', 'entity': 'payment', 'notes': {'booking': 'x' * 500}}
+
+    def make(self, order_id, status='completed', age_days=60):
+        payment = self.make_payment(status=status, order_id=order_id)
+        Payment.objects.filter(pk=payment.pk).update(
+            payment_gateway_response=self.response,
+            updated_at=timezone.now() - timedelta(days=age_days))
+        return payment
+
+    def setUp(self):
+        self.old = self.make('order_old')
+        self.make('order_old_refunded', status='refunded')
+        self.make('order_recent', age_days=1)
+        self.make('order_pending', status='pending')
+        RefundJob.enqueue(self.make('order_refunding'))
+
+    def inline(self):
+        return set(Payment.objects.filter(
+            payment_gateway_response__isnull=False).values_list('razorpay_order_id', flat=True))
+
+    def test_settled_old_payloads_are_archived(self):
+        totals = archive_gateway_responses(days=30, batch_size=1)
+
+        self.assertEqual(totals['payments'], 2)
+        self.assertLess(totals['bytes_after'], totals['bytes_before'])
+        self.assertEqual(self.inline(), {'order_recent', 'order_pending', 'order_refunding'})
+        self.assertEqual(Payment.objects.get(pk=self.old.pk).gateway_response, self.response)
+        self.assertEqual(storage_report()['archived_count'], 2)
+        self.assertEqual(archive_gateway_responses(days=30)['payments'], 0)
+
+    def test_dry_run_writes_nothing(self):
+        self.assertEqual(archive_gateway_responses(days=30, dry_run=True)['payments'], 2)
+        self.assertEqual(len(self.inline()), 5)
+        self.assertEqual(storage_report()['archived_count'], 0)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('archive_gateway_responses', '--days', '30', stdout=out)
+        self.assertIn('Archived 2 payloads', out.getvalue())
+
+
+class SettlementImportTests(PaymentTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.directory = Path(directory)
+        self.payment = self.make_payment()
+
+    def write(self, name, text):
+        path = self.directory / name
+        path.write_text(text, encoding='utf-8')
+        return path
+
+    def rows(self, count):
+        return [{'entity_id': f'pay_unknown{number}', 'amount': '10.00'} for number in range(count)]
+
+    def kinds(self, result):
+        return list(result.discrepancy_rows.values_list('line_number', 'kind'))
+
+    def test_csv_rows_are_matched_and_checked(self):
+        path = self.write('settlement.csv', (
+            'type,entity_id,order_id,amount\n'
+            'payment,pay_order_1,order_1,3000.00\n'
+            'refund,rfnd_1,,3000.00\n'
+            'payment,pay_missing,,10.00\n'
+            'payment,,order_1,2999.00\n'
+            'payment,,,5.00\n'))
+
+        result = import_settlement(path)
+
+        self.assertEqual((result.rows, result.matched, result.skipped, result.discrepancies), (5, 2, 1, 3))
+        self.assertEqual(self.kinds(result), [(4, 'missing'), (5, 'amount'), (6, 'invalid')])
+        self.assertIsNotNone(result.finished_at)
+
+    def test_amounts_in_paise(self):
+        path = self.write('settlement.ndjson', '{"payment_id": "pay_order_1", "amount": 300000}\n')
+        self.assertEqual(import_settlement(path, amount_in_paise=True).discrepancies, 0)
+        self.assertEqual(import_settlement(path).discrepancies, 1)
+
+    def test_status_and_order_mismatches(self):
+        Payment.objects.update(payment_status='failed')
+        path = self.write('settlement.json', json.dumps([
+            {'entity_id': 'pay_order_1', 'order_id': 'order_other', 'amount': '3000.00'}]))
+
+        result = import_settlement(path)
+
+        self.assertEqual(result.matched, 1)
+        self.assertEqual(sorted(kind for _, kind in self.kinds(result)), ['order', 'status'])
+
+    def test_malformed_line_in_ndjson_is_recorded_and_skipped(self):
+        lines = [json.dumps(row) for row in self.rows(4)]
+        lines.insert(2, '{"entity_id": "pay_cut", "amou')
+        lines.insert(4, '["not", "an", "object"]')
+        result = import_settlement(self.write('settlement.ndjson', '\n'.join(lines) + '\n'))
+
+        self.assertEqual(result.rows, 6)
+        self.assertEqual(
+            [line for line, kind in self.kinds(result) if kind == 'invalid'], [3, 5])
+        self.assertEqual(result.discrepancies, 6)
+
+    def test_malformed_json_array_stops_the_import(self):
+        text = json.dumps(self.rows(3))
+        path = self.write('settlement.json', text[:-1].replace('}, {', '}, {"broken" ', 1) + ']')
+
+        with self.assertRaises(ValueError):
+            import_settlement(path)
+        self.assertIsNone(SettlementImport.objects.get().finished_at)
+
+    def test_array_elements_spanning_read_boundaries(self):
+        rows = self.rows(20) + [{'entity_id': 'pay_order_1', 'note': 'x' * 100, 'amount': '3000.00'}]
+        path = self.write('settlement.json', json.dumps(rows, indent=2))
+
+        with mock.patch('payment.settlements.READ_SIZE', 7):
+            result = import_settlement(path)
+
+        self.assertEqual((result.rows, result.matched, result.discrepancies), (21, 1, 20))
+
+    def test_batches_give_the_same_result_with_one_lookup_each(self):
+        rows = self.rows(5) + [{'entity_id': 'pay_order_1', 'amount': '3000.00'}]
+        path = self.write('settlement.ndjson', '\n'.join(json.dumps(row) for row in rows))
+
+        whole = import_settlement(path)
+        with QueryRecorder() as recorder:
+            batched = import_settlement(path, batch_size=2)
+
+        self.assertEqual(
+            (batched.rows, batched.matched, batched.discrepancies),
+            (whole.rows, whole.matched, whole.discrepancies))
+        self.assertEqual(self.kinds(batched), self.kinds(whole))
+        lookups = [sql for sql in recorder.queries if sql.startswith('SELECT') and 'payment_payment' in sql]
+        # One payment-id lookup per batch of two; no row carries an order id
+        self.assertEqual(len(lookups), 3)
@@ -5,23 +5,29 @@ from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from booking.models import Booking
 from django.conf import settings
-import razorpay # type: ignore
-
-razorpay_client = razorpay.Client(auth=(settings.RAZORPAY_KEY, settings.RAZORPAY_SECRET))
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from django.db import transaction
+from razorpay.errors import SignatureVerificationError  # type: ignore
+from .gateway import get_gateway_client, get_or_create_order
+from .webhooks import record_event, record_late_payment
+from core.metrics import payment_verifications
 
 class PaymentInitiateView(LoginRequiredMixin, View):
     def post(self, request, booking_id):
         booking = get_object_or_404(Booking, id=booking_id, user=request.user)
 
-        order_data = {
-            "amount": int(booking.total_cost * 100),
-            "currency": "INR",
-            "payment_capture": "1",
-        }
+        # Expired holds are cancelled by expire_pending_bookings
+        if booking.status != 'pending':
+            messages.error(request, "This booking can no longer be paid for. Please book again.")
+            return redirect('booking:booking-list')
 
-        order = razorpay_client.order.create(data=order_data)
-        booking.razorpay_order_id = order['id']
-        booking.save()
+        # Reuses the order created for this booking and amount, e.g. on refresh
+        order = get_or_create_order(booking)
+        if booking.razorpay_order_id != order['id']:
+            booking.razorpay_order_id = order['id']
+            booking.save()
 
         context = {
           'order': order, 
@@ -44,15 +50,48 @@ class PaymentConfirmationView(View):
         }
 
         try:
-            razorpay_client.utility.verify_payment_signature(params_dict)
+            get_gateway_client().utility.verify_payment_signature(params_dict)
+            payment_verifications.inc(result='success')
 
-            booking = Booking.objects.get(razorpay_order_id=order_id)
-            booking.status = 'confirmed'
-            booking.save()
+            # Only a pending hold is confirmed: an expired (cancelled) one may
+            # have been booked by someone else since, so its payment is refunded
+            with transaction.atomic():
+                booking = Booking.objects.select_for_update().get(razorpay_order_id=order_id)
+                booking.confirm_booking()
+                if booking.status == 'cancelled':
+                    record_late_payment(booking, payment_id)
+            if booking.status == 'cancelled':
+                messages.error(request, "Your booking hold expired before the payment completed. The payment will be refunded.")
+                return redirect('booking:booking-list')
 
             messages.success(request, "Payment successful! Your booking is confirmed.")
             return redirect('booking:booking-list')
 
+        except SignatureVerificationError:
+            payment_verifications.inc(result='failure')
+            messages.error(request, "Payment verification failed. Please try again.")
+            return redirect('booking:booking-list')
+
         except Exception as e:
             messages.error(request, "Payment verification failed. Please try again.")
             return redirect('booking:booking-list')
+
+
+# Gateway webhook: verify and store the raw event, apply it later in batches
+# (process_payment_webhooks) so the gateway gets its response right away
+@method_decorator(csrf_exempt, name='dispatch')
+class PaymentWebhookView(View):
+    def post(self, request):
+        body = request.body.decode('utf-8')
+        signature = request.headers.get('X-Razorpay-Signature', '')
+
+        if not settings.RAZORPAY_WEBHOOK_SECRET or not signature:
+            return HttpResponseBadRequest('Missing signature')
+        try:
+            get_gateway_client().utility.verify_webhook_signature(
+                body, signature, settings.RAZORPAY_WEBHOOK_SECRET)
+            record_event(body, request.headers.get('X-Razorpay-Event-Id'))
+        except (SignatureVerificationError, ValueError):
+            return HttpResponseBadRequest('Invalid webhook')
+
+        return HttpResponse(status=200)
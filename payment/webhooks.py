@@ -0,0 +1,165 @@
+"""
+Gateway webhook ingestion.
+
+record_event() is called from the webhook endpoint: it stores the verified
+event with INSERT ... ON CONFLICT DO NOTHING on the event id and returns, so
+the request path does no lookups at all. process_pending_events() applies the
+stored events in batches, resolving bookings and payments with one IN query
+each on their indexed razorpay_order_id columns.
+"""
+import hashlib
+import json
+
+from django.db import transaction
+from django.utils import timezone
+
+from booking.availability import invalidate_blocked_ranges
+from booking.models import Booking
+from core.metrics import bookings
+from payment.models import Payment, RefundJob, WebhookEvent
+from properties.search import invalidate_availability_cache
+
+BATCH_SIZE = 500
+
+CAPTURED_EVENTS = ('payment.captured', 'order.paid')
+FAILED_EVENTS = ('payment.failed',)
+
+
+def record_event(body, event_id=None):
+    """
+    Store a verified webhook body; a second delivery of the same event id is
+    silently ignored. Without an event id the body hash is used instead.
+    """
+    payload = json.loads(body)
+    event_id = event_id or hashlib.sha256(body.encode()).hexdigest()
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(event_id=event_id, event_type=payload.get('event', ''), payload=payload)],
+        ignore_conflicts=True,
+    )
+
+
+def payment_entity(event):
+    return event.payload.get('payload', {}).get('payment', {}).get('entity', {})
+
+
+def payment_method(entity):
+    method = entity.get('method')
+    if method == 'card':
+        return 'debit_card' if entity.get('card', {}).get('type') == 'debit' else 'credit_card'
+    if method == 'netbanking':
+        return 'net_banking'
+    return method or 'upi'
+
+
+def record_late_payment(booking, payment_id, entity=None):
+    """
+    Record a payment captured after the booking's hold was cancelled (e.g.
+    expired) and queue its refund; the dates may already be someone else's.
+    """
+    entity = entity or {}
+    payment, created = Payment.objects.get_or_create(
+        razorpay_order_id=booking.razorpay_order_id,
+        defaults={
+            'user_id': booking.user_id, 'booking': booking, 'amount': booking.total_cost,
+            'payment_method': payment_method(entity), 'payment_status': 'completed',
+            'razorpay_payment_id': payment_id, 'payment_gateway_response': entity or None,
+        })
+    if not created and payment.payment_status in ('pending', 'failed'):
+        payment.payment_status = 'completed'
+        payment.razorpay_payment_id = payment_id
+        payment.save()
+    if payment.payment_status == 'completed':
+        RefundJob.enqueue(payment)
+    return payment
+
+
+def apply_events(events, now):
+    """
+    Apply one batch of events; returns the number of events that changed state.
+    """
+    captured, failed = {}, {}
+    for event in events:
+        entity = payment_entity(event)
+        order_id = entity.get('order_id')
+        if not order_id:
+            continue
+        if event.event_type in CAPTURED_EVENTS:
+            captured[order_id] = entity
+        elif event.event_type in FAILED_EVENTS:
+            failed.setdefault(order_id, entity)
+
+    order_ids = set(captured) | set(failed)
+    payments = {p.razorpay_order_id: p for p in Payment.objects.filter(razorpay_order_id__in=order_ids)}
+    bookings_by_order = {b.razorpay_order_id: b for b in Booking.objects.filter(razorpay_order_id__in=order_ids)}
+
+    to_update, to_create = [], []
+    for order_id, entity in captured.items():
+        payment = payments.get(order_id)
+        booking = bookings_by_order.get(order_id)
+        if payment is None and booking is not None:
+            to_create.append(Payment(
+                user_id=booking.user_id, booking=booking, amount=booking.total_cost,
+                payment_method=payment_method(entity), payment_status='completed',
+                razorpay_order_id=order_id, razorpay_payment_id=entity.get('id'),
+                payment_gateway_response=entity))
+        elif payment is not None and payment.payment_status in ('pending', 'failed'):
+            payment.payment_status = 'completed'
+            payment.razorpay_payment_id = entity.get('id')
+            payment.payment_gateway_response = entity
+            payment.updated_at = now
+            to_update.append(payment)
+
+    for order_id, entity in failed.items():
+        payment = payments.get(order_id)
+        if order_id not in captured and payment is not None and payment.payment_status == 'pending':
+            payment.payment_status = 'failed'
+            payment.payment_gateway_response = entity
+            payment.updated_at = now
+            to_update.append(payment)
+
+    Payment.objects.bulk_create(to_create)
+    Payment.objects.bulk_update(
+        to_update, ['payment_status', 'razorpay_payment_id', 'payment_gateway_response', 'updated_at'])
+    confirmed = Booking.objects.filter(
+        razorpay_order_id__in=list(captured), status='pending'
+    ).update(status='confirmed', updated_at=now)
+
+    # Paid too late: the hold was cancelled (expired) before the capture arrived
+    completed = {p.razorpay_order_id: p for p in to_create + to_update if p.payment_status == 'completed'}
+    if completed:
+        late = Booking.objects.filter(
+            razorpay_order_id__in=list(completed), status='cancelled'
+        ).values_list('razorpay_order_id', flat=True)
+        for order_id in late:
+            RefundJob.enqueue(completed[order_id])
+
+    # The bulk update skips the Booking signals; newly held dates must show up
+    if confirmed:
+        bookings.inc(confirmed, event='confirmed')
+        invalidate_availability_cache()
+        for property_id in {b.property_id for order_id, b in bookings_by_order.items() if order_id in captured}:
+            invalidate_blocked_ranges(property_id)
+    return len(to_create) + len(to_update) + confirmed
+
+
+def process_pending_events(batch_size=BATCH_SIZE):
+    """
+    Apply every pending event in batches of `batch_size`, oldest first.
+    Returns a dict with the events processed and the rows they changed.
+    """
+    totals = {'events': 0, 'changes': 0}
+    while True:
+        with transaction.atomic():
+            events = list(WebhookEvent.objects.filter(status='pending').order_by('id')[:batch_size])
+            if not events:
+                return totals
+            now = timezone.now()
+            totals['changes'] += apply_events(events, now)
+
+            handled = CAPTURED_EVENTS + FAILED_EVENTS
+            ids = [event.pk for event in events]
+            WebhookEvent.objects.filter(pk__in=ids, event_type__in=handled).update(
+                status='processed', processed_at=now)
+            WebhookEvent.objects.filter(pk__in=ids).exclude(event_type__in=handled).update(
+                status='ignored', processed_at=now)
+            totals['events'] += len(events)
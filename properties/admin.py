@@ -1,6 +1,7 @@
 from django.contrib import admin
 from properties.models import Property, PropertyImage, Amenity
 from django.utils.html import format_html
+from core.thumbnails import thumbnail_url
 
 # Inline for PropertyImage
 class PropertyImageInline(admin.TabularInline):
@@ -12,7 +13,7 @@ class PropertyImageInline(admin.TabularInline):
     
     def image_preview(self, obj):
         if obj.image:
-            return format_html('<img src="{}" style="width: 50px; height: auto;" />', obj.image.url)
+            return format_html('<img src="{}" style="width: 50px; height: auto;" />', thumbnail_url(obj.image, 320))
         return ""
     image_preview.short_description = 'Image Preview'
 
@@ -33,7 +34,7 @@ class PropertyAdmin(admin.ModelAdmin):
     # Image preview method
     def primary_image_preview(self, obj):
         if obj.primary_image:
-            return format_html('<img src="{}" style="width: 50px; height: auto;" />', obj.primary_image.url)
+            return format_html('<img src="{}" style="width: 50px; height: auto;" />', thumbnail_url(obj.primary_image, 320))
         return ""
     primary_image_preview.short_description = 'Primary Image'
 
@@ -67,6 +68,6 @@ class PropertyImageAdmin(admin.ModelAdmin):
     
     def image_preview(self, obj):
         if obj.image:
-            return format_html('<img src="{}" style="width: 100px; height: auto;" />', obj.image.url)
+            return format_html('<img src="{}" style="width: 100px; height: auto;" />', thumbnail_url(obj.image, 320))
         return ""
     image_preview.short_description = 'Image Preview'
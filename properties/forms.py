@@ -1,12 +1,15 @@
 from django import forms
 from properties.models import Property, PropertyImage, Amenity
-from django.forms import modelformset_factory
+from django.forms import BaseModelFormSet, modelformset_factory
+from core.validators import HeaderImageField, inspect_image, validate_image_upload
+from properties.uploads import parallel
 
 
 class AddPropertyForm(forms.ModelForm):
     class Meta:
         model = Property
         exclude = ['slug', 'created_at', 'updated_at', 'is_deleted', 'owner']
+        field_classes = {'primary_image': HeaderImageField}
         widgets = {
             'amenities': forms.CheckboxSelectMultiple(),  # Ensure amenities is present
             'price_per_night': forms.NumberInput(attrs={'min': 0}),
@@ -34,12 +37,7 @@ class AddPropertyForm(forms.ModelForm):
                 'Maximum number of guests cannot be less than 1.')
         if price_per_night < 0:
             raise forms.ValidationError('Price per night cannot be negative.')
-        if primary_image:
-            if primary_image.size > 5242880:
-                raise forms.ValidationError('Image file too large ( > 5mb ).')
-            if not primary_image.name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
-                raise forms.ValidationError(
-                    'Invalid image format. Supported formats are .jpg, .jpeg, .png, .webp.')
+        validate_image_upload(primary_image)
         return cleaned_data
 
     def __init__(self, *args, **kwargs):
@@ -61,19 +59,25 @@ class PropertyImageForm(forms.ModelForm):
     class Meta:
         model = PropertyImage
         fields = ['image']
+        field_classes = {'image': HeaderImageField}
 
     def clean(self):
         cleaned_data = super().clean()
         image = cleaned_data.get('image')
 
-        if image:
-            if image.size > 5242880:  # 5MB limit
-                raise forms.ValidationError('Image file too large ( > 5mb ).')
-            if not image.name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
-                raise forms.ValidationError('Invalid image format. Supported formats are .jpg, .jpeg, .png, .webp.')
-        
+        validate_image_upload(image)
         return cleaned_data
 
 
+class BasePropertyImageFormSet(BaseModelFormSet):
+    def full_clean(self):
+        # Read every upload's header at once; each form then finds its result cached
+        if self.is_bound:
+            parallel(inspect_image, self.files.values())
+        super().full_clean()
+
+
+# Saved with properties.uploads.save_property_images
 PropertyImageFormSet = modelformset_factory(
-    PropertyImage, fields=('image',), extra=3)
+    PropertyImage, formset=BasePropertyImageFormSet, fields=('image',),
+    field_classes={'image': HeaderImageField}, extra=3, can_delete=True)
@@ -0,0 +1,96 @@
+import random
+import statistics
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.http import QueryDict
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from booking.models import Booking
+from properties.models import Property
+from properties.pagination import ListingPaginator
+from properties.search import PropertySearch
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the check-in/check-out availability search against a large, '
+            'synthetic booking table. All rows are rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--properties', type=int, default=2000)
+        parser.add_argument('--bookings', type=int, default=1000000)
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Timed runs per date window.')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        with transaction.atomic():
+            self.populate(options['properties'], options['bookings'], options['batch_size'])
+            self.run(options['repeat'])
+            transaction.set_rollback(True)
+
+    def populate(self, property_count, booking_count, batch_size):
+        started = time.perf_counter()
+        tag = uuid.uuid4().hex[:8]
+        owner = CustomUser.objects.create(
+            username=f'bench-{tag}', email=f'bench-{tag}@example.com', profile_pic='')
+        Property.objects.bulk_create(
+            [Property(owner=owner, title=f'bench-{tag}-{i}', slug=f'bench-{tag}-{i}',
+                      city='Goa', state='Goa', zip_code='403001', price_per_night=1500,
+                      rooms=2, bathrooms=1, max_guests=4)
+             for i in range(property_count)],
+            batch_size=batch_size)
+        property_ids = list(Property.objects.filter(owner=owner).values_list('id', flat=True))
+
+        today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        statuses = [status for status, _ in Booking.BOOKING_STATUS_CHOICES]
+        created = 0
+        while created < booking_count:
+            size = min(batch_size, booking_count - created)
+            batch = []
+            for _ in range(size):
+                check_in = today + timedelta(days=random.randint(-730, 365))
+                batch.append(Booking(
+                    user=owner, property_id=random.choice(property_ids),
+                    check_in=check_in, check_out=check_in + timedelta(days=random.randint(1, 14)),
+                    total_cost=1500, guests=2, status=random.choice(statuses)))
+            Booking.objects.bulk_create(batch)
+            created += size
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write(
+            f'Inserted {property_count} properties and {booking_count} bookings '
+            f'in {time.perf_counter() - started:.1f}s')
+
+    def run(self, repeat):
+        today = timezone.localdate()
+        windows = [
+            (today + timedelta(days=7), today + timedelta(days=10)),
+            (today + timedelta(days=30), today + timedelta(days=44)),
+            (today + timedelta(days=200), today + timedelta(days=201)),
+        ]
+        for check_in, check_out in windows:
+            params = QueryDict(mutable=True)
+            params['check_in'], params['check_out'] = check_in.isoformat(), check_out.isoformat()
+            search = PropertySearch(params)
+
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                page = ListingPaginator(search.queryset()).get_page(search.normalized_params())
+                timings.append((time.perf_counter() - started) * 1000)
+
+            self.stdout.write(
+                f'{check_in} -> {check_out}: {len(page)} on first page, '
+                f'{page.count}{"" if page.count_is_exact else "+"} found, '
+                f'median {statistics.median(timings):.1f}ms, max {max(timings):.1f}ms')
+
+        self.stdout.write('Query plan:')
+        self.stdout.write(search.queryset()[:40].explain())
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from properties.search_index import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for property listings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of properties indexed per batch.')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        total = backend.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {total} properties with {type(backend).__name__}.'))
@@ -5,6 +5,7 @@ from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.utils.text import slugify
+from core.validators import validate_image_upload
 
 
 class Amenity(models.Model):
@@ -39,6 +40,10 @@ class Property(models.Model):
 
     class Meta:
         ordering = ['-created_at', '-updated_at']
+        indexes = [
+            # Keyset pagination of the listing pages
+            models.Index(fields=['is_available', 'created_at', 'id']),
+        ]
 
     def __str__(self):
         return self.title
@@ -56,12 +61,8 @@ class Property(models.Model):
         if self.price_per_night < 0:
             raise ValidationError(_('Price per night cannot be negative.'))
 
-        if self.primary_image:
-            if self.primary_image.size > 5242880:  # 5MB limit
-                raise ValidationError(_("Image file too large ( > 5mb )."))
-            if not self.primary_image.name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
-                raise ValidationError(
-                    _("Invalid image format. Supported formats are .jpg, .jpeg, .png, .webp."))
+        # Only new uploads are checked (5MB limit, JPEG/PNG/WebP)
+        validate_image_upload(self.primary_image)
 
         super().clean()
 
@@ -82,12 +83,7 @@ class PropertyImage(models.Model):
         return f"Image for {self.property.title}"
 
     def clean(self):
-        if self.image:
-            if self.image.size > 5242880:  # 5MB limit
-                raise ValidationError(_("Image file too large ( > 5mb )."))
-            if not self.image.name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
-                raise ValidationError(
-                    _("Invalid image format. Supported formats are .jpg, .jpeg, .png, .webp."))
+        validate_image_upload(self.image)
 
         super().clean()
 
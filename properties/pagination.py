@@ -0,0 +1,196 @@
+"""
+Pagination for the property listing pages.
+
+The first few pages are addressed by number (?page=N) and counted with a
+bounded COUNT, so no request ever counts the whole table. Past those pages
+the listing switches to keyset pagination on (created_at, id): the links
+carry an opaque, signed ?cursor= token and each page is a single indexed
+range query instead of an ever-growing OFFSET.
+"""
+import math
+from datetime import datetime
+
+from django.core import signing
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+PER_PAGE = 40
+NUMBERED_PAGES = 5
+CURSOR_SALT = 'properties.pagination.cursor'
+ELLIPSIS = '…'
+
+
+def encode_cursor(direction, obj):
+    return signing.dumps(
+        [direction, obj.created_at.isoformat(), obj.pk], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token):
+    """
+    Return (direction, created_at, id) for a cursor token, or None if it is invalid.
+    """
+    try:
+        direction, created_at, pk = signing.loads(token, salt=CURSOR_SALT)
+        if direction not in ('next', 'prev'):
+            return None
+        return direction, datetime.fromisoformat(created_at), int(pk)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+
+class ListingPage:
+    """
+    One page of listing results plus everything the page bar needs.
+    """
+
+    def __init__(self, object_list, count, count_is_exact=True, number=None,
+                 page_links=(), previous_query=None, next_query=None):
+        self.object_list = list(object_list)
+        self.count = count
+        self.count_is_exact = count_is_exact
+        self.number = number
+        self.page_links = list(page_links)
+        self.previous_query = previous_query
+        self.next_query = next_query
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_previous(self):
+        return self.previous_query is not None
+
+    @property
+    def has_next(self):
+        return self.next_query is not None
+
+
+class ListingPaginator:
+    """
+    Paginate a Property queryset from the request's GET parameters.
+
+    With keyset=False (e.g. results ordered by search rank) the queryset's
+    own ordering is kept and classic numbered pages with an elided page bar
+    are used instead.
+    """
+
+    def __init__(self, queryset, per_page=PER_PAGE, numbered_pages=NUMBERED_PAGES, keyset=True):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.numbered_pages = numbered_pages
+        self.keyset = keyset
+
+    def get_page(self, params):
+        self.params = params.copy()
+        self.params.pop('page', None)
+        self.params.pop('cursor', None)
+
+        if not self.keyset:
+            return self.numbered_page(params.get('page'))
+
+        self.queryset = self.queryset.order_by('-created_at', '-id')
+        cursor = decode_cursor(params.get('cursor', ''))
+        if cursor:
+            return self.cursor_page(*cursor)
+        return self.bounded_page(params.get('page'))
+
+    def link(self, **extra):
+        query = self.params.copy()
+        for key, value in extra.items():
+            query[key] = value
+        return query.urlencode()
+
+    def links_for(self, page_range, current=None):
+        return [
+            {'label': num, 'query': None, 'active': False} if num == ELLIPSIS
+            else {'label': num, 'query': self.link(page=num), 'active': num == current}
+            for num in page_range
+        ]
+
+    def numbered_page(self, number):
+        paginator = Paginator(self.queryset, self.per_page)
+        page = paginator.get_page(number)
+        page_range = paginator.get_elided_page_range(page.number, on_each_side=2, on_ends=1)
+        return ListingPage(
+            page.object_list,
+            count=paginator.count,
+            number=page.number,
+            page_links=self.links_for(page_range, page.number),
+            previous_query=self.link(page=page.previous_page_number()) if page.has_previous() else None,
+            next_query=self.link(page=page.next_page_number()) if page.has_next() else None,
+        )
+
+    def bounded_count(self):
+        # Count at most one row past the numbered window; never the whole table.
+        window = self.per_page * self.numbered_pages
+        count = self.queryset[:window + 1].count()
+        return min(count, window), count <= window
+
+    def bounded_page(self, number):
+        count, count_is_exact = self.bounded_count()
+        num_pages = max(1, math.ceil(count / self.per_page))
+        try:
+            number = min(max(int(number), 1), num_pages)
+        except (TypeError, ValueError):
+            number = 1
+
+        start = (number - 1) * self.per_page
+        object_list = list(self.queryset[start:start + self.per_page])
+
+        next_query = None
+        if number < num_pages:
+            next_query = self.link(page=number + 1)
+        elif not count_is_exact and object_list:
+            next_query = self.link(cursor=encode_cursor('next', object_list[-1]))
+
+        return ListingPage(
+            object_list,
+            count=count,
+            count_is_exact=count_is_exact,
+            number=number,
+            page_links=self.page_bar(num_pages, count_is_exact, number),
+            previous_query=self.link(page=number - 1) if number > 1 else None,
+            next_query=next_query,
+        )
+
+    def cursor_page(self, direction, created_at, pk):
+        count, count_is_exact = self.bounded_count()
+        if direction == 'next':
+            rows = self.queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        else:
+            rows = self.queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            ).order_by('created_at', 'id')
+
+        object_list = list(rows[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if direction == 'prev':
+            object_list.reverse()
+
+        previous_query = next_query = None
+        if object_list:
+            if direction == 'next' or has_more:
+                previous_query = self.link(cursor=encode_cursor('prev', object_list[0]))
+            if direction == 'prev' or has_more:
+                next_query = self.link(cursor=encode_cursor('next', object_list[-1]))
+
+        num_pages = max(1, math.ceil(count / self.per_page))
+        return ListingPage(
+            object_list,
+            count=count,
+            count_is_exact=count_is_exact,
+            page_links=self.page_bar(num_pages, count_is_exact),
+            previous_query=previous_query,
+            next_query=next_query,
+        )
+
+    def page_bar(self, num_pages, count_is_exact, current=None):
+        page_range = list(range(1, num_pages + 1))
+        if not count_is_exact:
+            page_range.append(ELLIPSIS)
+        return self.links_for(page_range, current)
@@ -0,0 +1,176 @@
+"""
+Property listing search shared by core.home_properties and properties_list.
+
+Filters are normalized into a stable key and the ids of each result page are
+cached in the 'search' cache (TTL + LRU eviction, see settings.CACHES). A
+Property save or delete bumps the cache generation, so every cached page is
+dropped at once without having to track which searches a property was in.
+Searches with check-in/check-out dates also carry an availability generation
+that booking changes bump, leaving date-less searches cached.
+"""
+import hashlib
+import time
+from datetime import datetime
+
+from django.core.cache import caches
+from django.db.models import Exists, OuterRef
+from django.http import QueryDict
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from booking.models import Booking
+from core.metrics import search_cache
+from properties.models import Property
+from properties.pagination import ListingPage, ListingPaginator
+from properties.search_index import get_search_backend, tokenize
+
+PER_PAGE = 40
+GENERATION_KEY = 'properties:search:generation'
+AVAILABILITY_GENERATION_KEY = 'properties:search:availability-generation'
+INTEGER_FILTERS = ('price_range', 'rooms', 'bathrooms', 'max_guests')
+
+
+def get_cache():
+    return caches['search']
+
+
+def invalidate_search_cache():
+    # A fresh timestamp can never collide with a generation evicted earlier.
+    get_cache().set(GENERATION_KEY, time.time_ns(), None)
+
+
+def invalidate_availability_cache():
+    get_cache().set(AVAILABILITY_GENERATION_KEY, time.time_ns(), None)
+
+
+def parse_positive_int(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value >= 0 else None
+
+
+def parse_stay_dates(check_in, check_out):
+    """
+    Return (check_in, check_out) dates, or (None, None) unless both are valid
+    and check-out is after check-in.
+    """
+    try:
+        check_in, check_out = parse_date(check_in or ''), parse_date(check_out or '')
+    except ValueError:
+        return None, None
+    if not check_in or not check_out or check_out <= check_in:
+        return None, None
+    return check_in, check_out
+
+
+def start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+class PropertySearch:
+    """
+    Filter, paginate and cache the available-property listing.
+    """
+
+    def __init__(self, params):
+        # The tokens are all any backend matches on: a query without any
+        # (e.g. '!!') is the plain listing, keyset pages and cache key included
+        self.query = ' '.join(tokenize(params.get('query', '')))
+        self.filters = {name: parse_positive_int(params.get(name)) for name in INTEGER_FILTERS}
+        self.check_in, self.check_out = parse_stay_dates(
+            params.get('check_in'), params.get('check_out'))
+        self.page_number = params.get('page', '')
+        self.cursor = params.get('cursor', '')
+
+    def normalized_params(self):
+        """
+        The filters as a QueryDict with a canonical form for every value.
+        """
+        params = QueryDict(mutable=True)
+        if self.query:
+            params['query'] = self.query
+        for name in INTEGER_FILTERS:
+            if self.filters[name] is not None:
+                params[name] = self.filters[name]
+        if self.check_in:
+            params['check_in'] = self.check_in.isoformat()
+            params['check_out'] = self.check_out.isoformat()
+        if self.cursor:
+            params['cursor'] = self.cursor
+        elif self.page_number:
+            params['page'] = self.page_number
+        return params
+
+    def cache_key(self):
+        digest = hashlib.sha1(self.normalized_params().urlencode().encode()).hexdigest()
+        generation = get_cache().get_or_set(GENERATION_KEY, time.time_ns, None)
+        if self.check_in:
+            availability = get_cache().get_or_set(AVAILABILITY_GENERATION_KEY, time.time_ns, None)
+            generation = f'{generation}:{availability}'
+        return f'properties:search:{generation}:{digest}'
+
+    def queryset(self):
+        properties = Property.objects.filter(is_available=True)
+        if self.query:
+            properties = get_search_backend().search(properties, self.query)
+        if self.filters['price_range'] is not None:
+            properties = properties.filter(price_per_night__lte=self.filters['price_range'])
+        if self.filters['rooms'] is not None:
+            properties = properties.filter(rooms__gte=self.filters['rooms'])
+        if self.filters['bathrooms'] is not None:
+            properties = properties.filter(bathrooms__gte=self.filters['bathrooms'])
+        if self.filters['max_guests'] is not None:
+            properties = properties.filter(max_guests__gte=self.filters['max_guests'])
+        if self.check_in:
+            properties = properties.filter(~Exists(self.overlapping_bookings()))
+        return properties
+
+    def overlapping_bookings(self):
+        """
+        Active bookings of the outer property that overlap the requested stay;
+        answered from the (property, status, check_in, check_out) index.
+        """
+        return Booking.objects.filter(
+            property=OuterRef('pk'),
+            status__in=Booking.ACTIVE_STATUSES,
+            check_in__lt=start_of_day(self.check_out),
+            check_out__gt=start_of_day(self.check_in),
+        )
+
+    def get_page(self):
+        cache = get_cache()
+        key = self.cache_key()
+        cached = cache.get(key)
+        search_cache.inc(result='miss' if cached is None else 'hit')
+        if cached is not None:
+            ids = cached.pop('ids')
+            in_bulk = Property.objects.in_bulk(ids)
+            return ListingPage([in_bulk[pk] for pk in ids if pk in in_bulk], **cached)
+
+        # Ranked search results keep their order; plain browsing uses keyset pages
+        paginator = ListingPaginator(self.queryset(), PER_PAGE, keyset=not self.query)
+        page = paginator.get_page(self.normalized_params())
+        cache.set(key, {
+            'ids': [obj.pk for obj in page],
+            'count': page.count,
+            'count_is_exact': page.count_is_exact,
+            'number': page.number,
+            'page_links': page.page_links,
+            'previous_query': page.previous_query,
+            'next_query': page.next_query,
+        })
+        return page
+
+    def context(self):
+        """
+        Template context: the page plus the filter values to re-fill the form.
+        """
+        context = {'properties': self.get_page(), 'query': self.query}
+        for name in INTEGER_FILTERS:
+            value = self.filters[name]
+            context[name] = '' if value is None else str(value)
+        context['check_in'] = self.check_in.isoformat() if self.check_in else ''
+        context['check_out'] = self.check_out.isoformat() if self.check_out else ''
+        return context
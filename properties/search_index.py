@@ -0,0 +1,192 @@
+"""
+Full-text index over Property title, city and state.
+
+The index lives in a shadow table that is kept in sync by the signals in
+properties.signals and can be rebuilt with the rebuild_search_index
+command. SQLite uses an FTS5 virtual table, PostgreSQL a tsvector column
+with a GIN index; any other database falls back to plain icontains lookups.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+INDEX_TABLE = 'properties_property_fts'
+PROPERTY_TABLE = 'properties_property'
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(query):
+    """
+    Split a free-text query into lowercase word tokens.
+    """
+    return TOKEN_RE.findall(query.lower())
+
+
+class LikeSearchBackend:
+    """
+    Fallback backend: no index, substring match on each column.
+    """
+
+    def ensure_index(self):
+        pass
+
+    def clear(self):
+        pass
+
+    def index_properties(self, properties):
+        pass
+
+    def remove_properties(self, property_ids):
+        pass
+
+    def rebuild(self, batch_size=500):
+        from properties.models import Property
+        return Property.objects.count()
+
+    def search(self, queryset, query):
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(city__icontains=query) |
+            Q(state__icontains=query)
+        )
+
+
+class SQLiteFTSBackend(LikeSearchBackend):
+    """
+    FTS5 virtual table keyed by the property id (the FTS rowid).
+    """
+
+    def ensure_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5("
+                "title, city, state, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {INDEX_TABLE}")
+
+    def index_properties(self, properties):
+        rows = [(p.pk, p.title, p.city, p.state) for p in properties]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {INDEX_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {INDEX_TABLE} (rowid, title, city, state) VALUES (%s, %s, %s, %s)", rows)
+
+    def remove_properties(self, property_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {INDEX_TABLE} WHERE rowid = %s", [(pk,) for pk in property_ids])
+
+    def rebuild(self, batch_size=500):
+        from properties.models import Property
+
+        properties = Property.objects.only('id', 'title', 'city', 'state').order_by('pk')
+        total = 0
+        with transaction.atomic():
+            self.ensure_index()
+            self.clear()
+            batch = []
+            for property_instance in properties.iterator(chunk_size=batch_size):
+                batch.append(property_instance)
+                if len(batch) >= batch_size:
+                    self.index_properties(batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                self.index_properties(batch)
+                total += len(batch)
+        return total
+
+    def match_expression(self, query):
+        # Every token must match, as a prefix so "go" still finds "Goa".
+        return ' '.join(f'"{token}"*' for token in tokenize(query))
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return super().search(queryset, query)
+
+        # Title hits weigh more than location hits; bm25() is lower-is-better.
+        rank = RawSQL(
+            f"SELECT bm25({INDEX_TABLE}, 4.0, 2.0, 1.0) FROM {INDEX_TABLE} "
+            f"WHERE {INDEX_TABLE} MATCH %s AND rowid = {PROPERTY_TABLE}.id",
+            (match,)
+        )
+        matches = RawSQL(
+            f"SELECT rowid FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s", (match,))
+        return queryset.filter(pk__in=matches).annotate(
+            search_rank=rank).order_by('search_rank', '-created_at', '-id')
+
+
+class PostgresFTSBackend(SQLiteFTSBackend):
+    """
+    Shadow table holding a weighted tsvector per property, GIN indexed.
+    """
+
+    def ensure_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {INDEX_TABLE} ("
+                "property_id bigint PRIMARY KEY, document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {INDEX_TABLE}_document "
+                f"ON {INDEX_TABLE} USING gin (document)"
+            )
+
+    def index_properties(self, properties):
+        rows = [(p.pk, p.title, p.city, p.state) for p in properties]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {INDEX_TABLE} (property_id, document) VALUES (%s, "
+                "setweight(to_tsvector('simple', %s), 'A') || "
+                "setweight(to_tsvector('simple', %s), 'B') || "
+                "setweight(to_tsvector('simple', %s), 'C')) "
+                "ON CONFLICT (property_id) DO UPDATE SET document = EXCLUDED.document",
+                rows
+            )
+
+    def remove_properties(self, property_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {INDEX_TABLE} WHERE property_id = ANY(%s)", [list(property_ids)])
+
+    def match_expression(self, query):
+        return ' & '.join(f'{token}:*' for token in tokenize(query))
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return LikeSearchBackend.search(self, queryset, query)
+
+        rank = RawSQL(
+            f"SELECT ts_rank(document, to_tsquery('simple', %s)) FROM {INDEX_TABLE} "
+            f"WHERE property_id = {PROPERTY_TABLE}.id",
+            (match,)
+        )
+        matches = RawSQL(
+            f"SELECT property_id FROM {INDEX_TABLE} "
+            "WHERE document @@ to_tsquery('simple', %s)",
+            (match,)
+        )
+        return queryset.filter(pk__in=matches).annotate(
+            search_rank=rank).order_by('-search_rank', '-created_at', '-id')
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': PostgresFTSBackend,
+}
+
+
+def get_search_backend():
+    """
+    Return the index backend matching the default database.
+    """
+    return BACKENDS.get(connection.vendor, LikeSearchBackend)()
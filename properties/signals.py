@@ -0,0 +1,45 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from core.storage import track_media
+from core.thumbnails import schedule_for
+from properties.models import Property, PropertyImage
+from properties.search import invalidate_search_cache
+from properties.search_index import get_search_backend
+
+
+# Keep the full-text index and the search result cache in step with the
+# property table
+@receiver(post_save, sender=Property)
+def index_property(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    get_search_backend().index_properties([instance])
+    invalidate_search_cache()
+
+
+@receiver(post_delete, sender=Property)
+def unindex_property(sender, instance, **kwargs):
+    get_search_backend().remove_properties([instance.pk])
+    invalidate_search_cache()
+
+
+# Thumbnails for the listing cards and galleries
+@receiver(post_save, sender=Property)
+def property_thumbnails(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        schedule_for(instance, 'primary_image', update_fields)
+
+
+@receiver(post_save, sender=PropertyImage)
+def property_image_thumbnails(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        schedule_for(instance, 'image', update_fields)
+
+
+# Shared image files are only deleted once no row uses them
+track_media(Property, 'primary_image')
+track_media(PropertyImage, 'image')
+
+
+def create_search_index(sender, **kwargs):
+    get_search_backend().ensure_index()
@@ -1,3 +1,269 @@
-from django.test import TestCase
+import io
+import os
+import unittest
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core import signing
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from accounts.models import CustomUser
+from core.models import MediaBlob
+from properties.forms import PropertyImageFormSet
+from properties.models import Property, PropertyImage
+from properties.pagination import CURSOR_SALT, ListingPaginator, decode_cursor, encode_cursor
+from properties.search import PropertySearch, get_cache
+from properties.search_index import INDEX_TABLE, SQLiteFTSBackend, get_search_backend
+from properties.uploads import save_property_images
+
+
+def png_upload(name, color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), color).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class SavePropertyImagesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = CustomUser.objects.create_user(
+            username='owner', email='owner@example.com', password='secret')
+        cls.property = Property.objects.create(
+            owner=owner, title='Sea View', city='Goa', state='Goa', zip_code='403001',
+            price_per_night=1000)
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def formset(self, *colors):
+        data = {'form-TOTAL_FORMS': str(len(colors)), 'form-INITIAL_FORMS': '0'}
+        files = {f'form-{number}-image': png_upload(f'photo{number}.png', color)
+                 for number, color in enumerate(colors)}
+        formset = PropertyImageFormSet(data, files, queryset=PropertyImage.objects.none())
+        self.assertTrue(formset.is_valid(), formset.errors)
+        return formset
+
+    def stored_files(self):
+        return [name for _, _, names in os.walk(self.media_root) for name in names]
+
+    def test_new_images_are_stored_and_counted(self):
+        added = save_property_images(self.property, self.formset('red', 'blue', 'red'))
+
+        self.assertEqual(added, 3)
+        names = list(self.property.property_images.values_list('image', flat=True))
+        self.assertEqual(len(set(names)), 2)
+        self.assertEqual(len(self.stored_files()), 2)
+        self.assertEqual(
+            dict(MediaBlob.objects.values_list('name', 'refcount')),
+            {names[0]: names.count(names[0]), names[1]: names.count(names[1])})
+
+    def test_rejected_upload_leaves_no_files_behind(self):
+        save_property_images(self.property, self.formset('red', 'blue'))
+        kept = sorted(self.stored_files())
+
+        with self.assertRaises(ValidationError):
+            save_property_images(self.property, self.formset('green', 'red'))
+
+        self.assertEqual(self.property.property_images.count(), 2)
+        self.assertEqual(sorted(self.stored_files()), kept)
+        self.assertEqual(sum(MediaBlob.objects.values_list('refcount', flat=True)), 2)
+
+    def test_failed_insert_leaves_no_files_behind(self):
+        with mock.patch.object(PropertyImage.objects, 'bulk_create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                save_property_images(self.property, self.formset('red'))
+
+        self.assertFalse(self.property.property_images.exists())
+        self.assertEqual(self.stored_files(), [])
+        self.assertFalse(MediaBlob.objects.exists())
+
+
+class ListingPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = CustomUser.objects.create_user(
+            username='owner', email='owner@example.com', password='secret')
+        for number in range(7):
+            Property.objects.create(
+                owner=owner, title=f'Home {number}', city='Goa', state='Goa',
+                zip_code='403001', price_per_night=1000)
+        # Equal sort keys: the id has to break the ties
+        Property.objects.update(created_at=timezone.now())
+        cls.expected = list(Property.objects.order_by('-id').values_list('pk', flat=True))
+
+    def page(self, query=''):
+        paginator = ListingPaginator(Property.objects.all(), per_page=2, numbered_pages=1)
+        return paginator.get_page(QueryDict(query))
+
+    def ids(self, page):
+        return [home.pk for home in page]
+
+    def test_cursor_round_trip(self):
+        home = Property.objects.first()
+        self.assertEqual(
+            decode_cursor(encode_cursor('next', home)), ('next', home.created_at, home.pk))
+
+    def test_tampered_or_foreign_cursors_are_rejected(self):
+        token = encode_cursor('next', Property.objects.first())
+        self.assertIsNone(decode_cursor(token[:-1] + ('A' if token[-1] != 'A' else 'B')))
+        self.assertIsNone(decode_cursor(signing.dumps(['next', '2024-01-01T00:00:00', 1])))
+        self.assertIsNone(decode_cursor(signing.dumps(
+            ['sideways', '2024-01-01T00:00:00', 1], salt=CURSOR_SALT, compress=True)))
+        self.assertIsNone(decode_cursor('garbage'))
+        self.assertIsNone(decode_cursor(''))
+
+    def test_tampered_cursor_falls_back_to_the_first_page(self):
+        self.assertEqual(self.ids(self.page('cursor=garbage')), self.expected[:2])
+
+    def test_walking_cursors_visits_every_row_once(self):
+        page = self.page()
+        self.assertFalse(page.count_is_exact)
+        seen, pages = self.ids(page), [page]
+        while page.has_next:
+            page = self.page(page.next_query)
+            seen += self.ids(page)
+            pages.append(page)
+
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(pages[-1]), 1)
+        self.assertFalse(pages[-1].has_next)
+
+        page = self.page(pages[-1].previous_query)
+        self.assertEqual(self.ids(page), self.ids(pages[-2]))
+        self.assertTrue(page.has_next)
+
+    def test_cursor_past_the_last_row_gives_an_empty_page(self):
+        last = Property.objects.order_by('id').first()
+        page = self.page(QueryDict.fromkeys(['cursor'], encode_cursor('next', last)).urlencode())
+        self.assertEqual(len(page), 0)
+        self.assertFalse(page.has_next)
+        self.assertFalse(page.has_previous)
+
+
+class PropertySearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = CustomUser.objects.create_user(
+            username='owner', email='owner@example.com', password='secret')
+        for title in ('Sea View', 'Hill Cabin'):
+            Property.objects.create(
+                owner=owner, title=title, city='Goa', state='Goa', zip_code='403001',
+                price_per_night=1000)
+
+    def setUp(self):
+        get_cache().clear()
+
+    def search(self, query=''):
+        return PropertySearch(QueryDict(query))
+
+    def test_query_is_normalized_to_its_tokens(self):
+        search = self.search('query=%20Sea,%20VIEW!')
+        self.assertEqual(search.query, 'sea view')
+        self.assertEqual(search.cache_key(), self.search('query=sea+view').cache_key())
+
+    def test_punctuation_only_query_is_the_plain_listing(self):
+        search = self.search('query=!!')
+        self.assertEqual(search.query, '')
+        self.assertEqual(search.cache_key(), self.search().cache_key())
+        self.assertEqual(len(search.get_page()), 2)
+
+        self.assertEqual(len(self.search().get_page()), 2)
+
+
+class SearchInvalidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = CustomUser.objects.create_user(
+            username='owner', email='owner@example.com', password='secret')
+        cls.home = Property.objects.create(
+            owner=cls.owner, title='Sea View', city='Goa', state='Goa', zip_code='403001',
+            price_per_night=1000)
+
+    def setUp(self):
+        get_cache().clear()
+
+    def listing(self, query=''):
+        return [home.title for home in PropertySearch(QueryDict(query)).get_page()]
+
+    def test_saving_a_property_refreshes_cached_pages(self):
+        self.assertEqual(self.listing(), ['Sea View'])
+        self.assertEqual(self.listing('query=hill'), [])
+
+        Property.objects.create(
+            owner=self.owner, title='Hill Cabin', city='Goa', state='Goa', zip_code='403001',
+            price_per_night=1000)
+        self.assertEqual(self.listing(), ['Hill Cabin', 'Sea View'])
+        self.assertEqual(self.listing('query=hill'), ['Hill Cabin'])
+
+        self.home.is_available = False
+        self.home.save()
+        self.assertEqual(self.listing(), ['Hill Cabin'])
+
+    def test_deleting_a_property_refreshes_cached_pages(self):
+        self.assertEqual(self.listing('query=sea'), ['Sea View'])
+        self.home.delete()
+        self.assertEqual(self.listing('query=sea'), [])
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'FTS5 backend')
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = CustomUser.objects.create_user(
+            username='owner', email='owner@example.com', password='secret')
+        cls.cabin = Property.objects.create(
+            owner=owner, title='Goa Cabin', city='Panaji', state='Goa', zip_code='403001',
+            price_per_night=1000)
+        cls.villa = Property.objects.create(
+            owner=owner, title='Sea Villa', city='Calangute', state='Goa', zip_code='403516',
+            price_per_night=2000)
+
+    def search(self, query):
+        return list(get_search_backend().search(Property.objects.all(), query))
+
+    def indexed_ids(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {INDEX_TABLE} ORDER BY rowid')
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_backend_matches_the_database(self):
+        self.assertIsInstance(get_search_backend(), SQLiteFTSBackend)
+
+    def test_prefix_tokens_and_title_ranks_first(self):
+        self.assertEqual(self.search('go'), [self.cabin, self.villa])
+        self.assertEqual(self.search('SEA goa'), [self.villa])
+        self.assertEqual(self.search('calangute villa'), [self.villa])
+        self.assertEqual(self.search('mumbai'), [])
+
+    def test_signals_keep_the_index_in_step(self):
+        self.villa.title = 'Hill Villa'
+        self.villa.save()
+        self.assertEqual(self.search('sea'), [])
+        self.assertEqual(self.search('hill'), [self.villa])
+
+        villa_id = self.villa.pk
+        self.villa.delete()
+        self.assertNotIn(villa_id, self.indexed_ids())
+
+    def test_rebuild_command_restores_a_lost_index(self):
+        get_search_backend().clear()
+        self.assertEqual(self.search('goa'), [])
+
+        out = io.StringIO()
+        call_command('rebuild_search_index', batch_size=1, stdout=out)
+
+        self.assertIn('Indexed 2 properties with SQLiteFTSBackend.', out.getvalue())
+        self.assertEqual(self.indexed_ids(), sorted([self.cabin.pk, self.villa.pk]))
+        self.assertEqual(len(self.search('goa')), 2)
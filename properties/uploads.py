@@ -0,0 +1,101 @@
+"""
+Bulk saving of property image formsets.
+
+save_property_images() replaces a save() per form: new uploads are written to
+storage concurrently, then inserted with one bulk_create, replaced images are
+written with one bulk_update and removed ones go in one queryset delete, all in
+a single transaction. That transaction starts with a write to the property
+row, which takes SQLite's database write lock (a row lock elsewhere) before
+the images are counted, so two uploads running at the same time cannot take a
+listing past MAX_IMAGES. Files are written before the transaction so no
+storage I/O happens under the lock; if it rolls back, the blobs it would have
+registered are deleted again.
+
+bulk_create and bulk_update skip the model signals, so the media reference
+counts and thumbnails the signals would have handled are updated here.
+"""
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+
+from core.storage import decref, discard, incref
+from core.thumbnails import schedule
+from properties.models import Property, PropertyImage
+
+MAX_IMAGES = 3
+UPLOAD_WORKERS = 4
+
+
+def parallel(function, items):
+    """
+    Run `function` over `items` in a short-lived thread pool and return the results.
+    """
+    items = list(items)
+    if len(items) < 2:
+        return [function(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(len(items), UPLOAD_WORKERS)) as pool:
+        return list(pool.map(function, items))
+
+
+def store_upload(instance):
+    """
+    Write the upload to storage. Returns its name if this call created the
+    file, None if the content was already stored.
+    """
+    upload = instance.image
+    blob_name = getattr(upload.storage, 'blob_name', None)
+    existed = blob_name is not None and upload.storage.exists(blob_name(upload.file, upload.name))
+    upload.save(upload.name, upload.file, save=False)
+    return None if existed else upload.name
+
+
+def save_property_images(property_instance, formset, max_images=MAX_IMAGES):
+    """
+    Save a validated PropertyImageFormSet for `property_instance`. Raises
+    ValidationError, leaving everything as it was, if the property would end
+    up with more than `max_images` images. Returns the number of images added.
+    """
+    added, replaced, removed = [], [], set()
+    for form in formset.forms:
+        if not form.has_changed():
+            continue
+        instance = form.instance
+        image = form.cleaned_data.get('image')
+        if form.cleaned_data.get('DELETE') or image is False:
+            if instance.pk:
+                removed.add(instance.pk)
+        elif image and 'image' in form.changed_data:
+            (replaced if instance.pk else added).append(instance)
+
+    written = [name for name in parallel(store_upload, added + replaced) if name]
+    try:
+        with transaction.atomic():
+            # A no-op write first: concurrent uploads for this property queue here
+            # until commit (SELECT ... FOR UPDATE is ignored by SQLite)
+            Property.objects.filter(pk=property_instance.pk).update(updated_at=F('updated_at'))
+            images = PropertyImage.objects.filter(property=property_instance)
+            if images.exclude(pk__in=removed).count() + len(added) > max_images:
+                raise ValidationError(f'A property can have at most {max_images} images.')
+            previous = dict(images.filter(pk__in=[instance.pk for instance in replaced])
+                            .values_list('pk', 'image'))
+
+            for instance in added:
+                instance.property = property_instance
+            PropertyImage.objects.bulk_create(added)
+            PropertyImage.objects.bulk_update(replaced, ['image'])
+            if removed:
+                images.filter(pk__in=removed).delete()
+
+            stored = [instance.image.name for instance in added + replaced]
+            for name, count in Counter(stored).items():
+                incref(name, count)
+            for name in previous.values():
+                decref(name)
+            transaction.on_commit(lambda: [schedule(name) for name in set(stored)])
+    except Exception:
+        discard(written)
+        raise
+    return len(added)
@@ -2,11 +2,13 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q
-from django.core.paginator import Paginator
-from django.core.exceptions import PermissionDenied
+from django.core.exceptions import PermissionDenied, ValidationError
 from properties.models import Property, PropertyImage, Review
+from properties.search import PropertySearch
+from core.metrics import search_duration, search_requests
 # No need for PropertyImageForm since it’s handled in the formset
 from properties.forms import AddPropertyForm, PropertyImageFormSet
+from properties.uploads import MAX_IMAGES, save_property_images
 
 # View to add a new property
 
@@ -33,10 +35,9 @@ def add_property(request):
 def add_images(request, id):
     property_instance = get_object_or_404(Property, id=id, owner=request.user)
 
-    max_images = 3
     existing_images_count = PropertyImage.objects.filter(
         property=property_instance).count()
-    remaining_images = max_images - existing_images_count
+    remaining_images = MAX_IMAGES - existing_images_count
 
     if remaining_images <= 0:
         messages.error(
@@ -49,14 +50,14 @@ def add_images(request, id):
             request.POST, request.FILES, queryset=PropertyImage.objects.filter(property=property_instance))
 
         if formset.is_valid():
-            for form in formset:
-                if form.cleaned_data.get('image'):
-                    image_instance = form.save(commit=False)
-                    image_instance.property = property_instance
-                    image_instance.save()
-
-            messages.success(request, 'Images added successfully.')
-            return redirect('property_details', id=property_instance.id)
+            # The limit is checked again, atomically, while saving
+            try:
+                save_property_images(property_instance, formset)
+            except ValidationError as error:
+                messages.error(request, ' '.join(error.messages))
+            else:
+                messages.success(request, 'Images added successfully.')
+                return redirect('property_details', id=property_instance.id)
         else:
             messages.error(
                 request, 'Error adding images. Please correct the issues.')
@@ -81,17 +82,13 @@ def edit_images(request, id):
             request.POST, request.FILES, queryset=PropertyImage.objects.filter(property=property_instance))
 
         if formset.is_valid():
-            instances = formset.save(commit=False)
-            for instance in instances:
-                instance.property = property_instance
-                instance.save()
-
-            for form in formset.deleted_forms:
-                if form.instance.pk:
-                    form.instance.delete()
-
-            messages.success(request, 'Images updated successfully')
-            return redirect('property_details', id=property_instance.id)
+            try:
+                save_property_images(property_instance, formset)
+            except ValidationError as error:
+                messages.error(request, ' '.join(error.messages))
+            else:
+                messages.success(request, 'Images updated successfully')
+                return redirect('property_details', id=property_instance.id)
         else:
             messages.error(
                 request, 'Error updating images. Please correct the issues.')
@@ -145,57 +142,23 @@ def delete_property(request, id):
 
 # View to list all properties with filters
 def properties_list(request):
-    properties = Property.objects.filter(is_available=True)
-
-    query = request.GET.get('query', '').strip()
-    price_range = request.GET.get('price_range', '')
-    rooms = request.GET.get('rooms', '')
-    bathrooms = request.GET.get('bathrooms', '')
-    max_guests = request.GET.get('max_guests', '')
-
-    if query:
-        properties = properties.filter(
-            Q(title__icontains=query) |
-            Q(city__icontains=query) |
-            Q(state__icontains=query)
-        )
-    if price_range:
-        properties = properties.filter(price_per_night__lte=price_range)
-    if rooms:
-        properties = properties.filter(rooms__gte=rooms)
-    if bathrooms:
-        properties = properties.filter(bathrooms__gte=bathrooms)
-    if max_guests:
-        properties = properties.filter(max_guests__gte=max_guests)
-
-    paginator = Paginator(properties, 40)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    return render(request, 'properties/properties_list.html', {
-        'properties': page_obj,
-        'query': query,
-        'price_range': price_range,
-        'rooms': rooms,
-        'bathrooms': bathrooms,
-        'max_guests': max_guests
-    })
+    search_requests.inc(view='properties_list')
+    with search_duration.time(view='properties_list'):
+        search = PropertySearch(request.GET)
+        return render(request, 'properties/properties_list.html', search.context())
 
 
 # View to show property details
 def property_details(request, id):
     property_instance = get_object_or_404(Property, id=id, is_deleted=False)
     images = PropertyImage.objects.filter(property=property_instance)
-    reviews = Review.objects.filter(property=property_instance, is_deleted=False)
-    
-    # Check if the user has booked this property
-    has_booked = property_instance.bookings.filter(user=request.user).exists() if request.user.is_authenticated else False
-    
+    reviews = Review.objects.filter(
+        property=property_instance, is_deleted=False).select_related('user')
+
     context = {
         'property': property_instance,
         'images': images,
         'reviews': reviews,
-        'has_booked': has_booked
     }
     return render(request, 'properties/property_details.html', context)
 